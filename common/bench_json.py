@@ -0,0 +1,89 @@
+"""Compare Flask's default JSON provider with the orjson-backed one.
+
+Encodes GET /users style pages and parses them back, for user lists of
+1 to --max-records users. A few names are non-ASCII, as in real data.
+
+Usage: python bench_json.py [--max-records N] [--seconds S]
+"""
+
+import argparse
+import time
+
+from flask import Flask
+from flask.json.provider import DefaultJSONProvider
+
+from service_common.json_provider import OrjsonProvider, orjson
+
+NAMES = ["Ahmed Aly", "Mona Hassan", "Omar Farouk", "Zoë Martin", "Sara Adel"]
+
+
+def make_users(count):
+    return {
+        "users": [
+            {
+                "id": str(i),
+                "name": NAMES[i % len(NAMES)],
+                "email": f"user{i}@example.com",
+            }
+            for i in range(1, count + 1)
+        ],
+        "next_cursor": None,
+    }
+
+
+def per_call(func, seconds):
+    """Seconds per ``func()`` call, repeating it for about ``seconds``"""
+    calls = 0
+    start = time.perf_counter()
+    while True:
+        func()
+        calls += 1
+        elapsed = time.perf_counter() - start
+        if elapsed >= seconds:
+            return elapsed / calls
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--max-records", type=int, default=1_000_000)
+    parser.add_argument("--seconds", type=float, default=0.5)
+    args = parser.parse_args()
+
+    if orjson is None:
+        print("orjson is not installed; both providers use the json module")
+    providers = {}
+    for name, provider_class in (
+        ("default", DefaultJSONProvider),
+        ("orjson", OrjsonProvider),
+    ):
+        app = Flask(__name__)
+        app.json = provider_class(app)
+        providers[name] = app
+
+    print(
+        f"{'records':>9} {'op':<6} {'default ms':>11} {'orjson ms':>10} {'speedup':>8}"
+    )
+    count = 1
+    while count <= args.max_records:
+        page = make_users(count)
+        body = providers["default"].json.response(page).get_data()
+        timings = {}
+        for name, app in providers.items():
+            with app.app_context():
+                timings[name, "dumps"] = per_call(
+                    lambda: app.json.response(page).get_data(), args.seconds
+                )
+                timings[name, "loads"] = per_call(
+                    lambda: app.json.loads(body), args.seconds
+                )
+        for op in ("dumps", "loads"):
+            default, fast = timings["default", op], timings["orjson", op]
+            print(
+                f"{count:>9,} {op:<6} {default * 1000:>11.3f} {fast * 1000:>10.3f}"
+                f" {default / fast:>7.1f}x"
+            )
+        count *= 10
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1 @@
+"""Code shared by Service A and Service B, installed into both images."""
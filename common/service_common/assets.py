@@ -0,0 +1,198 @@
+"""UI assets built once at startup, and gzip compression of JSON responses."""
+
+import gzip
+import hashlib
+import mimetypes
+import os
+import zlib
+from typing import Dict, Iterable, Iterator, NamedTuple, Optional, Tuple
+
+from flask import Blueprint, Flask, Response, current_app, jsonify, request
+from werkzeug.http import parse_accept_header, parse_etags
+
+try:
+    import brotli
+except ImportError:  # brotli is optional; assets are then precompressed with gzip only
+    brotli = None
+
+# URL prefix of the fingerprinted files referenced by the page
+ASSET_PREFIX = "/assets/"
+# Fingerprinted URLs change with their content, so they never need revalidating
+IMMUTABLE = "public, max-age=31536000, immutable"
+# Response types compressed by init_compression
+COMPRESSIBLE = frozenset({"application/json", "application/x-ndjson"})
+
+
+class Asset(NamedTuple):
+    content_type: str
+    cache_control: str
+    # Hash of the uncompressed body
+    etag: str
+    # Content-Encoding -> body, always including "identity"
+    bodies: Dict[str, bytes]
+
+
+def build_asset(body: bytes, content_type: str, cache_control: str) -> Asset:
+    """Hash and precompress ``body``, keeping only encodings that make it smaller"""
+    bodies = {"identity": body}
+    candidates = {"gzip": gzip.compress(body, 9, mtime=0)}
+    if brotli is not None:
+        candidates["br"] = brotli.compress(body, quality=11)
+    for encoding, encoded in candidates.items():
+        if len(encoded) < len(body):
+            bodies[encoding] = encoded
+    etag = hashlib.sha256(body).hexdigest()[:16]
+    return Asset(content_type, cache_control, etag, bodies)
+
+
+def negotiate(accept_encoding: str, available: Iterable[str]) -> str:
+    """Pick the best of ``available`` encodings the client accepts"""
+    accepted = parse_accept_header(accept_encoding)
+    for encoding in ("br", "gzip"):
+        if encoding in available and accepted.quality(encoding) > 0:
+            return encoding
+    return "identity"
+
+
+class AssetBundle:
+    """The files of a UI directory, fingerprinted and compressed once
+
+    The page is served at ``/`` and revalidated on every use. Its references
+    to the other files are rewritten to fingerprinted URLs under
+    ASSET_PREFIX that are cached for a year.
+    """
+
+    def __init__(self, directory: str, page: str = "index.html"):
+        self.assets: Dict[str, Asset] = {}
+        urls = {}
+        for name in sorted(os.listdir(directory)):
+            if name == page:
+                continue
+            with open(os.path.join(directory, name), "rb") as f:
+                asset = build_asset(f.read(), self._content_type(name), IMMUTABLE)
+            stem, ext = os.path.splitext(name)
+            urls[name] = f"{ASSET_PREFIX}{stem}.{asset.etag[:10]}{ext}"
+            self.assets[urls[name]] = asset
+
+        with open(os.path.join(directory, page), encoding="utf-8") as f:
+            html = f.read()
+        for name, url in urls.items():
+            html = html.replace(f'"{name}"', f'"{url}"')
+        self.assets["/"] = build_asset(
+            html.encode("utf-8"), self._content_type(page), "no-cache"
+        )
+
+    @staticmethod
+    def _content_type(name: str) -> str:
+        content_type = mimetypes.guess_type(name)[0] or "application/octet-stream"
+        if content_type.startswith("text/"):
+            content_type += "; charset=utf-8"
+        return content_type
+
+    def respond(
+        self, path: str, accept_encoding: str, if_none_match: str
+    ) -> Optional[Tuple[int, Dict[str, str], bytes]]:
+        """Return ``(status, headers, body)`` for ``path``, or None if unknown
+
+        Only looks up prebuilt bodies, so no request does compression work.
+        """
+        asset = self.assets.get(path)
+        if asset is None:
+            return None
+        encoding = negotiate(accept_encoding, asset.bodies)
+        etag = asset.etag if encoding == "identity" else f"{asset.etag}-{encoding}"
+        headers = {
+            "Content-Type": asset.content_type,
+            "Cache-Control": asset.cache_control,
+            "ETag": f'"{etag}"',
+            "Vary": "Accept-Encoding",
+        }
+        if parse_etags(if_none_match).contains_weak(etag):
+            return 304, headers, b""
+        if encoding != "identity":
+            headers["Content-Encoding"] = encoding
+        return 200, headers, asset.bodies[encoding]
+
+
+ui = Blueprint("ui", __name__)
+
+
+def _serve(path: str):
+    found = current_app.extensions["ui"].respond(
+        path,
+        request.headers.get("Accept-Encoding", ""),
+        request.headers.get("If-None-Match", ""),
+    )
+    if found is None:
+        return jsonify({"error": "Not found"}), 404
+    status, headers, body = found
+    return Response(body, status=status, headers=headers)
+
+
+@ui.route("/")
+def home():
+    """Simple home page with UI"""
+    return _serve("/")
+
+
+@ui.route(f"{ASSET_PREFIX}<name>")
+def asset(name: str):
+    """Stylesheets and scripts referenced by the home page"""
+    return _serve(f"{ASSET_PREFIX}{name}")
+
+
+def init_ui(app: Flask, directory: str) -> None:
+    """Serve the UI in ``directory`` from ``app``"""
+    app.extensions["ui"] = AssetBundle(directory)
+    app.register_blueprint(ui)
+
+
+def gzip_stream(chunks: Iterable[bytes], level: int) -> Iterator[bytes]:
+    """Gzip a streamed body, flushing after every chunk so it still streams"""
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    for chunk in chunks:
+        yield compressor.compress(chunk) + compressor.flush(zlib.Z_SYNC_FLUSH)
+    yield compressor.flush()
+
+
+def compress_response(response: Response, min_size: int, level: int) -> Response:
+    """Gzip a JSON or NDJSON ``response`` if the client accepts it
+
+    Bodies smaller than ``min_size`` bytes are sent as they are. Streamed
+    bodies have no known size and are always compressed.
+    """
+    if response.mimetype not in COMPRESSIBLE:
+        return response
+    response.vary.add("Accept-Encoding")
+    if (
+        response.status_code != 200
+        or "Content-Encoding" in response.headers
+        or request.accept_encodings["gzip"] <= 0
+    ):
+        return response
+
+    if response.is_streamed:
+        response.response = gzip_stream(response.iter_encoded(), level)
+        response.headers.pop("Content-Length", None)
+    else:
+        data = response.get_data()
+        if len(data) < min_size:
+            return response
+        response.set_data(gzip.compress(data, level))
+    response.headers["Content-Encoding"] = "gzip"
+    # The compressed bytes differ from the identity ones, so a strong tag
+    # would no longer be accurate
+    etag, weak = response.get_etag()
+    if etag and not weak:
+        response.set_etag(etag, weak=True)
+    return response
+
+
+def init_compression(app: Flask, min_size: int, level: int = 6) -> None:
+    """Compress ``app``'s JSON responses of at least ``min_size`` bytes; -1 disables it"""
+    if min_size < 0:
+        return
+
+    @app.after_request
+    def compress(response: Response) -> Response:
+        return compress_response(response, min_size, level)
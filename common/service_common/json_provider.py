@@ -0,0 +1,118 @@
+"""JSON encoding backed by orjson when it is installed, with the stdlib's output."""
+
+import codecs
+import json
+from json.encoder import encode_basestring_ascii
+from typing import Any, Callable, Optional, Tuple, Union
+
+from flask import Response
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import orjson
+except ImportError:  # orjson is optional; the json module is used instead
+    orjson = None
+
+# The only separators orjson can write
+COMPACT = (",", ":")
+
+if orjson is not None:
+    # Hand these to ``default`` like the json module does, instead of using
+    # orjson's own formats for them
+    _PASSTHROUGH = orjson.OPT_PASSTHROUGH_DATACLASS | orjson.OPT_PASSTHROUGH_DATETIME
+
+
+def _escape(error: UnicodeEncodeError) -> Tuple[str, int]:
+    """Codec error handler writing non-ASCII text as the json module does"""
+    start, end = error.start, error.end
+    return encode_basestring_ascii(error.object[start:end])[1:-1], end
+
+
+# Used to turn orjson's UTF-8 output into ensure_ascii output
+codecs.register_error("json_provider.escape", _escape)
+
+
+def dumps(
+    obj: Any,
+    sort_keys: bool = False,
+    ensure_ascii: bool = True,
+    default: Optional[Callable[[Any], Any]] = None,
+) -> bytes:
+    """Compact JSON for ``obj``, the same bytes as ``json.dumps`` with COMPACT
+
+    orjson is used when it is installed, and non-ASCII characters in its
+    output are escaped when ``ensure_ascii`` is set. Values it cannot
+    encode, such as integers beyond 64 bits or non-string keys, are encoded
+    again with the json module.
+    Floats are not checked: orjson writes 1e+16 as ``1e16``, 1e-05 as
+    ``0.00001``, and NaN and infinity as ``null``.
+    """
+    if orjson is not None:
+        option = _PASSTHROUGH | orjson.OPT_SORT_KEYS if sort_keys else _PASSTHROUGH
+        try:
+            data = orjson.dumps(obj, default=default, option=option)
+        except orjson.JSONEncodeError:
+            pass
+        else:
+            if ensure_ascii and not data.isascii():
+                data = data.decode("utf-8").encode("ascii", "json_provider.escape")
+            if ensure_ascii and b"\x7f" in data:
+                # Only possible inside a string, where the json module escapes it
+                data = data.replace(b"\x7f", b"\\u007f")
+            return data
+    return json.dumps(
+        obj,
+        separators=COMPACT,
+        sort_keys=sort_keys,
+        ensure_ascii=ensure_ascii,
+        default=default,
+    ).encode("utf-8")
+
+
+def loads(data: Union[str, bytes]) -> Any:
+    """Parse JSON text or UTF-8 bytes, with orjson when it is installed
+
+    Input orjson rejects, like NaN or other encodings, goes to the json
+    module, so invalid JSON raises its ``JSONDecodeError``.
+    """
+    if orjson is not None:
+        try:
+            return orjson.loads(data)
+        except orjson.JSONDecodeError:
+            pass
+    return json.loads(data)
+
+
+class OrjsonProvider(DefaultJSONProvider):
+    """Flask's default JSON provider with orjson doing the common cases
+
+    Responses and request bodies are byte for byte what the default
+    provider produces and accepts. Pretty-printed output in debug mode and
+    calls with other ``json.dumps`` options are left to the default.
+    """
+
+    def dumps(self, obj: Any, **kwargs: Any) -> str:
+        if kwargs.get("separators") != COMPACT or not kwargs.keys() <= {
+            "separators",
+            "sort_keys",
+            "ensure_ascii",
+        }:
+            return super().dumps(obj, **kwargs)
+        return dumps(
+            obj,
+            sort_keys=kwargs.get("sort_keys", self.sort_keys),
+            ensure_ascii=kwargs.get("ensure_ascii", self.ensure_ascii),
+            default=self.default,
+        ).decode("utf-8")
+
+    def loads(self, s: Union[str, bytes], **kwargs: Any) -> Any:
+        if kwargs:
+            return super().loads(s, **kwargs)
+        return loads(s)
+
+    def response(self, *args: Any, **kwargs: Any) -> Response:
+        if self.compact is False or (self.compact is None and self._app.debug):
+            return super().response(*args, **kwargs)
+        obj = self._prepare_response_obj(args, kwargs)
+        data = dumps(obj, self.sort_keys, self.ensure_ascii, self.default)
+        return self._app.response_class(data + b"\n", mimetype=self.mimetype)
@@ -0,0 +1,410 @@
+"""In-process metrics served in the Prometheus text format at ``/metrics``."""
+
+import math
+import threading
+import time
+from bisect import bisect_left
+from typing import (
+    Callable,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Sequence,
+    Tuple,
+    Union,
+)
+
+from flask import Flask, Response
+from werkzeug.routing import Rule
+
+# Upper bounds in seconds of the latency histogram buckets
+LATENCY_BUCKETS = (
+    0.0005,
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+)
+# Content type of the text exposition format
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+# Route label of requests that matched no route, so unknown URLs add no series
+UNMATCHED = "<unmatched>"
+# Environ key under which a Flask app leaves the matched URL rule, a string,
+# for the middleware
+ROUTE_KEY = "metrics.route"
+
+Number = Union[int, float]
+LabelValues = Tuple[object, ...]
+
+
+def _format_value(value: Number) -> str:
+    if isinstance(value, float):
+        if math.isinf(value):
+            return "+Inf" if value > 0 else "-Inf"
+        return repr(value)
+    return str(value)
+
+
+def _escape(value: object) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(names: Sequence[str], values: Sequence[object]) -> str:
+    if not names:
+        return ""
+    pairs = ",".join(f'{name}="{_escape(value)}"' for name, value in zip(names, values))
+    return "{" + pairs + "}"
+
+
+class _Value:
+    """A number that threads add to under a lock"""
+
+    __slots__ = ("_lock", "value")
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.value = 0
+
+    def inc(self, amount: Number = 1) -> None:
+        with self._lock:
+            self.value += amount
+
+    def dec(self, amount: Number = 1) -> None:
+        with self._lock:
+            self.value -= amount
+
+    def set(self, value: Number) -> None:
+        self.value = value
+
+
+class _Buckets:
+    """Counts of observations per fixed bucket, plus their sum"""
+
+    __slots__ = ("_lock", "_bounds", "counts", "sum")
+
+    def __init__(self, bounds: Tuple[float, ...]):
+        self._lock = threading.Lock()
+        self._bounds = bounds
+        # The last count is for the +Inf bucket
+        self.counts = [0] * (len(bounds) + 1)
+        self.sum = 0.0
+
+    def observe(self, value: float) -> None:
+        index = bisect_left(self._bounds, value)
+        with self._lock:
+            self.counts[index] += 1
+            self.sum += value
+
+    def snapshot(self) -> Tuple[List[int], float]:
+        with self._lock:
+            return list(self.counts), self.sum
+
+
+class Metric:
+    """A metric family: one series per combination of label values
+
+    Series are created on first use and kept, so recording into an existing
+    series is a dict lookup and a locked add.
+    """
+
+    kind = "untyped"
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.label_names = tuple(labels)
+        self._series: Dict[LabelValues, object] = {}
+        self._lock = threading.Lock()
+        if not self.label_names:
+            self._unlabeled = self.labels()
+
+    def _new_series(self) -> object:
+        raise NotImplementedError
+
+    def labels(self, *values: object):
+        """The series for ``values``, one per label name"""
+        try:
+            return self._series[values]
+        except KeyError:
+            if len(values) != len(self.label_names):
+                raise ValueError(f"{self.name} takes labels {self.label_names}")
+            with self._lock:
+                return self._series.setdefault(values, self._new_series())
+
+    def samples(self) -> Iterator[Tuple[str, str, Number]]:
+        for values, series in list(self._series.items()):
+            labels = _format_labels(self.label_names, values)
+            yield self.name, labels, series.value
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def _new_series(self) -> _Value:
+        return _Value()
+
+    def inc(self, amount: Number = 1) -> None:
+        self._unlabeled.inc(amount)
+
+
+class Gauge(Metric):
+    kind = "gauge"
+
+    def _new_series(self) -> _Value:
+        return _Value()
+
+    def inc(self, amount: Number = 1) -> None:
+        self._unlabeled.inc(amount)
+
+    def dec(self, amount: Number = 1) -> None:
+        self._unlabeled.dec(amount)
+
+    def set(self, value: Number) -> None:
+        self._unlabeled.set(value)
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        help: str,
+        labels: Sequence[str] = (),
+        buckets: Sequence[float] = LATENCY_BUCKETS,
+    ):
+        self.buckets = tuple(sorted(buckets))
+        super().__init__(name, help, labels)
+
+    def _new_series(self) -> _Buckets:
+        return _Buckets(self.buckets)
+
+    def observe(self, value: float) -> None:
+        self._unlabeled.observe(value)
+
+    def samples(self) -> Iterator[Tuple[str, str, Number]]:
+        names = self.label_names + ("le",)
+        bounds = [_format_value(float(bound)) for bound in self.buckets] + ["+Inf"]
+        for values, series in list(self._series.items()):
+            counts, total = series.snapshot()
+            cumulative = 0
+            for bound, count in zip(bounds, counts):
+                cumulative += count
+                labels = _format_labels(names, values + (bound,))
+                yield f"{self.name}_bucket", labels, cumulative
+            labels = _format_labels(self.label_names, values)
+            yield f"{self.name}_sum", labels, total
+            yield f"{self.name}_count", labels, cumulative
+
+
+class Callback(Metric):
+    """A metric read from ``func`` at every scrape
+
+    ``func`` returns the value, or for a labeled metric a dict from tuples
+    of label values to values.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        kind: str,
+        help: str,
+        func: Callable[[], Union[Number, Dict[LabelValues, Number]]],
+        labels: Sequence[str] = (),
+    ):
+        self.kind = kind
+        self.func = func
+        self.name = name
+        self.help = help
+        self.label_names = tuple(labels)
+
+    def samples(self) -> Iterator[Tuple[str, str, Number]]:
+        result = self.func()
+        if not self.label_names:
+            result = {(): result}
+        for values, value in result.items():
+            yield self.name, _format_labels(self.label_names, values), value
+
+
+class Registry:
+    """The metrics of one app, in the order they were added"""
+
+    def __init__(self):
+        self._metrics: Dict[str, Metric] = {}
+
+    def add(self, metric: Metric) -> Metric:
+        if metric.name in self._metrics:
+            raise ValueError(f"Metric {metric.name} already exists")
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, help: str, labels: Sequence[str] = ()) -> Counter:
+        return self.add(Counter(name, help, labels))
+
+    def gauge(self, name: str, help: str, labels: Sequence[str] = ()) -> Gauge:
+        return self.add(Gauge(name, help, labels))
+
+    def histogram(
+        self,
+        name: str,
+        help: str,
+        labels: Sequence[str] = (),
+        buckets: Sequence[float] = LATENCY_BUCKETS,
+    ) -> Histogram:
+        return self.add(Histogram(name, help, labels, buckets))
+
+    def callback(
+        self,
+        name: str,
+        kind: str,
+        help: str,
+        func: Callable[[], Union[Number, Dict[LabelValues, Number]]],
+        labels: Sequence[str] = (),
+    ) -> Callback:
+        return self.add(Callback(name, kind, help, func, labels))
+
+    def render(self) -> str:
+        """Every metric in the Prometheus text exposition format"""
+        lines = []
+        for metric in self._metrics.values():
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            for name, labels, value in metric.samples():
+                lines.append(f"{name}{labels} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+
+class HttpMetrics:
+    """Request counts, latency and requests in flight of an HTTP server"""
+
+    def __init__(self, registry: Registry):
+        self.requests = registry.counter(
+            "http_requests_total",
+            "Requests handled, by method, route and status",
+            ("method", "route", "status"),
+        )
+        self.duration = registry.histogram(
+            "http_request_duration_seconds",
+            "Time to handle a request, including streaming its body",
+            ("method", "route"),
+        )
+        self.in_flight = registry.gauge(
+            "http_requests_in_flight", "Requests being handled"
+        )
+
+    def start(self) -> float:
+        """Count a request as in flight, returning its start time"""
+        self.in_flight.inc()
+        return time.perf_counter()
+
+    def finish(self, start: float, method: str, route: str, status: int) -> None:
+        self.in_flight.dec()
+        self.duration.labels(method, route).observe(time.perf_counter() - start)
+        self.requests.labels(method, route, status).inc()
+
+
+class _RequestRecord:
+    """One request passing through _MetricsMiddleware, and its response body
+
+    It is the WSGI iterable returned to the server, so the request is only
+    finished when the server closes it after sending the body.
+    """
+
+    __slots__ = ("http", "environ", "start", "status", "body", "_start_response")
+
+    def __init__(self, http: HttpMetrics, environ: dict, start_response: Callable):
+        self.http = http
+        self.environ = environ
+        self._start_response = start_response
+        self.status = 500
+        self.body = None
+        self.start = http.start()
+
+    def start_response(self, status: str, headers: list, exc_info=None) -> Callable:
+        self.status = int(status[:3])
+        return self._start_response(status, headers, exc_info)
+
+    def __iter__(self) -> Iterator[bytes]:
+        return iter(self.body)
+
+    def close(self) -> None:
+        try:
+            close = getattr(self.body, "close", None)
+            if close is not None:
+                close()
+        finally:
+            self.finish()
+
+    def finish(self) -> None:
+        environ = self.environ
+        route = environ.get(ROUTE_KEY, UNMATCHED)
+        self.http.finish(self.start, environ["REQUEST_METHOD"], route, self.status)
+
+
+class _MetricsMiddleware:
+    """WSGI middleware recording every request of a Flask app in ``http``
+
+    It costs less than request hooks, and times streamed bodies to the end.
+    """
+
+    def __init__(self, wsgi_app: Callable, http: HttpMetrics):
+        self.wsgi_app = wsgi_app
+        self.http = http
+
+    def __call__(self, environ: dict, start_response: Callable) -> Iterable[bytes]:
+        record = _RequestRecord(self.http, environ, start_response)
+        try:
+            record.body = self.wsgi_app(environ, record.start_response)
+        except BaseException:
+            record.finish()
+            raise
+        return record
+
+
+def init_metrics(app: Flask) -> Registry:
+    """Record request metrics of ``app`` and serve them at ``/metrics``
+
+    Returns the registry, to which the app can add its own metrics.
+    """
+    registry = Registry()
+    app.extensions["metrics"] = registry
+    app.wsgi_app = _MetricsMiddleware(app.wsgi_app, HttpMetrics(registry))
+
+    class RecordedRequest(app.request_class):
+        """Request that leaves the string of its matched rule in the environ
+
+        Only the string, since leaving the request itself there would make
+        a reference cycle for the garbage collector on every request.
+        """
+
+        _url_rule: Optional[Rule] = None
+
+        @property
+        def url_rule(self) -> Optional[Rule]:
+            return self._url_rule
+
+        @url_rule.setter
+        def url_rule(self, rule: Optional[Rule]) -> None:
+            # Set by Flask once the URL is matched
+            self._url_rule = rule
+            if rule is not None:
+                self.environ[ROUTE_KEY] = rule.rule
+
+    app.request_class = RecordedRequest
+
+    def serve_metrics() -> Response:
+        return Response(registry.render(), content_type=CONTENT_TYPE)
+
+    app.add_url_rule("/metrics", "metrics", serve_metrics)
+    return registry
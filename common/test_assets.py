@@ -0,0 +1,98 @@
+"""Tests for precompressed UI assets and JSON response compression."""
+
+import gzip
+import os
+import re
+import tempfile
+import unittest
+
+from flask import Flask, Response, jsonify
+
+from service_common.assets import IMMUTABLE, AssetBundle, init_compression, negotiate
+
+
+class TestAssetBundle(unittest.TestCase):
+    def setUp(self):
+        tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmpdir.cleanup)
+        files = {
+            "index.html": '<link href="home.css"><script src="home.js"></script>',
+            "home.css": "body { margin: 0; }\n" * 50,
+            "home.js": "console.log('hi');\n" * 50,
+        }
+        for name, body in files.items():
+            with open(os.path.join(tmpdir.name, name), "w") as f:
+                f.write(body)
+        self.bundle = AssetBundle(tmpdir.name)
+
+    def test_page_links_fingerprinted_assets(self):
+        status, headers, body = self.bundle.respond("/", "", "")
+        self.assertEqual(status, 200)
+        self.assertEqual(headers["Cache-Control"], "no-cache")
+        urls = re.findall(r'"(/assets/[^"]+)"', body.decode())
+        self.assertEqual(len(urls), 2)
+        for url in urls:
+            status, headers, _ = self.bundle.respond(url, "", "")
+            self.assertEqual(status, 200)
+            self.assertEqual(headers["Cache-Control"], IMMUTABLE)
+        self.assertIsNone(self.bundle.respond("/assets/home.css", "", ""))
+
+    def test_encodings_are_negotiated(self):
+        url = next(path for path in self.bundle.assets if path.endswith(".css"))
+        plain = self.bundle.respond(url, "", "")
+        zipped = self.bundle.respond(url, "gzip, deflate", "")
+        self.assertEqual(zipped[1]["Content-Encoding"], "gzip")
+        self.assertEqual(gzip.decompress(zipped[2]), plain[2])
+        self.assertNotEqual(zipped[1]["ETag"], plain[1]["ETag"])
+        self.assertNotIn(
+            "Content-Encoding", self.bundle.respond(url, "gzip;q=0", "")[1]
+        )
+
+    def test_negotiate_prefers_brotli(self):
+        self.assertEqual(negotiate("gzip, br", {"identity", "gzip", "br"}), "br")
+        self.assertEqual(negotiate("gzip, br", {"identity", "gzip"}), "gzip")
+        self.assertEqual(negotiate("*", {"identity", "gzip"}), "gzip")
+        self.assertEqual(negotiate("", {"identity", "gzip"}), "identity")
+
+    def test_matching_etag_gets_304(self):
+        _, headers, _ = self.bundle.respond("/", "gzip", "")
+        status, _, body = self.bundle.respond("/", "gzip", headers["ETag"])
+        self.assertEqual((status, body), (304, b""))
+
+
+class TestCompression(unittest.TestCase):
+    def setUp(self):
+        app = Flask(__name__)
+        init_compression(app, min_size=100)
+        app.add_url_rule("/small", "small", lambda: jsonify({"a": 1}))
+        app.add_url_rule("/large", "large", lambda: jsonify(list(range(100))))
+        app.add_url_rule(
+            "/stream",
+            "stream",
+            lambda: Response(
+                (f"{n}\n" for n in range(100)), mimetype="application/x-ndjson"
+            ),
+        )
+        self.client = app.test_client()
+
+    def test_only_large_responses_are_compressed(self):
+        small = self.client.get("/small", headers={"Accept-Encoding": "gzip"})
+        self.assertNotIn("Content-Encoding", small.headers)
+        large = self.client.get("/large", headers={"Accept-Encoding": "gzip"})
+        self.assertEqual(large.headers["Content-Encoding"], "gzip")
+        self.assertEqual(gzip.decompress(large.data), self.client.get("/large").data)
+
+    def test_streams_are_compressed(self):
+        response = self.client.get("/stream", headers={"Accept-Encoding": "gzip"})
+        self.assertEqual(response.headers["Content-Encoding"], "gzip")
+        lines = gzip.decompress(response.data).decode().splitlines()
+        self.assertEqual(lines, [str(n) for n in range(100)])
+
+    def test_identity_when_not_accepted(self):
+        response = self.client.get("/large")
+        self.assertNotIn("Content-Encoding", response.headers)
+        self.assertEqual(response.headers["Vary"], "Accept-Encoding")
+
+
+if __name__ == "__main__":
+    unittest.main()
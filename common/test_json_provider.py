@@ -0,0 +1,81 @@
+"""Tests for the orjson-backed JSON provider."""
+
+import datetime
+import json
+import math
+import unittest
+import uuid
+
+from flask import Flask, jsonify, request
+from flask.json.provider import DefaultJSONProvider
+
+from service_common.json_provider import OrjsonProvider, dumps, loads
+
+SAMPLES = [
+    {"users": [{"id": "2", "name": "Ahmed Aly", "email": "a@b.co"}], "next": None},
+    {"b": [1, 2.5, True, None], "a": {"z": "", "y": [[], {}]}},
+    {"name": "Zoë", "city": "القاهرة", "emoji": "\U0001f600"},
+    {"big": 2**70, "negative": -(2**64)},
+    {2: "two", 1: "one"},
+    {"when": datetime.datetime(2024, 5, 1, 12, 30), "day": datetime.date(2024, 5, 1)},
+    {"id": uuid.UUID(int=1)},
+    'quotes " and \\ and \n control \x01 \x7f',
+]
+
+
+def make_app(provider_class, debug=False):
+    app = Flask(__name__)
+    app.debug = debug
+    app.json = provider_class(app)
+    return app
+
+
+class TestOrjsonProvider(unittest.TestCase):
+    def test_responses_match_default_provider(self):
+        for debug in (False, True):
+            default = make_app(DefaultJSONProvider, debug)
+            fast = make_app(OrjsonProvider, debug)
+            for sample in SAMPLES:
+                with self.subTest(sample=sample, debug=debug):
+                    with default.app_context():
+                        expected = default.json.response(sample).get_data()
+                    with fast.app_context():
+                        actual = fast.json.response(sample).get_data()
+                    self.assertEqual(actual, expected)
+
+    def test_dumps_matches_json_module(self):
+        for sample in SAMPLES[:5]:
+            for sort_keys in (False, True):
+                expected = json.dumps(
+                    sample, separators=(",", ":"), sort_keys=sort_keys
+                )
+                self.assertEqual(dumps(sample, sort_keys), expected.encode())
+
+    def test_unserializable_raises_type_error(self):
+        with self.assertRaises(TypeError):
+            dumps({"key": object()})
+
+    def test_loads_matches_json_module(self):
+        for text in ['{"a": [1, 2.5, null]}', '"\\u00e9"', str(2**70)]:
+            self.assertEqual(loads(text), json.loads(text))
+            self.assertEqual(loads(text.encode()), json.loads(text))
+        self.assertTrue(math.isnan(loads("NaN")))
+        with self.assertRaises(json.JSONDecodeError):
+            loads("{")
+
+    def test_request_bodies_are_parsed(self):
+        app = make_app(OrjsonProvider)
+
+        @app.route("/echo", methods=["POST"])
+        def echo():
+            return jsonify(request.get_json())
+
+        client = app.test_client()
+        response = client.post("/echo", json={"name": "Zoë"})
+        self.assertEqual(response.get_json(), {"name": "Zoë"})
+        bad = client.post("/echo", data="{", content_type="application/json")
+        self.assertEqual(bad.status_code, 400)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,119 @@
+"""Tests for the in-process metrics and their text exposition."""
+
+import unittest
+
+from flask import Flask, Response, stream_with_context
+
+from service_common.metrics import Registry, init_metrics
+
+
+def sample_lines(text):
+    return [line for line in text.splitlines() if not line.startswith("#")]
+
+
+class TestRegistry(unittest.TestCase):
+    def setUp(self):
+        self.registry = Registry()
+
+    def test_counter_and_gauge(self):
+        counter = self.registry.counter("jobs_total", "Jobs", ("kind",))
+        counter.labels("a").inc()
+        counter.labels("a").inc(2)
+        counter.labels('b"\n').inc()
+        gauge = self.registry.gauge("queue_size", "Queue size")
+        gauge.inc(5)
+        gauge.dec()
+
+        text = self.registry.render()
+        self.assertIn("# HELP jobs_total Jobs\n# TYPE jobs_total counter\n", text)
+        self.assertEqual(
+            sample_lines(text),
+            ['jobs_total{kind="a"} 3', 'jobs_total{kind="b\\"\\n"} 1', "queue_size 4"],
+        )
+
+    def test_histogram_buckets_are_cumulative(self):
+        histogram = self.registry.histogram(
+            "latency_seconds", "Latency", ("route",), buckets=(0.1, 1.0)
+        )
+        for value in (0.05, 0.1, 0.5, 3.0):
+            histogram.labels("/").observe(value)
+
+        self.assertEqual(
+            sample_lines(self.registry.render()),
+            [
+                'latency_seconds_bucket{route="/",le="0.1"} 2',
+                'latency_seconds_bucket{route="/",le="1.0"} 3',
+                'latency_seconds_bucket{route="/",le="+Inf"} 4',
+                'latency_seconds_sum{route="/"} 3.65',
+                'latency_seconds_count{route="/"} 4',
+            ],
+        )
+
+    def test_callbacks_are_read_at_render(self):
+        sizes = {"a": 1}
+        self.registry.callback(
+            "size",
+            "gauge",
+            "Sizes",
+            lambda: {(k,): v for k, v in sizes.items()},
+            ("key",),
+        )
+        self.registry.callback("total", "counter", "Total", lambda: sum(sizes.values()))
+        sizes["b"] = 2
+        self.assertEqual(
+            sample_lines(self.registry.render()),
+            ['size{key="a"} 1', 'size{key="b"} 2', "total 3"],
+        )
+
+    def test_bad_metrics(self):
+        counter = self.registry.counter("jobs_total", "Jobs", ("kind",))
+        with self.assertRaises(ValueError):
+            counter.labels("a", "b")
+        with self.assertRaises(ValueError):
+            self.registry.gauge("jobs_total", "Again")
+
+
+class TestInitMetrics(unittest.TestCase):
+    def setUp(self):
+        app = Flask(__name__)
+        init_metrics(app)
+
+        @app.route("/items/<item_id>")
+        def item(item_id):
+            return {"id": item_id}
+
+        @app.route("/stream")
+        def stream():
+            return Response(stream_with_context(iter(["a", "b"])))
+
+        self.client = app.test_client()
+
+    def test_requests_are_counted_by_route(self):
+        # Buffered, so the client closes each response as a server would
+        for url in ("/items/1", "/items/2", "/missing", "/stream"):
+            self.client.get(url, buffered=True)
+
+        lines = sample_lines(self.client.get("/metrics").data.decode())
+        self.assertIn(
+            'http_requests_total{method="GET",route="/items/<item_id>",status="200"} 2',
+            lines,
+        )
+        self.assertIn(
+            'http_requests_total{method="GET",route="<unmatched>",status="404"} 1',
+            lines,
+        )
+        self.assertIn(
+            'http_request_duration_seconds_count{method="GET",route="/stream"} 1',
+            lines,
+        )
+        # Only the scrape itself is in flight
+        self.assertIn("http_requests_in_flight 1", lines)
+
+    def test_content_type(self):
+        response = self.client.get("/metrics")
+        self.assertEqual(response.mimetype, "text/plain")
+        self.assertEqual(response.mimetype_params["version"], "0.0.4")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,114 @@
+"""Compare two load-test results and fail on regressions.
+
+Requests/sec going down, p95 or p99 latency going up, errors appearing or
+peak memory growing by more than --threshold percent counts as a regression.
+The exit status is 1 if any scenario regressed, so it can gate a build.
+
+Usage: python loadtest/compare.py BASELINE.json CANDIDATE.json [--threshold PCT]
+"""
+
+import argparse
+import json
+import sys
+
+# Figures compared per scenario: (label, getter, higher is better)
+FIGURES = (
+    ("req/sec", lambda r: r["requests_per_sec"], True),
+    ("p50 ms", lambda r: r.get("latency_ms", {}).get("p50"), False),
+    ("p95 ms", lambda r: r.get("latency_ms", {}).get("p95"), False),
+    ("p99 ms", lambda r: r.get("latency_ms", {}).get("p99"), False),
+)
+# Percentiles that only inform, since they move too much to gate on
+INFORMATIONAL = {"p50 ms"}
+
+
+def change(before, after):
+    """Percent change from ``before`` to ``after``, or None if either is missing"""
+    if before is None or after is None:
+        return None
+    if before == 0:
+        return 0.0 if after == 0 else float("inf")
+    return (after - before) / before * 100
+
+
+def compare(baseline, candidate, threshold):
+    """Rows of (scenario, figure, before, after, change, regressed)"""
+    rows = []
+    for name, before in baseline["scenarios"].items():
+        after = candidate["scenarios"].get(name)
+        if after is None:
+            continue
+        figures = list(FIGURES)
+        for service in sorted(before.get("peak_rss_mib", {})):
+            figures.append(
+                (
+                    f"{service} MiB",
+                    lambda r, s=service: r.get("peak_rss_mib", {}).get(s),
+                    False,
+                )
+            )
+        for label, get, higher_is_better in figures:
+            old, new = get(before), get(after)
+            percent = change(old, new)
+            worse = -percent if higher_is_better and percent is not None else percent
+            regressed = (
+                label not in INFORMATIONAL and worse is not None and worse > threshold
+            )
+            rows.append((name, label, old, new, percent, regressed))
+        rows.append(
+            (
+                name,
+                "error rate",
+                error_rate(before),
+                error_rate(after),
+                None,
+                error_rate(after) > error_rate(before),
+            )
+        )
+    return rows
+
+
+def error_rate(result):
+    requests = result["requests"]
+    return round(result["errors"] / requests, 4) if requests else 0.0
+
+
+def load(path):
+    with open(path) as f:
+        return json.load(f)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("baseline")
+    parser.add_argument("candidate")
+    parser.add_argument(
+        "--threshold", type=float, default=10, help="percent change allowed"
+    )
+    args = parser.parse_args()
+    baseline, candidate = load(args.baseline), load(args.candidate)
+
+    for label, result in (("baseline", baseline), ("candidate", candidate)):
+        meta = result["meta"]
+        print(f"{label:<10} {meta['git_commit']} {meta['created_at']}")
+    if baseline["meta"]["settings"] != candidate["meta"]["settings"]:
+        print("warning: the runs used different settings")
+
+    rows = compare(baseline, candidate, args.threshold)
+    print(
+        f"\n{'scenario':<10} {'figure':<16} {'before':>10} {'after':>10} {'change':>8}"
+    )
+    for name, label, old, new, percent, regressed in rows:
+        shown = "" if percent is None else f"{percent:+.1f}%"
+        print(
+            f"{name:<10} {label:<16} {old!s:>10} {new!s:>10} {shown:>8}"
+            + ("  REGRESSED" if regressed else "")
+        )
+    regressions = sum(row[-1] for row in rows)
+    if regressions:
+        print(f"\n{regressions} regression(s) beyond {args.threshold:g}%")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
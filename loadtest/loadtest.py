@@ -0,0 +1,477 @@
+"""Load-test Service A and Service B running locally, saving the results as JSON.
+
+Service A is started with gunicorn and seeded with --users synthetic users,
+then Service B is started against it. Each scenario drives a fixed mix of
+requests from --concurrency clients for --duration seconds:
+
+  crud     Service A reads, updates, creates and deletes single users
+  list     Service A pages through users and streams the whole list
+  process  Service B processes users, mostly the same few hot ones
+
+Latency percentiles, requests/sec, errors and the resident memory of each
+service are printed and written to --output, to be compared with
+compare.py.
+
+Usage: python loadtest/loadtest.py [--users N] [--duration S] [--scenario NAME]
+"""
+
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import platform
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+from bisect import bisect_left
+from collections import defaultdict
+
+import aiohttp
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RESULTS_DIR = os.path.join(ROOT, "loadtest", "results")
+
+FIRST = ["Ahmed", "Mona", "Omar", "Sara", "Youssef", "Laila", "Karim", "Zoë"]
+LAST = ["Aly", "Hassan", "Abdel Aziz", "Farouk", "El Sayed", "Martin"]
+DOMAINS = ["gmail.com", "yahoo.com", "acme.com", "hotmail.com", "example.org"]
+
+# Users per seeding request
+SEED_CHUNK = 10_000
+# Seconds between memory samples
+RSS_INTERVAL = 0.5
+PERCENTILES = (50, 95, 99)
+
+
+def make_user(n):
+    return {
+        "name": f"{FIRST[n % len(FIRST)]} {LAST[n * 7 % len(LAST)]}",
+        "email": f"user{n}@{DOMAINS[n % len(DOMAINS)]}",
+    }
+
+
+class ZipfKeys:
+    """Pick keys with probability proportional to 1 / rank ** ``skew``
+
+    With a skew around 1 a handful of keys get most of the picks, like the
+    hot users of a real workload. A skew of 0 picks uniformly.
+    """
+
+    def __init__(self, keys, skew, rng):
+        self.keys = list(keys)
+        self.rng = rng
+        total = 0.0
+        self.cumulative = []
+        for rank in range(1, len(self.keys) + 1):
+            total += 1 / rank**skew
+            self.cumulative.append(total)
+
+    def pick(self):
+        point = self.rng.random() * self.cumulative[-1]
+        return self.keys[bisect_left(self.cumulative, point)]
+
+
+def percentile(sorted_values, percent):
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return None
+    rank = max(1, -(-len(sorted_values) * percent // 100))
+    return sorted_values[int(rank) - 1]
+
+
+def summarize(latencies, errors, elapsed):
+    """Request count, rate, errors and latency in ms of one set of requests"""
+    latencies = sorted(latencies)
+    summary = {
+        "requests": len(latencies),
+        "errors": errors,
+        "requests_per_sec": round(len(latencies) / elapsed, 1) if elapsed else 0.0,
+    }
+    if latencies:
+        summary["latency_ms"] = {
+            **{f"p{p}": round(percentile(latencies, p) * 1000, 2) for p in PERCENTILES},
+            "mean": round(sum(latencies) / len(latencies) * 1000, 2),
+            "max": round(latencies[-1] * 1000, 2),
+        }
+    return summary
+
+
+# Scenarios: the service they load and the weight of each operation. An
+# operation is a coroutine function (session, state) -> (status, expected).
+
+
+async def get_user(session, state):
+    async with session.get(f"/users/{state.keys.pick()}") as response:
+        await response.read()
+        return response.status, (200,)
+
+
+async def update_user(session, state):
+    user_id = state.keys.pick()
+    body = {"name": f"Renamed {state.rng.randrange(1_000_000)}"}
+    async with session.put(f"/users/{user_id}", json=body) as response:
+        await response.read()
+        return response.status, (200,)
+
+
+async def create_user(session, state):
+    n = next(state.counter)
+    async with session.post("/users", json=make_user(n)) as response:
+        body = await response.json()
+        if response.status == 201:
+            state.created.append(body["id"])
+        return response.status, (201,)
+
+
+async def delete_user(session, state):
+    # Only users created by this run, so the seeded ones stay
+    if not state.created:
+        return await create_user(session, state)
+    user_id = state.created.pop(state.rng.randrange(len(state.created)))
+    async with session.delete(f"/users/{user_id}") as response:
+        await response.read()
+        return response.status, (204,)
+
+
+async def list_page(session, state, limit=100):
+    cursor = state.rng.randrange(max(1, state.users - limit))
+    params = {"limit": limit, "cursor": cursor} if cursor else {"limit": limit}
+    async with session.get("/users", params=params) as response:
+        await response.read()
+        return response.status, (200,)
+
+
+async def list_large_page(session, state):
+    return await list_page(session, state, limit=1000)
+
+
+async def stream_all_users(session, state):
+    async with session.get("/users", params={"format": "ndjson"}) as response:
+        await response.read()
+        return response.status, (200,)
+
+
+async def process_user(session, state):
+    async with session.post(f"/process/user/{state.keys.pick()}") as response:
+        await response.read()
+        return response.status, (200,)
+
+
+async def process_batch(session, state):
+    user_ids = [state.keys.pick() for _ in range(50)]
+    body = {"user_ids": user_ids}
+    async with session.post("/process/users", json=body) as response:
+        await response.read()
+        return response.status, (200,)
+
+
+SCENARIOS = {
+    "crud": (
+        "service_a",
+        {get_user: 50, update_user: 20, create_user: 15, delete_user: 15},
+    ),
+    "list": (
+        "service_a",
+        {list_page: 60, list_large_page: 30, stream_all_users: 10},
+    ),
+    "process": ("service_b", {process_user: 90, process_batch: 10}),
+}
+
+
+class ClientState:
+    """What one simulated client remembers between its requests"""
+
+    def __init__(self, keys, users, rng, counter):
+        self.keys = keys
+        self.users = users
+        self.rng = rng
+        self.counter = counter
+        self.created = []
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_service(name, env, log):
+    """Start a service with gunicorn and its own gunicorn.conf.py, returning (process, url)"""
+    port = free_port()
+    process = subprocess.Popen(
+        [sys.executable, "-m", "gunicorn", "-c", "gunicorn.conf.py"],
+        cwd=os.path.join(ROOT, name),
+        env=dict(os.environ, GUNICORN_BIND=f"127.0.0.1:{port}", **env),
+        stdout=subprocess.DEVNULL,
+        stderr=log,
+    )
+    url = f"http://127.0.0.1:{port}"
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            break
+        try:
+            urllib.request.urlopen(f"{url}/metrics", timeout=1).close()
+            return process, url
+        except OSError:
+            time.sleep(0.1)
+    process.kill()
+    raise RuntimeError(f"{name} did not start, see {log.name}")
+
+
+def process_tree(pid):
+    """``pid`` and all its descendants, read from /proc"""
+    pids = [pid]
+    for parent in pids:
+        try:
+            with open(f"/proc/{parent}/task/{parent}/children") as f:
+                pids.extend(int(child) for child in f.read().split())
+        except OSError:
+            pass
+    return pids
+
+
+def rss_bytes(pid):
+    """Resident memory of ``pid`` and its descendants, or None off Linux"""
+    total = None
+    for member in process_tree(pid):
+        try:
+            with open(f"/proc/{member}/status") as f:
+                for line in f:
+                    if line.startswith("VmRSS:"):
+                        total = (total or 0) + int(line.split()[1]) * 1024
+        except OSError:
+            pass
+    return total
+
+
+async def sample_rss(processes, peaks, stop):
+    while not stop.is_set():
+        for name, process in processes.items():
+            rss = rss_bytes(process.pid)
+            if rss is not None:
+                peaks[name] = max(peaks.get(name, 0), rss)
+        try:
+            await asyncio.wait_for(stop.wait(), RSS_INTERVAL)
+        except asyncio.TimeoutError:
+            pass
+
+
+def seed_users(url, count):
+    """Create ``count`` users in Service A with its bulk endpoint, returning their IDs"""
+    user_ids = []
+    for start in range(0, count, SEED_CHUNK):
+        lines = (
+            json.dumps(make_user(n))
+            for n in range(start, min(start + SEED_CHUNK, count))
+        )
+        request = urllib.request.Request(
+            f"{url}/users/bulk",
+            data="\n".join(lines).encode(),
+            headers={"Content-Type": "application/x-ndjson"},
+        )
+        with urllib.request.urlopen(request, timeout=120) as response:
+            for line in response:
+                result = json.loads(line)
+                if result["status"] != 201:
+                    raise RuntimeError(f"Seeding failed: {result}")
+                user_ids.append(result["user"]["id"])
+    return user_ids
+
+
+async def run_scenario(name, url, user_ids, args, processes):
+    """Drive scenario ``name`` against ``url``, returning its results"""
+    _, weights = SCENARIOS[name]
+    operations = list(weights)
+    cum_weights = list(itertools.accumulate(weights.values()))
+    counter = itertools.count(len(user_ids) + 1_000_000)
+    # Per-operation latencies and errors, recorded after the warm-up only
+    latencies = defaultdict(list)
+    errors = defaultdict(int)
+    recording = False
+
+    async def client(session, seed):
+        rng = random.Random(seed)
+        state = ClientState(
+            ZipfKeys(hot_order, args.skew, rng), len(user_ids), rng, counter
+        )
+        while time.monotonic() < deadline:
+            operation = rng.choices(operations, cum_weights=cum_weights)[0]
+            start = time.perf_counter()
+            try:
+                status, expected = await operation(session, state)
+                failed = status not in expected
+            except (aiohttp.ClientError, asyncio.TimeoutError, ValueError):
+                failed = True
+            elapsed = time.perf_counter() - start
+            if recording:
+                latencies[operation.__name__].append(elapsed)
+                errors[operation.__name__] += failed
+
+    # The same users are hot in every run with the same seed
+    hot_order = list(user_ids)
+    random.Random(args.seed).shuffle(hot_order)
+
+    peaks = {}
+    stop = asyncio.Event()
+    sampler = asyncio.ensure_future(sample_rss(processes, peaks, stop))
+    connector = aiohttp.TCPConnector(limit=args.concurrency)
+    timeout = aiohttp.ClientTimeout(total=30)
+    async with aiohttp.ClientSession(
+        url, connector=connector, timeout=timeout
+    ) as session:
+        deadline = time.monotonic() + args.warmup + args.duration
+        clients = asyncio.gather(
+            *(client(session, args.seed * 1000 + n) for n in range(args.concurrency))
+        )
+        await asyncio.sleep(args.warmup)
+        recording = True
+        started = time.perf_counter()
+        await clients
+        elapsed = time.perf_counter() - started
+    stop.set()
+    await sampler
+
+    every = [value for values in latencies.values() for value in values]
+    result = summarize(every, sum(errors.values()), elapsed)
+    result["duration"] = round(elapsed, 2)
+    result["operations"] = {
+        op.__name__: summarize(latencies[op.__name__], errors[op.__name__], elapsed)
+        for op in operations
+        if op.__name__ in latencies
+    }
+    result["peak_rss_mib"] = {
+        service: round(rss / 2**20, 1) for service, rss in peaks.items()
+    }
+    return result
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=ROOT,
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def parse_env(values):
+    env = {}
+    for value in values:
+        key, sep, setting = value.partition("=")
+        if not sep:
+            raise argparse.ArgumentTypeError(f"--set takes KEY=VALUE, not {value}")
+        env[key] = setting
+    return env
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--users", type=int, default=10_000)
+    parser.add_argument("--duration", type=float, default=20, help="seconds")
+    parser.add_argument("--warmup", type=float, default=3, help="seconds")
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--skew", type=float, default=1.1, help="Zipf exponent")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument(
+        "--scenario", action="append", choices=sorted(SCENARIOS), dest="scenarios"
+    )
+    parser.add_argument(
+        "--set",
+        action="append",
+        default=[],
+        metavar="KEY=VALUE",
+        help="environment setting for both services",
+    )
+    parser.add_argument("--output", help="results file, by default in loadtest/results")
+    args = parser.parse_args()
+    scenarios = args.scenarios or list(SCENARIOS)
+    env = parse_env(args.set)
+
+    workdir = tempfile.TemporaryDirectory(prefix="loadtest-")
+    log = open(os.path.join(workdir.name, "services.log"), "w")
+    processes = {}
+    try:
+        processes["service_a"], url_a = start_service("service_a", env, log)
+        print(f"Seeding {args.users} users...")
+        user_ids = seed_users(url_a, args.users)
+        env_b = dict(
+            env, SERVICE_A_URL=url_a, JOBS_DIR=os.path.join(workdir.name, "jobs")
+        )
+        processes["service_b"], url_b = start_service("service_b", env_b, log)
+        urls = {"service_a": url_a, "service_b": url_b}
+
+        results = {}
+        for name in scenarios:
+            service, _ = SCENARIOS[name]
+            print(f"Running {name} against {service} for {args.duration:g}s...")
+            results[name] = asyncio.run(
+                run_scenario(name, urls[service], user_ids, args, processes)
+            )
+    finally:
+        for process in processes.values():
+            process.terminate()
+            process.wait()
+        log.close()
+        workdir.cleanup()
+
+    report = {
+        "meta": {
+            "created_at": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "git_commit": git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "settings": {
+                key: getattr(args, key)
+                for key in (
+                    "users",
+                    "duration",
+                    "warmup",
+                    "concurrency",
+                    "skew",
+                    "seed",
+                )
+            },
+            "env": env,
+        },
+        "scenarios": results,
+    }
+    print_report(results)
+    output = args.output or os.path.join(
+        RESULTS_DIR, time.strftime("%Y%m%d-%H%M%S.json")
+    )
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"Saved {output}")
+
+
+def print_report(results):
+    print(
+        f"\n{'scenario':<10} {'operation':<18} {'req/sec':>9} {'errors':>7}"
+        f" {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}"
+    )
+    for name, result in results.items():
+        rows = [("all", result)] + list(result["operations"].items())
+        for operation, summary in rows:
+            latency = summary.get("latency_ms", {})
+            print(
+                f"{name:<10} {operation:<18} {summary['requests_per_sec']:>9,.1f}"
+                f" {summary['errors']:>7}"
+                + "".join(f" {latency.get(f'p{p}', 0):>8.2f}" for p in PERCENTILES)
+            )
+        rss = ", ".join(f"{k} {v} MiB" for k, v in result["peak_rss_mib"].items())
+        print(f"{'':<10} peak RSS: {rss}")
+
+
+if __name__ == "__main__":
+    main()
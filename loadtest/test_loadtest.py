@@ -0,0 +1,63 @@
+"""Tests for the load-test helpers that do not need the services running."""
+
+import random
+import unittest
+from collections import Counter
+
+from compare import compare
+from loadtest import ZipfKeys, percentile, summarize
+
+
+def result(rps, p95, errors=0, rss=100.0):
+    return {
+        "scenarios": {
+            "crud": {
+                "requests": 1000,
+                "errors": errors,
+                "requests_per_sec": rps,
+                "latency_ms": {"p50": 1.0, "p95": p95, "p99": p95 * 2},
+                "peak_rss_mib": {"service_a": rss},
+            }
+        }
+    }
+
+
+class TestLoadTest(unittest.TestCase):
+    def test_percentile_is_nearest_rank(self):
+        values = list(range(1, 101))
+        self.assertEqual(percentile(values, 50), 50)
+        self.assertEqual(percentile(values, 99), 99)
+        self.assertEqual(percentile([7], 95), 7)
+        self.assertIsNone(percentile([], 50))
+
+    def test_summarize(self):
+        summary = summarize([0.003, 0.001, 0.002], errors=1, elapsed=2)
+        self.assertEqual(summary["requests"], 3)
+        self.assertEqual(summary["requests_per_sec"], 1.5)
+        self.assertEqual(summary["latency_ms"]["p50"], 2.0)
+        self.assertEqual(summary["latency_ms"]["max"], 3.0)
+
+    def test_zipf_keys_are_skewed_and_reproducible(self):
+        runs = []
+        for _ in range(2):
+            keys = ZipfKeys("abcdefghij", 1.1, random.Random(1))
+            runs.append([keys.pick() for _ in range(5000)])
+        self.assertEqual(runs[0], runs[1])
+        counts = Counter(runs[0])
+        self.assertGreater(counts["a"], 4 * counts["j"])
+
+    def test_compare_flags_regressions(self):
+        rows = compare(result(1000, 10), result(950, 10.5), threshold=10)
+        self.assertFalse(any(row[-1] for row in rows))
+
+        rows = compare(result(1000, 10), result(800, 10, errors=3, rss=120), 10)
+        regressed = {row[1] for row in rows if row[-1]}
+        self.assertEqual(regressed, {"req/sec", "error rate", "service_a MiB"})
+
+        rows = compare(result(1000, 10), result(1000, 12), threshold=10)
+        regressed = {row[1] for row in rows if row[-1]}
+        self.assertEqual(regressed, {"p95 ms", "p99 ms"})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,295 +1,485 @@
-from flask import Flask, request, jsonify
-from typing import Dict
-
-app = Flask(__name__)
-
-# In-memory storage for users with default user
-users: Dict[str, dict] = {}
-
-
-@app.route("/")
-def home():
-    """Simple home page with UI"""
-    return """
-    <html>
-    <head>
-        <title>User Service</title>
-        <style>
-            body {
-                font-family: Arial, sans-serif;
-                max-width: 800px;
-                margin: 0 auto;
-                padding: 20px;
-            }
-            .container {
-                display: flex;
-                flex-direction: column;
-                gap: 20px;
-            }
-            .form-section {
-                padding: 20px;
-                border: 1px solid #ccc;
-                border-radius: 5px;
-            }
-            .form-group { margin-bottom: 15px; }
-            label { display: block; margin-bottom: 5px; }
-            input {
-                width: 100%;
-                padding: 8px;
-                margin-bottom: 10px;
-            }
-            button {
-                background-color: #4CAF50;
-                color: white;
-                padding: 10px 15px;
-                border: none;
-                border-radius: 4px;
-                cursor: pointer;
-            }
-            button:hover { background-color: #45a049; }
-            button.delete { background-color: #f44336; }
-            button.delete:hover { background-color: #da190b; }
-            button.update { background-color: #2196F3; }
-            button.update:hover { background-color: #0b7dda; }
-            #result { margin-top: 20px; padding: 10px; border: 1px solid #ddd; border-radius: 4px; }
-            .success { color: #4CAF50; }
-            .error { color: #f44336; }
-            .user-list { margin-top: 20px; }
-            .user-item { padding: 10px; border: 1px solid #ddd; margin-bottom: 10px; border-radius: 4px; }
-        </style>
-    </head>
-    <body>
-        <h1>User Service</h1>
-        <div class="container">
-            <div class="form-section">
-                <h2>Create User</h2>
-                <form id="createForm">
-                    <div class="form-group">
-                        <label for="name">Name:</label>
-                        <input type="text" id="name" name="name" required>
-                    </div>
-                    <div class="form-group">
-                        <label for="email">Email:</label>
-                        <input type="email" id="email" name="email" required>
-                    </div>
-                    <button type="submit">Create User</button>
-                </form>
-                <div id="createResult"></div>
-            </div>
-
-            <div class="form-section">
-                <h2>Update User</h2>
-                <form id="updateForm">
-                    <div class="form-group">
-                        <label for="updateId">User ID:</label>
-                        <input type="text" id="updateId" name="updateId" required>
-                    </div>
-                    <div class="form-group">
-                        <label for="updateName">New Name:</label>
-                        <input type="text" id="updateName" name="updateName">
-                    </div>
-                    <div class="form-group">
-                        <label for="updateEmail">New Email:</label>
-                        <input type="email" id="updateEmail" name="updateEmail">
-                    </div>
-                    <button type="submit" class="update">Update User</button>
-                </form>
-                <div id="updateResult"></div>
-            </div>
-
-            <div class="form-section">
-                <h2>Delete User</h2>
-                <form id="deleteForm">
-                    <div class="form-group">
-                        <label for="deleteId">User ID:</label>
-                        <input type="text" id="deleteId" name="deleteId" required>
-                    </div>
-                    <button type="submit" class="delete">Delete User</button>
-                </form>
-                <div id="deleteResult"></div>
-            </div>
-
-            <div class="form-section">
-                <h2>Current Users</h2>
-                <div id="userList" class="user-list"></div>
-            </div>
-        </div>
-
-        <script>
-            // Function to refresh user list
-            async function refreshUserList() {
-                try {
-                    const response = await fetch('/users');
-                    const users = await response.json();
-                    const userList = document.getElementById('userList');
-                    userList.innerHTML = '';
-
-                    users.forEach(user => {
-                        const userDiv = document.createElement('div');
-                        userDiv.className = 'user-item';
-                        userDiv.innerHTML = `
-                            <strong>ID:</strong> ${user.id}<br>
-                            <strong>Name:</strong> ${user.name}<br>
-                            <strong>Email:</strong> ${user.email}
-                        `;
-                        userList.appendChild(userDiv);
-                    });
-                } catch (error) {
-                    console.error('Error fetching users:', error);
-                }
-            }
-
-            // Create user
-            document.getElementById('createForm').addEventListener('submit', async (e) => {
-                e.preventDefault();
-                const formData = {
-                    name: document.getElementById('name').value,
-                    email: document.getElementById('email').value
-                };
-
-                try {
-                    const response = await fetch('/users', {
-                        method: 'POST',
-                        headers: { 'Content-Type': 'application/json' },
-                        body: JSON.stringify(formData)
-                    });
-                    const data = await response.json();
-                    document.getElementById('createResult').innerHTML =
-                        `<p class="success">User created successfully!</p>
-                         <pre>${JSON.stringify(data, null, 2)}</pre>`;
-                    document.getElementById('createForm').reset();
-                    refreshUserList();
-                } catch (error) {
-                    document.getElementById('createResult').innerHTML =
-                        `<p class="error">Error: ${error.message}</p>`;
-                }
-            });
-
-            // Update user
-            document.getElementById('updateForm').addEventListener('submit', async (e) => {
-                e.preventDefault();
-                const userId = document.getElementById('updateId').value;
-                const formData = {};
-
-                const name = document.getElementById('updateName').value;
-                const email = document.getElementById('updateEmail').value;
-
-                if (name) formData.name = name;
-                if (email) formData.email = email;
-
-                if (Object.keys(formData).length === 0) {
-                    document.getElementById('updateResult').innerHTML =
-                        `<p class="error">Please provide at least one field to update</p>`;
-                    return;
-                }
-
-                try {
-                    const response = await fetch(`/users/${userId}`, {
-                        method: 'PUT',
-                        headers: { 'Content-Type': 'application/json' },
-                        body: JSON.stringify(formData)
-                    });
-                    const data = await response.json();
-                    document.getElementById('updateResult').innerHTML =
-                        `<p class="success">User updated successfully!</p>
-                         <pre>${JSON.stringify(data, null, 2)}</pre>`;
-                    document.getElementById('updateForm').reset();
-                    refreshUserList();
-                } catch (error) {
-                    document.getElementById('updateResult').innerHTML =
-                        `<p class="error">Error: ${error.message}</p>`;
-                }
-            });
-
-            // Delete user
-            document.getElementById('deleteForm').addEventListener('submit', async (e) => {
-                e.preventDefault();
-                const userId = document.getElementById('deleteId').value;
-
-                try {
-                    const response = await fetch(`/users/${userId}`, {
-                        method: 'DELETE'
-                    });
-                    if (response.ok) {
-                        document.getElementById('deleteResult').innerHTML =
-                            `<p class="success">User deleted successfully!</p>`;
-                        document.getElementById('deleteForm').reset();
-                        refreshUserList();
-                    } else {
-                        const data = await response.json();
-                        document.getElementById('deleteResult').innerHTML =
-                            `<p class="error">Error: ${data.error}</p>`;
-                    }
-                } catch (error) {
-                    document.getElementById('deleteResult').innerHTML =
-                        `<p class="error">Error: ${error.message}</p>`;
-                }
-            });
-
-            // Initial load of user list
-            refreshUserList();
-        </script>
-    </body>
-    </html>
-    """
-
-
-@app.route("/users", methods=["POST"])
+import os
+from typing import Iterator, List, Optional, Tuple
+
+from flask import (
+    Blueprint,
+    Flask,
+    Response,
+    current_app,
+    request,
+    jsonify,
+    stream_with_context,
+)
+from service_common.assets import init_compression, init_ui
+from service_common.json_provider import OrjsonProvider, dumps
+from service_common.metrics import Registry, init_metrics
+from werkzeug.local import LocalProxy
+
+from bulk import apply_chunk, iter_chunks, iter_json_array, iter_ndjson
+from changes import ChangeLog
+from persistence import DurableUserStore
+from storage import MAX_USER_ID, EmailTakenError, UserStore, create_store
+
+bp = Blueprint("users", __name__)
+
+# Configuration
+STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "memory")
+SQLITE_PATH = os.getenv("SQLITE_PATH", "users.db")
+# Keep the memory backend's users in this directory, as snapshots and a
+# write-ahead log, so they survive restarts. Empty keeps them in memory only.
+PERSIST_DIR = os.getenv("PERSIST_DIR", "")
+# Return writes only once they are synced to disk; without it they survive
+# the process dying but not the machine
+PERSIST_FSYNC = os.getenv("PERSIST_FSYNC", "1") == "1"
+# Changes logged before a new snapshot is taken in the background
+SNAPSHOT_EVERY = int(os.getenv("SNAPSHOT_EVERY", "100000"))
+# Number of recent changes kept for GET /users/changes
+CHANGE_LOG_SIZE = int(os.getenv("CHANGE_LOG_SIZE", "10000"))
+# The development server's debugger and reloader are off unless asked for
+DEBUG = os.getenv("FLASK_DEBUG", "0") == "1"
+# Gzip JSON responses of at least this many bytes for clients that accept
+# it; streamed ones are always compressed. -1 turns compression off.
+COMPRESS_MIN_SIZE = int(os.getenv("COMPRESS_MIN_SIZE", "1024"))
+COMPRESS_LEVEL = int(os.getenv("COMPRESS_LEVEL", "6"))
+# Serve request, latency and store metrics at /metrics
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "1") == "1"
+
+# Home page files, compressed once when the app is created
+UI_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "ui")
+
+# User store and change log of the app handling the request, see create_app
+store = LocalProxy(lambda: current_app.extensions["users"]["store"])
+change_log = LocalProxy(lambda: current_app.extensions["users"]["change_log"])
+
+# Pagination settings for GET /users
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+STREAM_CHUNK_SIZE = 500
+
+# Items applied to the store per batch by the bulk endpoints
+BULK_CHUNK_SIZE = 1000
+
+# Longest long-poll wait and the interval between Server-Sent Events heartbeats
+MAX_POLL_TIMEOUT = 30.0
+SSE_HEARTBEAT = 15.0
+
+
+def _iter_users(after: int, limit: Optional[int] = None) -> Iterator[List[dict]]:
+    """Yield users in ID order, one chunk at a time, stopping after ``limit`` users"""
+    remaining = limit
+    while remaining is None or remaining > 0:
+        size = (
+            STREAM_CHUNK_SIZE
+            if remaining is None
+            else min(STREAM_CHUNK_SIZE, remaining)
+        )
+        chunk = store.list_after(after, size)
+        if not chunk:
+            return
+        yield chunk
+        after = int(chunk[-1]["id"])
+        if remaining is not None:
+            remaining -= len(chunk)
+
+
+def _not_modified(etag: str) -> Optional[Response]:
+    """Return a bodyless 304 if the request's If-None-Match matches ``etag``"""
+    if request.if_none_match.contains_weak(etag):
+        response = Response(status=304)
+        response.set_etag(etag)
+        return response
+    return None
+
+
+def _with_etag(response: Response, etag: str) -> Response:
+    response.set_etag(etag)
+    # Clients may keep the body but must revalidate it before each use
+    response.headers["Cache-Control"] = "no-cache"
+    return response
+
+
+def _dumps(obj) -> str:
+    return dumps(obj).decode("utf-8")
+
+
+def _stream_json_array(chunks: Iterator[List[dict]]) -> Iterator[bytes]:
+    yield b"["
+    first = True
+    for chunk in chunks:
+        body = b",".join([dumps(user) for user in chunk])
+        yield body if first else b"," + body
+        first = False
+    yield b"]\n"
+
+
+def _stream_ndjson(chunks: Iterator[List[dict]]) -> Iterator[bytes]:
+    for chunk in chunks:
+        yield b"".join([dumps(user) + b"\n" for user in chunk])
+
+
+@bp.route("/users", methods=["POST"])
 def create_user():
     """Create a new user"""
-    data = request.get_json()
-    if not data or "name" not in data or "email" not in data:
-        return jsonify({"error": "Name and email are required"}), 400
+    try:
+        name, email = _validate_new_user(request.get_json())
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
 
-    user_id = str(len(users) + 1)
-    user = {"id": user_id, "name": data["name"], "email": data["email"]}
-    users[user_id] = user
+    unique_email = request.args.get("unique_email", "").lower() in ("1", "true")
+    try:
+        user = store.create(name, email, unique_email=unique_email)
+    except EmailTakenError as e:
+        return jsonify({"error": "Email already exists", "id": e.owner_id}), 409
 
     return jsonify(user), 201
 
 
-@app.route("/users", methods=["GET"])
+@bp.route("/users", methods=["GET"])
 def get_all_users():
-    """Get all users"""
-    return jsonify(list(users.values()))
+    """Get all users in ID order
 
+    Without parameters the whole collection is streamed as a JSON array.
+    ``limit`` and/or ``cursor`` return one page with a ``next_cursor`` to pass
+    back, and ``format=ndjson`` streams one user per line instead. ``email``
+    looks up the users with that email through the email index.
 
-@app.route("/users/<user_id>", methods=["GET"])
+    Every form carries an ETag of the store epoch and version, read before
+    the users are, so an unchanged collection is answered with a bodyless 304.
+    """
+    etag = f"{store.epoch}-c{store.version}"
+    not_modified = _not_modified(etag)
+    if not_modified is not None:
+        return not_modified
+
+    if "email" in request.args:
+        return _with_etag(jsonify(store.find_by_email(request.args["email"])), etag)
+
+    try:
+        after = int(request.args.get("cursor", 0))
+        limit = int(request.args["limit"]) if "limit" in request.args else None
+    except ValueError:
+        return jsonify({"error": "cursor and limit must be integers"}), 400
+    if not 0 <= after <= MAX_USER_ID:
+        return jsonify({"error": f"cursor must be between 0 and {MAX_USER_ID}"}), 400
+    if limit is not None and not 1 <= limit <= MAX_PAGE_SIZE:
+        return jsonify({"error": f"limit must be between 1 and {MAX_PAGE_SIZE}"}), 400
+
+    if request.args.get("format") == "ndjson":
+        return _with_etag(
+            Response(
+                stream_with_context(_stream_ndjson(_iter_users(after, limit))),
+                mimetype="application/x-ndjson",
+            ),
+            etag,
+        )
+
+    if limit is None and "cursor" not in request.args:
+        return _with_etag(
+            Response(
+                stream_with_context(_stream_json_array(_iter_users(after))),
+                mimetype="application/json",
+            ),
+            etag,
+        )
+
+    page = store.list_after(after, limit or DEFAULT_PAGE_SIZE)
+    next_cursor = None
+    if page and len(page) == (limit or DEFAULT_PAGE_SIZE):
+        next_cursor = page[-1]["id"]
+    return _with_etag(jsonify({"users": page, "next_cursor": next_cursor}), etag)
+
+
+def _changes_since(
+    since: int, epoch: Optional[str], limit: int
+) -> Tuple[List[dict], bool]:
+    """``change_log.since``, resetting consumers that follow another epoch"""
+    if epoch is not None and epoch != store.epoch:
+        return [], True
+    return change_log.since(since, limit)
+
+
+def _stream_changes(since: int, epoch: Optional[str]) -> Iterator[str]:
+    """Yield Server-Sent Events for every change after ``since``"""
+    while True:
+        changes, reset = _changes_since(since, epoch, MAX_PAGE_SIZE)
+        if reset:
+            since, epoch = change_log.version, store.epoch
+            data = _dumps({"version": since, "epoch": epoch})
+            yield f"event: reset\ndata: {data}\n\n"
+            continue
+        if changes:
+            yield "".join(
+                f"id: {change['version']}\nevent: {change['op']}\ndata: {_dumps(change)}\n\n"
+                for change in changes
+            )
+            since = changes[-1]["version"]
+        elif not change_log.wait(since, SSE_HEARTBEAT):
+            yield ": keep-alive\n\n"
+
+
+@bp.route("/users/changes", methods=["GET"])
+def get_user_changes():
+    """Get changes to users made after the ``since`` version
+
+    Returns ``{"epoch", "version", "changes", "reset"}``; pass ``version``
+    back as the next ``since`` and ``epoch`` as ``epoch``. With ``timeout``
+    the request waits up to that many seconds for a change. ``reset`` means
+    the requested changes are not available, because they are no longer
+    retained or Service A restarted since, and the consumer must reload
+    everything. Clients accepting ``text/event-stream`` get a Server-Sent
+    Events stream instead.
+
+    The feed only holds this process's writes, so it is refused for a store
+    shared between processes rather than silently missing changes.
+    """
+    if store.shared:
+        return (
+            jsonify({"error": "The change feed needs a store owned by one process"}),
+            501,
+        )
+    epoch = request.args.get("epoch")
+    try:
+        since = int(request.headers.get("Last-Event-ID", request.args.get("since", 0)))
+        timeout = min(float(request.args.get("timeout", 0)), MAX_POLL_TIMEOUT)
+        limit = int(request.args.get("limit", MAX_PAGE_SIZE))
+    except ValueError:
+        return jsonify({"error": "since, timeout and limit must be numbers"}), 400
+    if not 1 <= limit <= MAX_PAGE_SIZE:
+        return jsonify({"error": f"limit must be between 1 and {MAX_PAGE_SIZE}"}), 400
+
+    if request.accept_mimetypes.best == "text/event-stream":
+        return Response(
+            stream_with_context(_stream_changes(since, epoch)),
+            mimetype="text/event-stream",
+        )
+
+    changes, reset = _changes_since(since, epoch, limit)
+    if not changes and not reset and timeout > 0:
+        change_log.wait(since, timeout)
+        changes, reset = _changes_since(since, epoch, limit)
+
+    if changes:
+        version = changes[-1]["version"]
+    else:
+        version = change_log.version if reset else since
+    return jsonify(
+        {"epoch": store.epoch, "version": version, "changes": changes, "reset": reset}
+    )
+
+
+@bp.route("/stats", methods=["GET"])
+def get_stats():
+    """Number of users and the bytes the store holds for them"""
+    return jsonify({"version": store.version, **store.stats()})
+
+
+@bp.route("/users/<user_id>", methods=["GET"])
 def get_user(user_id: str):
-    """Get a specific user by ID"""
-    if user_id not in users:
+    """Get a specific user by ID, with an ETag of the version of its last write
+
+    The tag includes the store epoch, since a store whose versions started
+    again from 0 can give another user, or another write, the same version.
+    """
+    found = store.get_versioned(user_id)
+    if found is None:
         return jsonify({"error": "User not found"}), 404
-    return jsonify(users[user_id])
+    user, version = found
+    etag = f"{store.epoch}-u{version}"
+    not_modified = _not_modified(etag)
+    if not_modified is not None:
+        return not_modified
+    return _with_etag(jsonify(user), etag)
 
 
-@app.route("/users/<user_id>", methods=["PUT"])
+@bp.route("/users/<user_id>", methods=["PUT"])
 def update_user(user_id: str):
     """Update user data"""
-    if user_id not in users:
+    if store.get(user_id) is None:
         return jsonify({"error": "User not found"}), 404
 
     data = request.get_json()
     if not data:
         return jsonify({"error": "No data provided"}), 400
-
-    user = users[user_id]
-    if "name" in data:
-        user["name"] = data["name"]
-    if "email" in data:
-        user["email"] = data["email"]
+    if not isinstance(data, dict):
+        return jsonify({"error": "Body must be a JSON object"}), 400
+    try:
+        _validate_fields(data)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    user = store.update(user_id, data)
+    if user is None:
+        return jsonify({"error": "User not found"}), 404
     return jsonify(user)
 
 
-@app.route("/users/<user_id>", methods=["DELETE"])
+@bp.route("/users/<user_id>", methods=["DELETE"])
 def delete_user(user_id: str):
     """Delete a user"""
-    if user_id not in users:
+    if not store.delete(user_id):
         return jsonify({"error": "User not found"}), 404
 
-    del users[user_id]
-
     return "", 204
 
 
+def _validate_fields(item: dict) -> dict:
+    """The ``name`` and ``email`` of ``item``, which must be strings if given"""
+    fields = {key: item[key] for key in ("name", "email") if key in item}
+    if not all(isinstance(value, str) for value in fields.values()):
+        raise ValueError("Name and email must be strings")
+    return fields
+
+
+def _validate_new_user(item) -> tuple:
+    if not isinstance(item, dict) or "name" not in item or "email" not in item:
+        raise ValueError("Name and email are required")
+    _validate_fields(item)
+    return item["name"], item["email"]
+
+
+def _validate_user_update(item) -> tuple:
+    if not isinstance(item, dict) or "id" not in item:
+        raise ValueError("User ID is required")
+    fields = _validate_fields(item)
+    if not fields:
+        raise ValueError("No data provided")
+    return str(item["id"]), fields
+
+
+def _validate_user_id(item) -> str:
+    if isinstance(item, dict):
+        item = item.get("id")
+    if not isinstance(item, (str, int)) or isinstance(item, bool):
+        raise ValueError("User ID is required")
+    return str(item)
+
+
+def _bulk_response(validate, apply) -> Response:
+    """Stream per-item results while applying the request body in batches
+
+    The body is a JSON array, or one item per line when sent as
+    ``application/x-ndjson``, and the results come back in the same format.
+    """
+    ndjson = request.mimetype == "application/x-ndjson"
+    parse = iter_ndjson if ndjson else iter_json_array
+    results = (
+        result
+        for chunk in iter_chunks(parse(request.stream), BULK_CHUNK_SIZE)
+        for result in apply_chunk(chunk, validate, apply)
+    )
+
+    if ndjson:
+        body = (dumps(result) + b"\n" for result in results)
+        return Response(stream_with_context(body), mimetype="application/x-ndjson")
+
+    def json_body() -> Iterator[str]:
+        succeeded = failed = 0
+        yield '{"results":['
+        for result in results:
+            if result["status"] < 400:
+                succeeded += 1
+            else:
+                failed += 1
+            yield ("," if succeeded + failed > 1 else "") + _dumps(result)
+        yield f'],"succeeded":{succeeded},"failed":{failed}}}\n'
+
+    return Response(stream_with_context(json_body()), mimetype="application/json")
+
+
+@bp.route("/users/bulk", methods=["POST"])
+def create_users_bulk():
+    """Create many users from one request body"""
+
+    def apply(items):
+        return [{"status": 201, "user": user} for user in store.create_many(items)]
+
+    return _bulk_response(_validate_new_user, apply)
+
+
+@bp.route("/users/bulk", methods=["PATCH"])
+def update_users_bulk():
+    """Update many users from one request body"""
+
+    def apply(items):
+        return [
+            (
+                {"status": 200, "user": user}
+                if user is not None
+                else {"status": 404, "error": "User not found", "id": user_id}
+            )
+            for (user_id, _), user in zip(items, store.update_many(items))
+        ]
+
+    return _bulk_response(_validate_user_update, apply)
+
+
+@bp.route("/users/bulk", methods=["DELETE"])
+def delete_users_bulk():
+    """Delete many users from one request body"""
+
+    def apply(user_ids):
+        return [
+            (
+                {"status": 204, "id": user_id}
+                if deleted
+                else {"status": 404, "error": "User not found", "id": user_id}
+            )
+            for user_id, deleted in zip(user_ids, store.delete_many(user_ids))
+        ]
+
+    return _bulk_response(_validate_user_id, apply)
+
+
+def init_store_metrics(registry: Registry, user_store: UserStore) -> None:
+    """Report the size and version of ``user_store``, read at every scrape"""
+    registry.callback(
+        "service_a_users", "gauge", "Users in the store", user_store.count
+    )
+    registry.callback(
+        "service_a_store_version",
+        "counter",
+        "Changes made to the store",
+        lambda: user_store.version,
+    )
+    registry.callback(
+        "service_a_store_bytes",
+        "gauge",
+        "Bytes the store holds for its users, estimated for the memory backend",
+        lambda: user_store.stats().get("bytes", 0),
+    )
+
+
+def make_store() -> UserStore:
+    """Build the store selected by STORAGE_BACKEND and PERSIST_DIR"""
+    if not PERSIST_DIR:
+        return create_store(STORAGE_BACKEND, SQLITE_PATH)
+    if STORAGE_BACKEND != "memory":
+        raise ValueError("PERSIST_DIR only applies to STORAGE_BACKEND=memory")
+    return DurableUserStore(PERSIST_DIR, PERSIST_FSYNC, SNAPSHOT_EVERY)
+
+
+def create_app(user_store: Optional[UserStore] = None) -> Flask:
+    """Create the Service A app with its own user store and change log
+
+    The store is built by make_store unless one is passed in. No threads
+    are started and SQLite connections are reopened per process, so a server
+    can create the app once and fork workers from it. A durable store is the
+    exception: it must be opened by the process that writes to it.
+    """
+    app = Flask(__name__)
+    app.json = OrjsonProvider(app)
+    if user_store is None:
+        user_store = make_store()
+    if METRICS_ENABLED:
+        init_store_metrics(init_metrics(app), user_store)
+    log = ChangeLog(CHANGE_LOG_SIZE, version=user_store.version)
+    user_store.subscribe(log)
+    app.extensions["users"] = {"store": user_store, "change_log": log}
+    app.register_blueprint(bp)
+    init_ui(app, UI_DIR)
+    init_compression(app, COMPRESS_MIN_SIZE, COMPRESS_LEVEL)
+    return app
+
+
 if __name__ == "__main__":
-    app.run(host="0.0.0.0", port=5000, debug=True)
+    create_app().run(host="0.0.0.0", port=5000, debug=DEBUG)
@@ -0,0 +1,57 @@
+"""Compare per-record cost of POST /users against the bulk endpoints.
+
+Usage: python bench_bulk.py [--records N]
+"""
+
+import argparse
+import json
+import time
+
+from app import create_app
+
+
+def bench_single(client, records):
+    start = time.perf_counter()
+    for record in records:
+        client.post("/users", json=record)
+    return time.perf_counter() - start
+
+
+def bench_bulk(client, records, ndjson):
+    if ndjson:
+        body = "".join(json.dumps(record) + "\n" for record in records)
+        content_type = "application/x-ndjson"
+    else:
+        body = json.dumps(records)
+        content_type = "application/json"
+    start = time.perf_counter()
+    response = client.post("/users/bulk", data=body, content_type=content_type)
+    response.get_data()
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--records", type=int, default=20000)
+    args = parser.parse_args()
+
+    client = create_app().test_client()
+    records = [
+        {"name": f"User {i}", "email": f"user{i}@example.com"}
+        for i in range(args.records)
+    ]
+
+    timings = {
+        "POST /users": bench_single(client, records),
+        "POST /users/bulk (json)": bench_bulk(client, records, ndjson=False),
+        "POST /users/bulk (ndjson)": bench_bulk(client, records, ndjson=True),
+    }
+    baseline = timings["POST /users"]
+    print(f"{'mode':<28} {'us/record':>10} {'speedup':>8}")
+    for mode, elapsed in timings.items():
+        per_record = elapsed / args.records * 1e6
+        print(f"{mode:<28} {per_record:>10.1f} {baseline / elapsed:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
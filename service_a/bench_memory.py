@@ -0,0 +1,98 @@
+"""Measure the memory MemoryUserStore takes per user, against one dict per user.
+
+The dict layout is how the store held users before UserRecord: a dict per
+user under its ID string, a version per user, a sorted ID list, and an
+email index of lists. Allocations are counted with tracemalloc, so the
+figures do not depend on what else the process holds. Names and emails are
+built before counting starts, since both layouts hold the same strings, and
+their size is added back for the totals.
+
+Usage: python bench_memory.py [--users N]
+"""
+
+import argparse
+import random
+import sys
+import time
+import tracemalloc
+
+from storage import MemoryUserStore, email_key
+
+DOMAINS = ["gmail.com", "yahoo.com", "hotmail.com", "acme.com", "example.org"]
+
+
+def make_items(count):
+    return [(f"User {i}", f"user{i}@{DOMAINS[i % len(DOMAINS)]}") for i in range(count)]
+
+
+def dict_layout(items):
+    """The users as the store used to hold them"""
+    users, versions, order, by_email = {}, {}, [], {}
+    for version, (name, email) in enumerate(items, 1):
+        user_id = str(version)
+        users[user_id] = {"id": user_id, "name": name, "email": email}
+        versions[user_id] = version
+        order.append(version)
+        by_email.setdefault(email_key(email), []).append(user_id)
+    return users, versions, order, by_email
+
+
+def record_layout(items):
+    store = MemoryUserStore()
+    store.create_many(items)
+    return store
+
+
+def allocated(build, items):
+    """Bytes still allocated by ``build(items)`` once it returns, and the result"""
+    tracemalloc.start()
+    try:
+        before = tracemalloc.get_traced_memory()[0]
+        result = build(items)
+        return tracemalloc.get_traced_memory()[0] - before, result
+    finally:
+        tracemalloc.stop()
+
+
+def time_gets(get, user_ids):
+    start = time.perf_counter()
+    for user_id in user_ids:
+        get(user_id)
+    return (time.perf_counter() - start) / len(user_ids) * 1e9
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--users", type=int, default=1_000_000)
+    args = parser.parse_args()
+
+    items = make_items(args.users)
+    strings = sum(sys.getsizeof(n) + sys.getsizeof(e) for n, e in items) / args.users
+
+    old_bytes, old = allocated(dict_layout, items)
+    new_bytes, store = allocated(record_layout, items)
+    old_per_user, new_per_user = old_bytes / args.users, new_bytes / args.users
+    estimate = store.stats()["bytes_per_user"]
+
+    lookups = [str(random.randint(1, args.users)) for _ in range(200_000)]
+    users = old[0]
+    # Through a function call, like the store method it replaced
+    old_get = time_gets(lambda user_id: users.get(user_id), lookups)
+    new_get = time_gets(store.get, lookups)
+
+    print(f"{args.users:,} users, {strings:.0f} bytes of name and email strings each\n")
+    print(f"{'layout':<12} {'overhead':>9} {'total':>6} {'get ns':>7}")
+    for name, per_user, get_ns in (
+        ("dict", old_per_user, old_get),
+        ("UserRecord", new_per_user, new_get),
+    ):
+        print(f"{name:<12} {per_user:>9.0f} {per_user + strings:>6.0f} {get_ns:>7.0f}")
+    print(
+        f"\nreduction: {old_per_user / new_per_user:.2f}x of the overhead,"
+        f" {(old_per_user + strings) / (new_per_user + strings):.2f}x in total"
+    )
+    print(f"/stats estimate: {estimate:.0f} bytes/user in total")
+
+
+if __name__ == "__main__":
+    main()
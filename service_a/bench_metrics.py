@@ -0,0 +1,95 @@
+"""Measure what request metrics add to the cost of serving Service A requests.
+
+Requests are run straight through the WSGI app, without a server or test
+client, so metrics are compared with the cheapest possible request. The
+apps with and without metrics are timed in back-to-back pairs of rounds,
+and the median ratio of the pairs is reported, which holds up on a busy
+machine. Garbage collection is left on, as in a server.
+
+Usage: python bench_metrics.py [--requests N] [--rounds N]
+"""
+
+import argparse
+import gc
+import statistics
+import time
+
+from werkzeug.test import EnvironBuilder
+
+import app as service_a
+from storage import MemoryUserStore
+
+ROUTES = {
+    "GET /users/<id>": ("GET", "/users/1"),
+    "GET /users": ("GET", "/users?limit=10"),
+    "GET 404": ("GET", "/nowhere"),
+}
+
+
+def make_app(metrics):
+    service_a.METRICS_ENABLED = metrics
+    store = MemoryUserStore()
+    store.create_many([(f"User {i}", f"user{i}@example.com") for i in range(100)])
+    return service_a.create_app(store)
+
+
+def run(wsgi_app, environ, requests):
+    """Seconds taken by ``requests`` requests for ``environ``"""
+
+    def start_response(status, headers, exc_info=None):
+        pass
+
+    gc.collect()
+    start = time.perf_counter()
+    for _ in range(requests):
+        body = wsgi_app(dict(environ), start_response)
+        for _ in body:
+            pass
+        # As a server does once the body is sent
+        close = getattr(body, "close", None)
+        if close is not None:
+            close()
+    return time.perf_counter() - start
+
+
+def compare(without, with_metrics, environ, requests, rounds):
+    """Median microseconds per request of both apps, and the median ratio of
+    their times in back-to-back rounds"""
+    pairs = []
+    for n in range(rounds):
+        # Alternate which app goes first
+        if n % 2:
+            on = run(with_metrics, environ, requests)
+            off = run(without, environ, requests)
+        else:
+            off = run(without, environ, requests)
+            on = run(with_metrics, environ, requests)
+        pairs.append((off / requests * 1e6, on / requests * 1e6))
+    return (
+        statistics.median(off for off, _ in pairs),
+        statistics.median(on for _, on in pairs),
+        statistics.median(on / off for off, on in pairs),
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--rounds", type=int, default=50)
+    args = parser.parse_args()
+
+    without, with_metrics = make_app(False).wsgi_app, make_app(True).wsgi_app
+    print(f"{'route':<16} {'without us':>11} {'with us':>8} {'added':>7}")
+    for name, (method, url) in ROUTES.items():
+        path, _, query = url.partition("?")
+        environ = EnvironBuilder(
+            path=path, method=method, query_string=query
+        ).get_environ()
+        off, on, ratio = compare(
+            without, with_metrics, environ, args.requests, args.rounds
+        )
+        print(f"{name:<16} {off:>11.1f} {on:>8.1f} {(ratio - 1) * 100:>6.1f}%")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+"""Measure how fast the durable store writes, takes snapshots and recovers.
+
+Users are created through the bulk path, then single writes from several
+threads show how many writes share each fsync. A snapshot is taken, more
+changes are logged after it, and the store is reopened to time recovery.
+
+Usage: python bench_recovery.py [--users N] [--tail N] [--threads N] [--dir PATH]
+"""
+
+import argparse
+import tempfile
+import threading
+import time
+
+from persistence import DurableUserStore
+
+CHUNK = 10_000
+
+
+def timed(func, *args):
+    start = time.perf_counter()
+    result = func(*args)
+    return time.perf_counter() - start, result
+
+
+def seed(store, count):
+    for start in range(0, count, CHUNK):
+        store.create_many(
+            [
+                (f"User {i}", f"user{i}@example.com")
+                for i in range(start, min(start + CHUNK, count))
+            ]
+        )
+
+
+def single_writes(store, threads, per_thread):
+    def work(n):
+        for i in range(per_thread):
+            store.update(str(n * per_thread + i + 1), {"name": f"Renamed {n}-{i}"})
+
+    workers = [threading.Thread(target=work, args=(n,)) for n in range(threads)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--users", type=int, default=2_000_000)
+    parser.add_argument(
+        "--tail", type=int, default=100_000, help="changes after the snapshot"
+    )
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--dir", help="directory to use, by default a temporary one")
+    args = parser.parse_args()
+
+    tmpdir = None
+    if args.dir is None:
+        tmpdir = tempfile.TemporaryDirectory()
+        args.dir = tmpdir.name
+    store = DurableUserStore(args.dir, snapshot_every=args.users + args.tail + 1)
+
+    seconds, _ = timed(seed, store, args.users)
+    print(f"bulk create:  {args.users / seconds:>10,.0f} users/sec")
+
+    per_thread = min(args.tail, args.users) // args.threads
+    syncs = store.log.syncs
+    seconds, _ = timed(single_writes, store, args.threads, per_thread)
+    writes = per_thread * args.threads
+    print(
+        f"single writes: {writes / seconds:>9,.0f} writes/sec from {args.threads}"
+        f" threads, {writes / max(1, store.log.syncs - syncs):.1f} per fsync"
+    )
+
+    seconds, _ = timed(store.snapshot)
+    print(f"snapshot:     {seconds:>10.2f} s")
+    seed(store, args.tail)
+    store.close()
+
+    seconds, store = timed(DurableUserStore, args.dir)
+    print(
+        f"recovery:     {seconds:>10.2f} s for {store.count():,} users"
+        f" and {args.tail:,} logged changes"
+    )
+    store.close()
+    if tmpdir is not None:
+        tmpdir.cleanup()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+"""Compare Service A storage backends on read-heavy and write-heavy mixes.
+
+Usage: python bench_storage.py [--users N] [--ops N] [--threads N]
+"""
+
+import argparse
+import os
+import random
+import tempfile
+import threading
+import time
+
+from storage import MemoryUserStore, SQLiteUserStore
+
+# Operation weights for each workload mix
+MIXES = {
+    "read-heavy": {"get": 80, "list": 10, "update": 8, "create": 1, "delete": 1},
+    "write-heavy": {"get": 20, "list": 5, "update": 40, "create": 25, "delete": 10},
+}
+
+
+def seed(store, count):
+    return [
+        store.create(f"User {i}", f"user{i}@example.com")["id"] for i in range(count)
+    ]
+
+
+def run_ops(store, ids, ops, weights, rng):
+    names = list(weights)
+    choices = rng.choices(names, weights=[weights[n] for n in names], k=ops)
+    for op in choices:
+        user_id = rng.choice(ids)
+        if op == "get":
+            store.get(user_id)
+        elif op == "list":
+            store.list_after(int(user_id), 50)
+        elif op == "update":
+            store.update(user_id, {"name": "Updated"})
+        elif op == "create":
+            store.create("New User", "new@example.com")
+        else:
+            store.delete(user_id)
+
+
+def bench(store, ids, ops, threads, weights):
+    per_thread = ops // threads
+    workers = [
+        threading.Thread(
+            target=run_ops, args=(store, ids, per_thread, weights, random.Random(n))
+        )
+        for n in range(threads)
+    ]
+    start = time.perf_counter()
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    return per_thread * threads / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--users", type=int, default=10000)
+    parser.add_argument("--ops", type=int, default=20000)
+    parser.add_argument("--threads", type=int, default=4)
+    args = parser.parse_args()
+
+    print(f"{'backend':<8} {'mix':<12} {'ops/sec':>12}")
+    for mix, weights in MIXES.items():
+        with tempfile.TemporaryDirectory() as tmpdir:
+            backends = {
+                "memory": MemoryUserStore(),
+                "sqlite": SQLiteUserStore(os.path.join(tmpdir, "users.db")),
+            }
+            for name, store in backends.items():
+                ids = seed(store, args.users)
+                rate = bench(store, ids, args.ops, args.threads, weights)
+                print(f"{name:<8} {mix:<12} {rate:>12,.0f}")
+                store.close()
+
+
+if __name__ == "__main__":
+    main()
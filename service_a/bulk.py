@@ -0,0 +1,170 @@
+"""Streaming parsers and batch application for the bulk user endpoints."""
+
+import codecs
+import json
+from typing import IO, Callable, Iterator, List, Optional, Tuple
+
+# Bytes read from the request body at a time
+READ_SIZE = 64 * 1024
+# Largest single array element accepted, so a broken body is not buffered whole
+MAX_ITEM_SIZE = 1024 * 1024
+
+# A parsed input item: (index, item, error). ``error`` is set when the item
+# could not be parsed, in which case ``item`` is None.
+ParsedItem = Tuple[int, object, Optional[str]]
+
+
+class MalformedBodyError(ValueError):
+    """The body is not a JSON array, so no further items can be read from it"""
+
+
+def _iter_text(stream: IO[bytes]) -> Iterator[str]:
+    decoder = codecs.getincrementaldecoder("utf-8")()
+    while True:
+        chunk = stream.read(READ_SIZE)
+        if not chunk:
+            tail = decoder.decode(b"", final=True)
+            if tail:
+                yield tail
+            return
+        yield decoder.decode(chunk)
+
+
+def iter_ndjson(stream: IO[bytes]) -> Iterator[ParsedItem]:
+    """Yield one item per non-blank line, reporting bad lines individually"""
+    index = 0
+    pending = ""
+    for text in _iter_text(stream):
+        lines = (pending + text).split("\n")
+        pending = lines.pop()
+        for line in lines:
+            if line.strip():
+                yield _parse_line(index, line)
+                index += 1
+    if pending.strip():
+        yield _parse_line(index, pending)
+
+
+def _parse_line(index: int, line: str) -> ParsedItem:
+    try:
+        return index, json.loads(line), None
+    except ValueError as e:
+        return index, None, f"Invalid JSON: {e}"
+
+
+def iter_json_array(stream: IO[bytes]) -> Iterator[ParsedItem]:
+    """Yield the elements of a top-level JSON array without loading it whole
+
+    If the array itself is broken the position of the next element is
+    unknown, so a final error item is yielded and parsing stops.
+    """
+    decoder = json.JSONDecoder()
+    chunks = _iter_text(stream)
+    buf = ""
+    pos = 0
+    eof = False
+    index = 0
+    expect = "["
+
+    def fill() -> bool:
+        nonlocal buf, pos, eof
+        if eof:
+            return False
+        text = next(chunks, None)
+        if text is None:
+            eof = True
+            return False
+        # Drop what has been consumed so the buffer stays around one chunk
+        buf = buf[pos:] + text
+        pos = 0
+        return True
+
+    try:
+        while True:
+            while pos < len(buf) and buf[pos] in " \t\r\n":
+                pos += 1
+            if pos == len(buf):
+                if fill():
+                    continue
+                if expect == "end":
+                    return
+                raise MalformedBodyError("Unexpected end of JSON array")
+
+            char = buf[pos]
+            if expect == "[":
+                if char != "[":
+                    raise MalformedBodyError("Body must be a JSON array")
+                pos += 1
+                expect = "first"
+            elif expect in ("first", "sep") and char == "]":
+                pos += 1
+                expect = "end"
+            elif expect == "sep":
+                if char != ",":
+                    raise MalformedBodyError("Expected ',' or ']'")
+                pos += 1
+                expect = "item"
+            elif expect in ("first", "item"):
+                try:
+                    item, end = decoder.raw_decode(buf, pos)
+                except ValueError as e:
+                    if len(buf) - pos <= MAX_ITEM_SIZE and fill():
+                        continue
+                    raise MalformedBodyError(f"Invalid JSON: {e}")
+                # A number running up to the end of the buffer may be cut short
+                if end == len(buf) and fill():
+                    continue
+                yield index, item, None
+                index += 1
+                pos = end
+                expect = "sep"
+            else:
+                raise MalformedBodyError("Unexpected data after JSON array")
+    except MalformedBodyError as e:
+        yield index, None, str(e)
+
+
+def iter_chunks(items: Iterator[ParsedItem], size: int) -> Iterator[List[ParsedItem]]:
+    """Group parsed items into lists of at most ``size``"""
+    chunk: List[ParsedItem] = []
+    for item in items:
+        chunk.append(item)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def apply_chunk(
+    chunk: List[ParsedItem],
+    validate: Callable[[object], object],
+    apply: Callable[[list], list],
+) -> List[dict]:
+    """Validate a chunk, apply the valid items in one call and return per-item results
+
+    ``validate`` turns a raw item into the argument ``apply`` expects, raising
+    ValueError for invalid items. ``apply`` takes the list of validated items
+    and returns one result dict (without ``index``) per item.
+    """
+    results: List[Optional[dict]] = [None] * len(chunk)
+    valid: List[object] = []
+    positions: List[int] = []
+    for pos, (_, item, error) in enumerate(chunk):
+        if error is None:
+            try:
+                valid.append(validate(item))
+                positions.append(pos)
+                continue
+            except ValueError as e:
+                error = str(e)
+        results[pos] = {"status": 400, "error": error}
+
+    for pos, result in zip(positions, apply(valid) if valid else []):
+        results[pos] = result
+
+    return [
+        {"index": index, **result}
+        for (index, _, _), result in zip(chunk, results)
+        if result is not None
+    ]
@@ -0,0 +1,64 @@
+"""Bounded, versioned log of user changes for downstream consumers."""
+
+import threading
+from collections import deque
+from typing import List, Optional, Tuple
+
+from storage import Change
+
+
+class ChangeLog:
+    """Ring buffer holding the most recent ``capacity`` store changes
+
+    It is subscribed to the store, so recording a write is one deque append
+    under a lock. Readers ask for everything after a version they have
+    already seen and may block until something newer arrives.
+    """
+
+    def __init__(self, capacity: int = 10000, version: int = 0):
+        self._changes: deque = deque(maxlen=capacity)
+        self._cond = threading.Condition()
+        self.version = version
+        # Newest version that has been pushed out of the buffer
+        self._dropped = version
+
+    def __call__(self, changes: List[Change]) -> None:
+        with self._cond:
+            for change in changes:
+                if len(self._changes) == self._changes.maxlen:
+                    self._dropped = self._changes[0][0]
+                self._changes.append(change)
+            self.version = changes[-1][0]
+            self._cond.notify_all()
+
+    def since(
+        self, version: int, limit: Optional[int] = None
+    ) -> Tuple[List[dict], bool]:
+        """Return up to ``limit`` changes newer than ``version``, oldest first
+
+        The flag is True when changes after ``version`` have already been
+        dropped from the buffer, or ``version`` is newer than any change, as
+        for a consumer of a store that has since restarted. Either way the
+        caller must resynchronise.
+        """
+        with self._cond:
+            if version < self._dropped or version > self.version:
+                return [], True
+            newer = []
+            # Consumers are usually close to the head, so scan from the newest
+            for change in reversed(self._changes):
+                if change[0] <= version:
+                    break
+                newer.append(change)
+        newer.reverse()
+        if limit is not None:
+            newer = newer[:limit]
+        return [
+            {"version": v, "op": op, "id": user_id, "user": user}
+            for v, op, user_id, user in newer
+        ], False
+
+    def wait(self, version: int, timeout: float) -> bool:
+        """Block until a change newer than ``version`` exists or ``timeout`` passes"""
+        with self._cond:
+            return self._cond.wait_for(lambda: self.version > version, timeout)
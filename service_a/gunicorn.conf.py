@@ -0,0 +1,32 @@
+"""Gunicorn settings for Service A, tunable through environment variables.
+
+Run with ``gunicorn -c gunicorn.conf.py``.
+"""
+
+import os
+
+wsgi_app = "app:create_app()"
+bind = os.getenv("GUNICORN_BIND", "0.0.0.0:5000")
+
+# Build the app once in the master so forked workers share its memory. A
+# durable store is opened by the worker instead, so that a restarted worker
+# recovers every write its predecessor logged.
+preload_app = not os.getenv("PERSIST_DIR")
+
+# The in-memory store only exists inside one process, so more workers would
+# each see different users. The SQLite backend is shared between them.
+_memory_store = os.getenv("STORAGE_BACKEND", "memory") == "memory"
+workers = int(os.getenv("GUNICORN_WORKERS", "1" if _memory_store else "2"))
+if _memory_store and workers > 1:
+    raise RuntimeError("STORAGE_BACKEND=memory needs GUNICORN_WORKERS=1")
+
+# Threads per worker; each open change feed stream holds one
+worker_class = "gthread"
+threads = int(os.getenv("GUNICORN_THREADS", "8"))
+
+keepalive = int(os.getenv("GUNICORN_KEEPALIVE", "5"))
+backlog = int(os.getenv("GUNICORN_BACKLOG", "2048"))
+timeout = int(os.getenv("GUNICORN_TIMEOUT", "60"))
+graceful_timeout = int(os.getenv("GUNICORN_GRACEFUL_TIMEOUT", "30"))
+
+accesslog = "-"
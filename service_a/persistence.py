@@ -0,0 +1,521 @@
+"""Durable memory store: snapshots plus a write-ahead log in a local directory.
+
+Every change is appended to the current log segment from inside the write,
+and the write returns once the log has been synced to disk. Writers that
+arrive while a sync is running are covered by the next one, so one fsync
+commits a whole group of writes. Every ``snapshot_every`` changes a
+background thread saves a snapshot of all users and starts a new segment;
+older snapshots and segments are then deleted.
+
+Directory contents::
+
+    LOCK                        held by the one process using the directory
+    EPOCH                       the epoch the versions below count in
+    snapshot-<version>.bin      every user as of <version>
+    wal-<first version>.log     changes from <first version> on
+
+Log records are ``<length, ~length, crc32>`` followed by the change. A
+record torn by a crash is found and cut off at recovery; it was never
+acknowledged, since its write had not returned. Only the last record of
+the log can be torn: damage with more of the log after it stops recovery.
+
+If appending to the log or syncing it fails, the log takes no more
+changes and every later write raises LogWriteError until the process is
+restarted and recovers. Nothing is then written after a partial record,
+and no write is acknowledged by a sync that came after a failed one.
+Changes readers saw but the log lost get their versions again after the
+restart, so the EPOCH file is removed then, as it is before cutting off a
+torn record.
+"""
+
+import contextlib
+import fcntl
+import os
+import struct
+import sys
+import threading
+import zlib
+from array import array
+from itertools import accumulate
+from mmap import ACCESS_READ, mmap
+from typing import Dict, List, Optional, Tuple
+
+from storage import Change, MemoryUserStore, UserColumns, UserRecord, new_epoch
+
+SNAPSHOT_MAGIC = b"USERSNP1"
+# Magic, version, next ID, user count, and the byte sizes of the names and
+# emails blobs
+SNAPSHOT_HEADER = struct.Struct("<8sQQQQQ")
+CRC = struct.Struct("<I")
+# Payload length, its complement to tell a damaged length from a torn
+# record, and the payload's crc32
+FRAME = struct.Struct("<III")
+# Operation, version, user ID, and the byte sizes of name and email
+CHANGE = struct.Struct("<BQQII")
+
+OPS = ("create", "update", "delete")
+OP_CODES = {op: code for code, op in enumerate(OPS)}
+
+# Text is written as UTF-8, passing lone surrogates that JSON can carry
+ENCODING, ERRORS = "utf-8", "surrogatepass"
+
+EPOCH_FILE = "EPOCH"
+
+
+class RecoveryError(Exception):
+    """Raised when changes before the end of the log are damaged or missing"""
+
+
+class LogWriteError(Exception):
+    """Raised by writes once appending to or syncing the log has failed"""
+
+
+def _fsync_dir(directory: str) -> None:
+    fd = os.open(directory, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def _forget_epoch(directory: str) -> None:
+    """Remove the directory's epoch, so that the next open picks a new one
+
+    Done when a change that readers may have seen is not in the log, since
+    its version will be handed out again.
+    """
+    with contextlib.suppress(FileNotFoundError):
+        os.unlink(os.path.join(directory, EPOCH_FILE))
+    _fsync_dir(directory)
+
+
+def _numbered(directory: str, prefix: str, suffix: str) -> List[Tuple[int, str]]:
+    """``(number, path)`` of the files named ``<prefix><number><suffix>``, in order"""
+    found = []
+    for name in os.listdir(directory):
+        number = name[len(prefix) : -len(suffix)]  # noqa: E203
+        if name.startswith(prefix) and name.endswith(suffix) and number.isdigit():
+            found.append((int(number), os.path.join(directory, name)))
+    return sorted(found)
+
+
+def _little_endian(values: array) -> array:
+    if sys.byteorder == "big":
+        values.byteswap()
+    return values
+
+
+def encode_change(change: Change) -> bytes:
+    version, op, user_id, user = change
+    if user is None:
+        name = email = b""
+    else:
+        name = user["name"].encode(ENCODING, ERRORS)
+        email = user["email"].encode(ENCODING, ERRORS)
+    payload = (
+        CHANGE.pack(OP_CODES[op], version, int(user_id), len(name), len(email))
+        + name
+        + email
+    )
+    length = len(payload)
+    return FRAME.pack(length, length ^ 0xFFFFFFFF, zlib.crc32(payload)) + payload
+
+
+def read_log(path: str) -> Tuple[List[Change], int, bool]:
+    """The changes in a log segment, the length of its intact part, and
+    whether a torn record follows that part
+
+    A record is torn if it runs past the end of the segment, or nothing
+    but zeros follows it, as a crash during its write leaves it. RecoveryError
+    is raised for a damaged record with more of the log after it, since
+    cutting it off would lose the changes behind it.
+    """
+    with open(path, "rb") as f:
+        data = f.read()
+    changes = []
+    offset = 0
+    while offset < len(data):
+        if offset + FRAME.size > len(data):
+            break
+        length, check, crc = FRAME.unpack_from(data, offset)
+        start = offset + FRAME.size
+        end = start + length
+        framed = check == length ^ 0xFFFFFFFF and length >= CHANGE.size
+        if framed and end > len(data):
+            break
+        payload = data[start:end]
+        if not framed or zlib.crc32(payload) != crc:
+            if len(data.rstrip(b"\0")) <= (end if framed else offset):
+                break
+            raise RecoveryError(f"Log segment {path} is damaged at byte {offset}")
+        code, version, uid, name_size, _ = CHANGE.unpack_from(payload)
+        user = None
+        if OPS[code] != "delete":
+            name_start = CHANGE.size
+            name_end = name_start + name_size
+            user = {
+                "id": str(uid),
+                "name": payload[name_start:name_end].decode(ENCODING, ERRORS),
+                "email": payload[name_end:].decode(ENCODING, ERRORS),
+            }
+        changes.append((version, OPS[code], str(uid), user))
+        offset = end
+    return changes, offset, offset < len(data)
+
+
+def write_snapshot(
+    path: str, users: Dict[int, UserRecord], version: int, next_id: int
+) -> None:
+    """Save ``users`` column by column, so loading them decodes two strings"""
+    records = users.values()
+    names = [record.name for record in records]
+    emails = [record.email for record in records]
+    name_blob = "".join(names).encode(ENCODING, ERRORS)
+    email_blob = "".join(emails).encode(ENCODING, ERRORS)
+    header = SNAPSHOT_HEADER.pack(
+        SNAPSHOT_MAGIC,
+        version,
+        next_id,
+        len(users),
+        len(name_blob),
+        len(email_blob),
+    )
+    # Lengths are in characters, to slice the decoded strings with
+    columns = [
+        _little_endian(array("Q", users)).tobytes(),
+        _little_endian(array("Q", [record.version for record in records])).tobytes(),
+        _little_endian(array("I", map(len, names))).tobytes(),
+        _little_endian(array("I", map(len, emails))).tobytes(),
+        name_blob,
+        email_blob,
+    ]
+    crc = zlib.crc32(header)
+    tmp = f"{path}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(header)
+        for column in columns:
+            f.write(column)
+            crc = zlib.crc32(column, crc)
+        f.write(CRC.pack(crc))
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+    _fsync_dir(os.path.dirname(path))
+
+
+def _split(text: str, lengths: array) -> List[str]:
+    ends = list(accumulate(lengths))
+    return [text[start:end] for start, end in zip([0] + ends, ends)]
+
+
+def read_snapshot(path: str) -> Tuple[UserColumns, int, int]:
+    """The users in a snapshot, with its version and next ID
+
+    The file is memory-mapped and checked against its crc32 before any user
+    is read. ValueError is raised if it is damaged.
+    """
+    with open(path, "rb") as f, mmap(f.fileno(), 0, access=ACCESS_READ) as data:
+        with memoryview(data) as view:
+            if len(view) < SNAPSHOT_HEADER.size + CRC.size:
+                raise ValueError(f"Snapshot {path} is truncated")
+            (crc,) = CRC.unpack_from(view, len(view) - CRC.size)
+            if zlib.crc32(view[: -CRC.size]) != crc:
+                raise ValueError(f"Snapshot {path} is damaged")
+            magic, version, next_id, count, name_size, email_size = (
+                SNAPSHOT_HEADER.unpack_from(view)
+            )
+            if magic != SNAPSHOT_MAGIC:
+                raise ValueError(f"{path} is not a snapshot")
+            offset = SNAPSHOT_HEADER.size
+            columns = []
+            for typecode in "QQII":
+                column = array(typecode)
+                end = offset + count * column.itemsize
+                column.frombytes(view[offset:end])
+                columns.append(_little_endian(column))
+                offset = end
+            end = offset + name_size
+            names = str(view[offset:end], ENCODING, ERRORS)
+            offset, end = end, end + email_size
+            emails = str(view[offset:end], ENCODING, ERRORS)
+    ids, versions, name_lengths, email_lengths = columns
+    columns = UserColumns(
+        ids.tolist(),
+        _split(names, name_lengths),
+        _split(emails, email_lengths),
+        versions.tolist(),
+    )
+    return columns, version, next_id
+
+
+class WriteAheadLog:
+    """Log segments that changes are appended to and synced in groups
+
+    The log is a store listener, so appends happen in version order inside
+    the store's writes. ``commit`` then waits for a sync covering them.
+    """
+
+    def __init__(self, directory: str, first_version: int, fsync: bool = True):
+        self.directory = directory
+        self.fsync = fsync
+        self.written = first_version - 1
+        self._synced = self.written
+        self._syncing = False
+        # fsyncs made by commit, each covering one group of writes
+        self.syncs = 0
+        # The first append or sync that failed, after which nothing is logged
+        self.error: Optional[OSError] = None
+        self._cond = threading.Condition()
+        self._fd: Optional[int] = self._open(first_version)
+
+    def _open(self, first_version: int) -> int:
+        path = os.path.join(self.directory, f"wal-{first_version:020d}.log")
+        fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC | os.O_APPEND, 0o644)
+        _fsync_dir(self.directory)
+        return fd
+
+    def check(self) -> None:
+        """Raise LogWriteError if the log has failed"""
+        if self.error is not None:
+            raise LogWriteError(
+                "The write-ahead log failed, restart to recover"
+            ) from self.error
+
+    def _fail(self, error: OSError) -> None:
+        if self.error is None:
+            self.error = error
+            # Best effort, since the disk is failing
+            with contextlib.suppress(OSError):
+                _forget_epoch(self.directory)
+        self.check()
+
+    def __call__(self, changes: List[Change]) -> None:
+        self.check()
+        data = b"".join(map(encode_change, changes))
+        view = memoryview(data)
+        try:
+            while view:
+                view = view[os.write(self._fd, view) :]  # noqa: E203
+        except OSError as e:
+            # A partial record may have been written, so nothing may follow it
+            self._fail(e)
+        self.written = changes[-1][0]
+
+    def commit(self) -> None:
+        """Wait until everything appended so far is on disk
+
+        The first writer to arrive syncs for every writer that appended
+        before it; the rest wait for that sync, or the next one.
+        """
+        if not self.fsync:
+            return
+        target = self.written
+        with self._cond:
+            while self._synced < target:
+                self.check()
+                if self._syncing:
+                    self._cond.wait()
+                    continue
+                self._syncing = True
+                fd, written = self._fd, self.written
+                self._cond.release()
+                error = None
+                try:
+                    os.fsync(fd)
+                except OSError as e:
+                    error = e
+                finally:
+                    self._cond.acquire()
+                    self._syncing = False
+                    self._cond.notify_all()
+                if error is not None:
+                    # The unsynced pages may be lost, and a later fsync can
+                    # succeed without them, so no later sync counts either
+                    self._fail(error)
+                self.check()
+                self._synced = max(self._synced, written)
+                self.syncs += 1
+
+    def rotate(self, version: int) -> None:
+        """Sync and close the current segment and start one at ``version + 1``
+
+        Called with the store's writes paused, so ``version`` is the last
+        change in the closed segment.
+        """
+        with self._cond:
+            self._cond.wait_for(lambda: not self._syncing)
+            self.check()
+            try:
+                os.fsync(self._fd)
+                os.close(self._fd)
+                self._fd = None
+                self._fd = self._open(version + 1)
+            except OSError as e:
+                self._fail(e)
+            self._synced = self.written
+
+    def close(self) -> None:
+        with self._cond:
+            self._cond.wait_for(lambda: not self._syncing)
+            if self._fd is not None:
+                try:
+                    if self.error is None:
+                        os.fsync(self._fd)
+                finally:
+                    os.close(self._fd)
+                    self._fd = None
+
+
+class DurableUserStore(MemoryUserStore):
+    """MemoryUserStore whose writes survive restarts and crashes of the process
+
+    Opening it recovers the users kept in ``directory``: the newest intact
+    snapshot is loaded and the log after it replayed. Writes return once
+    they are synced to the log, or right away with ``fsync=False``, which
+    survives the process dying but not the machine.
+
+    A write whose change could not be logged or synced raises LogWriteError,
+    and so does every write after it. The failed change may stay visible
+    until the process is restarted, but it was never acknowledged.
+    """
+
+    def __init__(
+        self, directory: str, fsync: bool = True, snapshot_every: int = 100_000
+    ):
+        super().__init__()
+        self.directory = directory
+        self.snapshot_every = snapshot_every
+        os.makedirs(directory, exist_ok=True)
+        # Held until close, or until the process dies
+        self._lock_file = open(os.path.join(directory, "LOCK"), "w")
+        fcntl.flock(self._lock_file, fcntl.LOCK_EX)
+        self.snapshot_version = self._recover()
+        self.epoch = self._load_epoch()
+        self.log = WriteAheadLog(directory, self.version + 1, fsync)
+        self.subscribe(self.log)
+        self._snapshotting = threading.Lock()
+
+    def _recover(self) -> int:
+        """Load the directory's users, returning the version of the snapshot used"""
+        snapshot_version = 0
+        for _, path in reversed(_numbered(self.directory, "snapshot-", ".bin")):
+            try:
+                columns, version, next_id = read_snapshot(path)
+            except ValueError:
+                continue
+            self.restore(columns, version, next_id)
+            snapshot_version = version
+            break
+
+        segments = _numbered(self.directory, "wal-", ".log")
+        for n, (first_version, path) in enumerate(segments):
+            if first_version > self.version + 1:
+                raise RecoveryError(
+                    f"Changes {self.version + 1} to {first_version - 1} are missing"
+                )
+            changes, intact, torn = read_log(path)
+            if torn:
+                # Segments are synced before the next one starts
+                if n < len(segments) - 1:
+                    raise RecoveryError(f"Log segment {path} is damaged")
+                # A write torn by a crash, never acknowledged
+                _forget_epoch(self.directory)
+                os.truncate(path, intact)
+            self.apply_changes(c for c in changes if c[0] > self.version)
+        return snapshot_version
+
+    def _load_epoch(self) -> str:
+        """The directory's epoch, kept so that ETags stay valid across restarts
+
+        A directory that recovered no changes starts its versions from 0
+        again, so it gets a new epoch, and so does one whose epoch was
+        forgotten.
+        """
+        path = os.path.join(self.directory, EPOCH_FILE)
+        if self.version > 0 and os.path.exists(path):
+            with open(path) as f:
+                return f.read().strip()
+        epoch = new_epoch()
+        tmp = f"{path}.tmp"
+        with open(tmp, "w") as f:
+            f.write(epoch)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+        _fsync_dir(self.directory)
+        return epoch
+
+    def _commit(self) -> None:
+        self.log.commit()
+        pending = self.log.written - self.snapshot_version
+        if pending >= self.snapshot_every and self._snapshotting.acquire(False):
+            # Started on first use so a server can fork after create_app
+            threading.Thread(target=self._snapshot_in_background, daemon=True).start()
+
+    def _snapshot_in_background(self) -> None:
+        try:
+            self.snapshot()
+        finally:
+            self._snapshotting.release()
+
+    def snapshot(self) -> None:
+        """Save every user and drop the snapshots and log segments before them"""
+        users, version, next_id = self.export(during=self.log.rotate)
+        path = os.path.join(self.directory, f"snapshot-{version:020d}.bin")
+        write_snapshot(path, users, version, next_id)
+        self.snapshot_version = version
+        for older, old_path in _numbered(self.directory, "snapshot-", ".bin"):
+            if older < version:
+                os.remove(old_path)
+        for first, old_path in _numbered(self.directory, "wal-", ".log"):
+            if first <= version:
+                os.remove(old_path)
+
+    def create(self, name: str, email: str, unique_email: bool = False) -> dict:
+        self.log.check()
+        user = super().create(name, email, unique_email)
+        self._commit()
+        return user
+
+    def create_many(self, items: List[Tuple[str, str]]) -> List[dict]:
+        self.log.check()
+        users = super().create_many(items)
+        self._commit()
+        return users
+
+    def update(self, user_id: str, fields: dict) -> Optional[dict]:
+        self.log.check()
+        user = super().update(user_id, fields)
+        self._commit()
+        return user
+
+    def update_many(self, items: List[Tuple[str, dict]]) -> List[Optional[dict]]:
+        self.log.check()
+        users = super().update_many(items)
+        self._commit()
+        return users
+
+    def delete(self, user_id: str) -> bool:
+        self.log.check()
+        deleted = super().delete(user_id)
+        self._commit()
+        return deleted
+
+    def delete_many(self, user_ids: List[str]) -> List[bool]:
+        self.log.check()
+        deleted = super().delete_many(user_ids)
+        self._commit()
+        return deleted
+
+    def stats(self) -> dict:
+        return {
+            **super().stats(),
+            "snapshot_version": self.snapshot_version,
+            "logged_changes": self.log.written - self.snapshot_version,
+            "log_syncs": self.log.syncs,
+        }
+
+    def close(self) -> None:
+        with self._snapshotting:
+            self.log.close()
+        self._lock_file.close()
@@ -0,0 +1,820 @@
+"""Storage backends for Service A users."""
+
+import os
+import secrets
+import sqlite3
+import sys
+import threading
+from abc import ABC, abstractmethod
+from bisect import bisect_left, bisect_right, insort
+from collections import Counter
+from contextlib import contextmanager
+from typing import (
+    Callable,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    NamedTuple,
+    Optional,
+    Tuple,
+    Union,
+)
+
+# A write as seen by change listeners: (version, op, user_id, user). ``op`` is
+# "create", "update" or "delete", and ``user`` is None for deletes.
+Change = Tuple[int, str, str, Optional[dict]]
+ChangeListener = Callable[[List[Change]], None]
+
+
+class EmailTakenError(Exception):
+    """Raised when a unique email was requested but another user already has it"""
+
+    def __init__(self, email: str, owner_id: str):
+        super().__init__(f"Email already exists: {email}")
+        self.email = email
+        self.owner_id = owner_id
+
+
+def email_key(email: str) -> str:
+    """Normalise an email for the case-insensitive email index"""
+    return email.lower()
+
+
+def _check_user_fields(name: object, email: object) -> None:
+    """Raise TypeError unless ``name`` and ``email`` are strings
+
+    Stores call it before a write changes anything, so a bad value cannot
+    leave them half-updated.
+    """
+    if not isinstance(name, str) or not isinstance(email, str):
+        raise TypeError("User name and email must be strings")
+
+
+def _check_update(fields: dict) -> None:
+    _check_user_fields(fields.get("name", ""), fields.get("email", ""))
+
+
+class UserStore(ABC):
+    """Interface the user endpoints are written against.
+
+    Users are plain ``{"id", "name", "email"}`` dicts. Callers must treat the
+    returned dicts as read-only.
+
+    Every write bumps a store-wide version. Listeners registered with
+    ``subscribe`` receive the resulting changes in version order, from inside
+    the write, so they must be cheap and must not call back into the store.
+
+    Versions only identify a write together with ``epoch``, a string that
+    changes whenever the versions may start again from 0, such as when a
+    store that is not persisted is created.
+    """
+
+    epoch: str
+    # Whether other processes write to the same users, which listeners of
+    # this store never hear about
+    shared = False
+
+    def __init__(self):
+        self._listeners: List[ChangeListener] = []
+
+    def subscribe(self, listener: ChangeListener) -> None:
+        """Call ``listener`` with the list of changes made by each write"""
+        self._listeners.append(listener)
+
+    def _notify(self, changes: List[Change]) -> None:
+        if changes:
+            for listener in self._listeners:
+                listener(changes)
+
+    @property
+    @abstractmethod
+    def version(self) -> int:
+        """Version of the most recent write, 0 before the first one"""
+
+    @abstractmethod
+    def create(self, name: str, email: str, unique_email: bool = False) -> dict:
+        """Store a new user and return it with its assigned ID
+
+        With ``unique_email`` the user is only created if no other user has
+        the same email, otherwise EmailTakenError is raised.
+        """
+
+    @abstractmethod
+    def get(self, user_id: str) -> Optional[dict]:
+        """Return a user, or None if it does not exist"""
+
+    @abstractmethod
+    def get_versioned(self, user_id: str) -> Optional[Tuple[dict, int]]:
+        """Return a user with the version of its last write, or None"""
+
+    @abstractmethod
+    def update(self, user_id: str, fields: dict) -> Optional[dict]:
+        """Apply ``name``/``email`` from ``fields`` and return the updated user"""
+
+    @abstractmethod
+    def delete(self, user_id: str) -> bool:
+        """Remove a user, returning False if it did not exist"""
+
+    def create_many(self, items: List[Tuple[str, str]]) -> List[dict]:
+        """Create users from ``(name, email)`` pairs in a single batch"""
+        return [self.create(name, email) for name, email in items]
+
+    def update_many(self, items: List[Tuple[str, dict]]) -> List[Optional[dict]]:
+        """Apply ``(user_id, fields)`` updates in a single batch"""
+        return [self.update(user_id, fields) for user_id, fields in items]
+
+    def delete_many(self, user_ids: List[str]) -> List[bool]:
+        """Delete several users in a single batch"""
+        return [self.delete(user_id) for user_id in user_ids]
+
+    @abstractmethod
+    def list_after(self, after: int, limit: int) -> List[dict]:
+        """Return up to ``limit`` users with a numeric ID greater than ``after``"""
+
+    @abstractmethod
+    def find_by_email(self, email: str) -> List[dict]:
+        """Return the users with this email, compared case-insensitively"""
+
+    @abstractmethod
+    def count(self) -> int:
+        """Return the number of stored users"""
+
+    def stats(self) -> dict:
+        """Number of users, and the bytes they take where the backend knows"""
+        return {"users": self.count()}
+
+    def close(self) -> None:
+        """Release any resources held by the store"""
+
+
+def new_epoch() -> str:
+    """A random epoch, for a store whose versions start from 0"""
+    return secrets.token_hex(4)
+
+
+def _size_stats(users: int, size: int) -> dict:
+    per_user = round(size / users, 1) if users else None
+    return {"users": users, "bytes": size, "bytes_per_user": per_user}
+
+
+class IdAllocator:
+    """Monotonic source of user IDs that never hands out the same ID twice.
+
+    ``next_id`` is the only state, so persisting it alongside the users is
+    enough to keep IDs unique across restarts.
+    """
+
+    def __init__(self, next_id: int = 1):
+        self._next_id = next_id
+        self._lock = threading.Lock()
+
+    @property
+    def next_id(self) -> int:
+        return self._next_id
+
+    def allocate(self) -> int:
+        """Reserve and return the next ID"""
+        with self._lock:
+            value = self._next_id
+            self._next_id += 1
+        return value
+
+    def advance_past(self, used_id: int) -> None:
+        """Make sure an ID loaded from storage is never allocated again"""
+        with self._lock:
+            if used_id >= self._next_id:
+                self._next_id = used_id + 1
+
+
+class UserColumns(NamedTuple):
+    """Users as one list per field, the form they are saved and restored in"""
+
+    ids: List[int]
+    names: List[str]
+    emails: List[str]
+    versions: List[int]
+
+
+class UserRecord:
+    """A user held by MemoryUserStore, without its ID
+
+    With slots it is under a third of the size of the equivalent dict.
+    Records are replaced rather than changed, so a reader always sees a
+    whole write, with the version of that write.
+    """
+
+    __slots__ = ("name", "email", "version")
+
+    def __init__(self, name: str, email: str, version: int):
+        self.name = name
+        self.email = email
+        self.version = version
+
+    def as_dict(self, user_id: str) -> dict:
+        return {"id": user_id, "name": self.name, "email": self.email}
+
+
+# Bytes held per user outside its strings and the containers: the record,
+# its int key and its version
+_RECORD_BYTES = sys.getsizeof(UserRecord("", "", 0)) + 2 * sys.getsizeof(1 << 20)
+
+
+# Largest user ID, which is also the largest INTEGER SQLite can store
+MAX_USER_ID = 2**63 - 1
+
+
+def _user_key(user_id: str) -> Optional[int]:
+    """The key ``user_id`` is stored under, or None if no user can have it
+
+    Both backends accept the same IDs: positive decimal numbers without
+    leading zeros, signs or spaces, up to MAX_USER_ID.
+    """
+    if (
+        user_id.isascii()
+        and user_id.isdigit()
+        and user_id[0] != "0"
+        and len(user_id) <= len(str(MAX_USER_ID))
+    ):
+        uid = int(user_id)
+        if uid <= MAX_USER_ID:
+            return uid
+    return None
+
+
+class MemoryUserStore(UserStore):
+    """Process-local store backed by a dict, lost on restart
+
+    Users are kept as UserRecords under their numeric ID, with no ID string
+    or separate version entry per user. The same int objects key the
+    records, the ID order and the email index. Dicts are built only for the
+    users a call returns.
+    """
+
+    def __init__(self, next_id: int = 1):
+        super().__init__()
+        self.epoch = new_epoch()
+        self._version = 0
+        self._users: Dict[int, UserRecord] = {}
+        # Numeric user IDs kept sorted so a page can be located by bisection
+        self._order: List[int] = []
+        # Email key -> ID of the user with that email, or a list of IDs in
+        # creation order when several users share it
+        self._by_email: Dict[str, Union[int, List[int]]] = {}
+        # Bytes of names, emails and index entries, kept up to date by writes
+        # so that memory_usage() does not have to walk the users
+        self._data_bytes = 0
+        self._lock = threading.Lock()
+        self.ids = IdAllocator(next_id)
+
+    @property
+    def version(self) -> int:
+        return self._version
+
+    def load(self, users: Iterable[dict]) -> None:
+        """Replace the contents with previously stored users"""
+        users = list(users)
+        columns = UserColumns(
+            [int(user["id"]) for user in users],
+            [user["name"] for user in users],
+            [user["email"] for user in users],
+            [self._version] * len(users),
+        )
+        self.restore(columns, self._version, self.ids.next_id)
+
+    def restore(self, columns: UserColumns, version: int, next_id: int) -> None:
+        """Replace the contents with the users in ``columns``
+
+        The store continues from ``version`` and never allocates an ID below
+        ``next_id``, as when the users were exported. Users are indexed in
+        bulk, which is several times faster than adding them one by one.
+        """
+        ids, names, emails, versions = columns
+        records = dict(zip(ids, map(UserRecord, names, emails, versions)))
+        order = sorted(records)
+        if order != list(records):
+            records = {uid: records[uid] for uid in order}
+        with self._lock:
+            self._users = records
+            self._order = order
+            self._version = version
+            self.ids.advance_past(next_id - 1)
+            if order:
+                self.ids.advance_past(order[-1])
+            self._data_bytes = sum(map(sys.getsizeof, names)) + sum(
+                map(sys.getsizeof, emails)
+            )
+            self._index_all_emails()
+
+    def _index_all_emails(self) -> None:
+        emails = [record.email for record in self._users.values()]
+        keys = [
+            email if key == email else key
+            for key, email in zip(map(email_key, emails), emails)
+        ]
+        self._by_email = dict(zip(keys, self._users))
+        self._data_bytes += sum(
+            sys.getsizeof(key) for key, email in zip(keys, emails) if key is not email
+        )
+        if len(self._by_email) < len(keys):
+            # Emails shared by several users get the list of their IDs
+            shared = {key: [] for key, count in Counter(keys).items() if count > 1}
+            for key, uid in zip(keys, self._users):
+                owners = shared.get(key)
+                if owners is not None:
+                    owners.append(uid)
+            self._by_email.update(shared)
+            self._data_bytes += sum(map(sys.getsizeof, shared.values()))
+
+    def export(
+        self, during: Optional[Callable[[int], None]] = None
+    ) -> Tuple[Dict[int, UserRecord], int, int]:
+        """A copy of the users by ID, with the version and next ID it is at
+
+        Records are never changed, so the copy stays as it was. Writes wait
+        while the dict is copied and ``during(version)`` runs; reads do not.
+        """
+        with self._lock:
+            if during is not None:
+                during(self._version)
+            return self._users.copy(), self._version, self.ids.next_id
+
+    def apply_changes(self, changes: Iterable[Change]) -> None:
+        """Redo changes this store made before, keeping their IDs and versions
+
+        Listeners are not told about them.
+        """
+        with self._lock:
+            for version, op, user_id, user in changes:
+                uid = int(user_id)
+                if op == "delete":
+                    self._remove_locked(uid)
+                else:
+                    record = UserRecord(user["name"], user["email"], version)
+                    self._put_locked(uid, record)
+                    self.ids.advance_past(uid)
+                self._version = version
+
+    def _add_record_bytes(self, record: UserRecord, sign: int) -> None:
+        size = sys.getsizeof(record.name) + sys.getsizeof(record.email)
+        self._data_bytes += sign * size
+
+    def _index_email(self, email: str, key: str, uid: int) -> None:
+        if key == email:
+            # Share the email's string rather than keep an equal copy
+            key = email
+        owners = self._by_email.get(key)
+        if owners is None:
+            self._by_email[key] = uid
+            if key is not email:
+                self._data_bytes += sys.getsizeof(key)
+        elif isinstance(owners, int):
+            owners = self._by_email[key] = [owners, uid]
+            self._data_bytes += sys.getsizeof(owners)
+        else:
+            before = sys.getsizeof(owners)
+            owners.append(uid)
+            self._data_bytes += sys.getsizeof(owners) - before
+
+    def _unindex_email(self, email: str, key: str, uid: int) -> None:
+        owners = self._by_email[key]
+        if isinstance(owners, int):
+            del self._by_email[key]
+            if key != email:
+                self._data_bytes -= sys.getsizeof(key)
+            return
+        before = sys.getsizeof(owners)
+        owners.remove(uid)
+        if len(owners) == 1:
+            self._by_email[key] = owners[0]
+            self._data_bytes -= before
+        else:
+            self._data_bytes += sys.getsizeof(owners) - before
+
+    def _owners(self, email: str) -> List[int]:
+        owners = self._by_email.get(email_key(email), ())
+        return [owners] if isinstance(owners, int) else list(owners)
+
+    def _next_version(self) -> int:
+        self._version += 1
+        return self._version
+
+    # The write helpers below compute the email keys before changing
+    # anything, so that nothing is left half-updated if that fails
+
+    def _put_locked(self, uid: int, record: UserRecord) -> None:
+        key = email_key(record.email)
+        old = self._users.get(uid)
+        if old is None:
+            self._users[uid] = record
+            self._add_record_bytes(record, 1)
+            # Allocated IDs only grow, so appending normally keeps the order
+            if self._order and uid < self._order[-1]:
+                insort(self._order, uid)
+            else:
+                self._order.append(uid)
+            self._index_email(record.email, key, uid)
+            return
+        old_key = email_key(old.email)
+        self._users[uid] = record
+        self._add_record_bytes(record, 1)
+        self._add_record_bytes(old, -1)
+        if key != old_key:
+            self._unindex_email(old.email, old_key, uid)
+            self._index_email(record.email, key, uid)
+
+    def _remove_locked(self, uid: Optional[int]) -> Optional[UserRecord]:
+        record = self._users.get(uid)
+        if record is None:
+            return None
+        self._unindex_email(record.email, email_key(record.email), uid)
+        del self._users[uid]
+        self._add_record_bytes(record, -1)
+        index = bisect_left(self._order, uid)
+        if index < len(self._order) and self._order[index] == uid:
+            del self._order[index]
+        return record
+
+    def _create_locked(self, name: str, email: str) -> Change:
+        uid = self.ids.allocate()
+        record = UserRecord(name, email, self._next_version())
+        self._put_locked(uid, record)
+        user_id = str(uid)
+        return record.version, "create", user_id, record.as_dict(user_id)
+
+    def _update_locked(self, user_id: str, fields: dict) -> Optional[Change]:
+        uid = _user_key(user_id)
+        old = self._users.get(uid)
+        if old is None:
+            return None
+        record = UserRecord(
+            fields.get("name", old.name),
+            fields.get("email", old.email),
+            self._next_version(),
+        )
+        self._put_locked(uid, record)
+        return record.version, "update", user_id, record.as_dict(user_id)
+
+    def _delete_locked(self, user_id: str) -> Optional[Change]:
+        if self._remove_locked(_user_key(user_id)) is None:
+            return None
+        return self._next_version(), "delete", user_id, None
+
+    def create(self, name: str, email: str, unique_email: bool = False) -> dict:
+        _check_user_fields(name, email)
+        with self._lock:
+            if unique_email:
+                owners = self._owners(email)
+                if owners:
+                    raise EmailTakenError(email, str(owners[0]))
+            change = self._create_locked(name, email)
+            self._notify([change])
+        return change[3]
+
+    def create_many(self, items: List[Tuple[str, str]]) -> List[dict]:
+        for name, email in items:
+            _check_user_fields(name, email)
+        with self._lock:
+            changes = [self._create_locked(name, email) for name, email in items]
+            self._notify(changes)
+        return [change[3] for change in changes]
+
+    def get(self, user_id: str) -> Optional[dict]:
+        record = self._users.get(_user_key(user_id))
+        return record.as_dict(user_id) if record is not None else None
+
+    def get_versioned(self, user_id: str) -> Optional[Tuple[dict, int]]:
+        record = self._users.get(_user_key(user_id))
+        if record is None:
+            return None
+        return record.as_dict(user_id), record.version
+
+    def update(self, user_id: str, fields: dict) -> Optional[dict]:
+        _check_update(fields)
+        with self._lock:
+            change = self._update_locked(user_id, fields)
+            if change is None:
+                return None
+            self._notify([change])
+        return change[3]
+
+    def update_many(self, items: List[Tuple[str, dict]]) -> List[Optional[dict]]:
+        for _, fields in items:
+            _check_update(fields)
+        with self._lock:
+            changes = [
+                self._update_locked(user_id, fields) for user_id, fields in items
+            ]
+            self._notify([change for change in changes if change is not None])
+        return [change[3] if change else None for change in changes]
+
+    def delete(self, user_id: str) -> bool:
+        with self._lock:
+            change = self._delete_locked(user_id)
+            if change is None:
+                return False
+            self._notify([change])
+        return True
+
+    def delete_many(self, user_ids: List[str]) -> List[bool]:
+        with self._lock:
+            changes = [self._delete_locked(user_id) for user_id in user_ids]
+            self._notify([change for change in changes if change is not None])
+        return [change is not None for change in changes]
+
+    def list_after(self, after: int, limit: int) -> List[dict]:
+        start = bisect_right(self._order, after)
+        end = start + limit
+        page = []
+        for uid in self._order[start:end]:
+            record = self._users.get(uid)
+            # The ID may have been deleted between the slice and the lookup
+            if record is not None:
+                page.append(record.as_dict(str(uid)))
+        return page
+
+    def find_by_email(self, email: str) -> List[dict]:
+        records = ((uid, self._users.get(uid)) for uid in self._owners(email))
+        return [
+            record.as_dict(str(uid)) for uid, record in records if record is not None
+        ]
+
+    def count(self) -> int:
+        return len(self._users)
+
+    def memory_usage(self) -> int:
+        """Estimated bytes held by the users and their indexes
+
+        Sizes are tracked as users are written, so this does not depend on
+        the number of users. Strings shared with other objects are counted
+        as if the store held the only reference.
+        """
+        return (
+            sys.getsizeof(self._users)
+            + sys.getsizeof(self._order)
+            + sys.getsizeof(self._by_email)
+            + len(self._users) * _RECORD_BYTES
+            + self._data_bytes
+        )
+
+    def stats(self) -> dict:
+        return _size_stats(self.count(), self.memory_usage())
+
+
+class SQLiteUserStore(UserStore):
+    """Store shared by every worker process through one SQLite database.
+
+    The database runs in WAL mode so readers never block the single writer.
+    Each thread gets its own connection, reopened after a fork, and every
+    query is a constant SQL string so sqlite3's per-connection statement
+    cache keeps it prepared. IDs come from AUTOINCREMENT, which is assigned
+    inside the insert and never reuses the ID of a deleted row. Emails are
+    indexed by the ``email_key`` column, filled by ``email_key()`` as in the
+    memory store, since ``COLLATE NOCASE`` only folds ASCII letters.
+
+    The store version and epoch live in the ``meta`` table so that every
+    process sharing the database agrees on them. The epoch is chosen when
+    the database is created. Change listeners only see the writes made by
+    their own process.
+    """
+
+    shared = True
+
+    _SCHEMA = (
+        """
+        CREATE TABLE IF NOT EXISTS users (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT NOT NULL,
+            email TEXT NOT NULL,
+            version INTEGER NOT NULL DEFAULT 0,
+            email_key TEXT NOT NULL
+        )
+        """,
+        "CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value INTEGER NOT NULL)",
+        "INSERT OR IGNORE INTO meta (key, value) VALUES ('version', 0)",
+        "INSERT OR IGNORE INTO meta (key, value)"
+        " VALUES ('epoch', abs(random() % 4294967296))",
+    )
+
+    # Created once older databases have the email_key column
+    _INDEX = "CREATE INDEX IF NOT EXISTS idx_users_email_key ON users (email_key)"
+
+    _INSERT = "INSERT INTO users (name, email, version, email_key) VALUES (?, ?, ?, ?)"
+    _SELECT = "SELECT id, name, email, version FROM users WHERE id = ?"
+    _UPDATE = (
+        "UPDATE users SET name = COALESCE(?, name), email = COALESCE(?, email),"
+        " email_key = COALESCE(?, email_key), version = ? WHERE id = ?"
+    )
+    _DELETE = "DELETE FROM users WHERE id = ?"
+    _LIST_AFTER = "SELECT id, name, email FROM users WHERE id > ? ORDER BY id LIMIT ?"
+    _FIND_BY_EMAIL = "SELECT id, name, email FROM users WHERE email_key = ? ORDER BY id"
+    _COUNT = "SELECT COUNT(*) FROM users"
+    _BUMP_VERSION = "UPDATE meta SET value = value + ? WHERE key = 'version'"
+    _VERSION = "SELECT value FROM meta WHERE key = 'version'"
+    _EPOCH = "SELECT value FROM meta WHERE key = 'epoch'"
+    _SIZE = "SELECT page_count * page_size FROM pragma_page_count, pragma_page_size"
+
+    def __init__(self, path: str, timeout: float = 30.0):
+        super().__init__()
+        self.path = path
+        self.timeout = timeout
+        self._local = threading.local()
+        conn = self._connection()
+        for statement in self._SCHEMA:
+            conn.execute(statement)
+        self._migrate(conn)
+        conn.execute(self._INDEX)
+        self.epoch = format(conn.execute(self._EPOCH).fetchone()[0], "08x")
+
+    def _migrate(self, conn: sqlite3.Connection) -> None:
+        """Bring databases created by older releases up to the current schema"""
+        columns = {row[1] for row in conn.execute("PRAGMA table_info(users)")}
+        if "version" not in columns:
+            conn.execute(
+                "ALTER TABLE users ADD COLUMN version INTEGER NOT NULL DEFAULT 0"
+            )
+        if "email_key" not in columns:
+            with self._transaction():
+                # Another worker may have added it since
+                columns = {row[1] for row in conn.execute("PRAGMA table_info(users)")}
+                if "email_key" in columns:
+                    return
+                conn.execute(
+                    "ALTER TABLE users ADD COLUMN email_key TEXT NOT NULL DEFAULT ''"
+                )
+                rows = conn.execute("SELECT id, email FROM users").fetchall()
+                conn.executemany(
+                    "UPDATE users SET email_key = ? WHERE id = ?",
+                    [(email_key(email), row_id) for row_id, email in rows],
+                )
+                conn.execute("DROP INDEX IF EXISTS idx_users_email")
+
+    def _connection(self) -> sqlite3.Connection:
+        pid = os.getpid()
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != pid:
+            # Connections must not cross a fork, so workers open their own
+            conn = sqlite3.connect(
+                self.path,
+                timeout=self.timeout,
+                isolation_level=None,
+                check_same_thread=False,
+            )
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            self._local.pid = pid
+        return conn
+
+    @staticmethod
+    def _row_to_user(row) -> dict:
+        return {"id": str(row[0]), "name": row[1], "email": row[2]}
+
+    @contextmanager
+    def _transaction(self) -> Iterator[sqlite3.Connection]:
+        """Run statements in one write transaction, taking the lock up front"""
+        conn = self._connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+
+    @property
+    def version(self) -> int:
+        return self._connection().execute(self._VERSION).fetchone()[0]
+
+    def _reserve_versions(self, conn: sqlite3.Connection, count: int) -> int:
+        """Reserve ``count`` consecutive versions and return the first one"""
+        conn.execute(self._BUMP_VERSION, (count,))
+        return conn.execute(self._VERSION).fetchone()[0] - count + 1
+
+    def _insert(
+        self, conn: sqlite3.Connection, name: str, email: str, version: int
+    ) -> Change:
+        cursor = conn.execute(self._INSERT, (name, email, version, email_key(email)))
+        user = {"id": str(cursor.lastrowid), "name": name, "email": email}
+        return version, "create", user["id"], user
+
+    def _update_row(
+        self, conn: sqlite3.Connection, user_id: str, fields: dict, version: int
+    ) -> Optional[Change]:
+        row_id = _user_key(user_id)
+        if row_id is None:
+            return None
+        email = fields.get("email")
+        key = None if email is None else email_key(email)
+        conn.execute(self._UPDATE, (fields.get("name"), email, key, version, row_id))
+        row = conn.execute(self._SELECT, (row_id,)).fetchone()
+        if row is None:
+            return None
+        return version, "update", user_id, self._row_to_user(row)
+
+    def _delete_row(
+        self, conn: sqlite3.Connection, user_id: str, version: int
+    ) -> Optional[Change]:
+        row_id = _user_key(user_id)
+        if row_id is None or conn.execute(self._DELETE, (row_id,)).rowcount == 0:
+            return None
+        return version, "delete", user_id, None
+
+    # Listeners are notified before COMMIT, while the database write lock
+    # still orders this process's writes. A version reserved for a missing
+    # user is simply skipped.
+
+    def create(self, name: str, email: str, unique_email: bool = False) -> dict:
+        _check_user_fields(name, email)
+        with self._transaction() as conn:
+            if unique_email:
+                owner = conn.execute(
+                    self._FIND_BY_EMAIL, (email_key(email),)
+                ).fetchone()
+                if owner is not None:
+                    raise EmailTakenError(email, str(owner[0]))
+            change = self._insert(conn, name, email, self._reserve_versions(conn, 1))
+            self._notify([change])
+        return change[3]
+
+    def create_many(self, items: List[Tuple[str, str]]) -> List[dict]:
+        for name, email in items:
+            _check_user_fields(name, email)
+        with self._transaction() as conn:
+            first = self._reserve_versions(conn, len(items))
+            changes = [
+                self._insert(conn, name, email, first + n)
+                for n, (name, email) in enumerate(items)
+            ]
+            self._notify(changes)
+        return [change[3] for change in changes]
+
+    def get(self, user_id: str) -> Optional[dict]:
+        found = self.get_versioned(user_id)
+        return found[0] if found else None
+
+    def get_versioned(self, user_id: str) -> Optional[Tuple[dict, int]]:
+        row_id = _user_key(user_id)
+        if row_id is None:
+            return None
+        row = self._connection().execute(self._SELECT, (row_id,)).fetchone()
+        return (self._row_to_user(row), row[3]) if row else None
+
+    def update(self, user_id: str, fields: dict) -> Optional[dict]:
+        return self.update_many([(user_id, fields)])[0]
+
+    def update_many(self, items: List[Tuple[str, dict]]) -> List[Optional[dict]]:
+        for _, fields in items:
+            _check_update(fields)
+        with self._transaction() as conn:
+            first = self._reserve_versions(conn, len(items))
+            changes = [
+                self._update_row(conn, user_id, fields, first + n)
+                for n, (user_id, fields) in enumerate(items)
+            ]
+            self._notify([change for change in changes if change is not None])
+        return [change[3] if change else None for change in changes]
+
+    def delete(self, user_id: str) -> bool:
+        return self.delete_many([user_id])[0]
+
+    def delete_many(self, user_ids: List[str]) -> List[bool]:
+        with self._transaction() as conn:
+            first = self._reserve_versions(conn, len(user_ids))
+            changes = [
+                self._delete_row(conn, user_id, first + n)
+                for n, user_id in enumerate(user_ids)
+            ]
+            self._notify([change for change in changes if change is not None])
+        return [change is not None for change in changes]
+
+    def list_after(self, after: int, limit: int) -> List[dict]:
+        rows = self._connection().execute(self._LIST_AFTER, (after, limit))
+        return [self._row_to_user(row) for row in rows]
+
+    def find_by_email(self, email: str) -> List[dict]:
+        rows = self._connection().execute(self._FIND_BY_EMAIL, (email_key(email),))
+        return [self._row_to_user(row) for row in rows]
+
+    def count(self) -> int:
+        return self._connection().execute(self._COUNT).fetchone()[0]
+
+    def stats(self) -> dict:
+        # Size of the main database file, not counting the WAL
+        size = self._connection().execute(self._SIZE).fetchone()[0]
+        return _size_stats(self.count(), size)
+
+    def close(self) -> None:
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+
+def create_store(backend: str, sqlite_path: str = "users.db") -> UserStore:
+    """Build the store selected by the STORAGE_BACKEND setting"""
+    if backend == "memory":
+        return MemoryUserStore()
+    if backend == "sqlite":
+        return SQLiteUserStore(sqlite_path)
+    raise ValueError(f"Unknown storage backend: {backend!r}")
@@ -1,14 +1,16 @@
 """Tests for Service A user endpoints."""
 
+import json
 import unittest
-from app import app
+from concurrent.futures import ThreadPoolExecutor
+from app import create_app
 
 
 class TestUserService(unittest.TestCase):
     """Unit tests for the user service endpoints."""
 
     def setUp(self):
-        self.app = app.test_client()
+        self.app = create_app().test_client()
         self.app.testing = True
 
     def test_create_user(self):
@@ -25,6 +27,19 @@ class TestUserService(unittest.TestCase):
         self.assertEqual(data["email"], user_data["email"])
         self.assertIn("id", data)
 
+    def test_create_user_rejects_non_string_fields(self):
+        for data in ({"name": "x", "email": 5}, {"name": ["x"], "email": "x@y.z"}, 5):
+            response = self.app.post("/users", json=data)
+            self.assertEqual(response.status_code, 400, data)
+        user_id = self._create_users(1)[0]
+        response = self.app.put(f"/users/{user_id}", json={"email": None})
+        self.assertEqual(response.status_code, 400)
+
+        # Nothing was half-written, so the user can still be deleted
+        self.assertEqual(self.app.get("/stats").get_json()["users"], 1)
+        self.assertEqual(self.app.delete(f"/users/{user_id}").status_code, 204)
+        self.assertEqual(self.app.get("/users?limit=10").get_json()["users"], [])
+
     def test_get_user(self):
         # First create a user
         user_data = {"name": "Mohamed Farag", "email": "Mohamed@gmail.com"}
@@ -42,10 +57,241 @@ class TestUserService(unittest.TestCase):
         self.assertEqual(data["name"], user_data["name"])
         self.assertEqual(data["email"], user_data["email"])
 
+    def test_home_page(self):
+        response = self.app.get("/")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.mimetype, "text/html")
+        self.assertIn(b"/assets/home.", response.data)
+
+    def test_apps_do_not_share_users(self):
+        user_id = self._create_users(1)[0]
+        other = create_app().test_client()
+        self.assertEqual(other.get(f"/users/{user_id}").status_code, 404)
+
     def test_get_nonexistent_user(self):
         response = self.app.get("/users/999")
         self.assertEqual(response.status_code, 404)
 
+    def _create_users(self, count):
+        ids = []
+        for i in range(count):
+            response = self.app.post(
+                "/users", json={"name": f"User {i}", "email": f"user{i}@example.com"}
+            )
+            ids.append(response.get_json()["id"])
+        return ids
+
+    def test_list_users_paginated(self):
+        created = self._create_users(5)
+
+        seen = []
+        cursor = None
+        while True:
+            url = "/users?limit=2" + (f"&cursor={cursor}" if cursor else "")
+            response = self.app.get(url)
+            self.assertEqual(response.status_code, 200)
+            page = response.get_json()
+            self.assertLessEqual(len(page["users"]), 2)
+            seen.extend(user["id"] for user in page["users"])
+            cursor = page["next_cursor"]
+            if cursor is None:
+                break
+
+        self.assertEqual(seen, sorted(seen, key=int))
+        self.assertEqual(len(seen), len(set(seen)))
+        for user_id in created:
+            self.assertIn(user_id, seen)
+
+    def test_list_users_streams_array_and_ndjson(self):
+        self._create_users(3)
+
+        response = self.app.get("/users")
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.is_streamed)
+        array = json.loads(response.get_data(as_text=True))
+
+        response = self.app.get("/users?format=ndjson")
+        self.assertEqual(response.mimetype, "application/x-ndjson")
+        lines = [
+            json.loads(line) for line in response.get_data(as_text=True).splitlines()
+        ]
+
+        self.assertEqual(array, lines)
+        self.assertEqual(
+            [user["id"] for user in array],
+            sorted((user["id"] for user in array), key=int),
+        )
+
+    def test_concurrent_creates_get_unique_ids(self):
+        def create(i):
+            client = self.app.application.test_client()
+            response = client.post(
+                "/users", json={"name": f"User {i}", "email": f"user{i}@example.com"}
+            )
+            return response.get_json()
+
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            created = list(pool.map(create, range(500)))
+
+        self.assertEqual(len({user["id"] for user in created}), len(created))
+        for user in created:
+            self.assertEqual(self.app.get(f"/users/{user['id']}").get_json(), user)
+
+    def test_find_users_by_email(self):
+        user = self.app.post(
+            "/users", json={"name": "Sara Ali", "email": "Sara.Ali@example.org"}
+        ).get_json()
+
+        response = self.app.get("/users?email=sara.ali@EXAMPLE.org")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.get_json(), [user])
+
+        self.app.put(f"/users/{user['id']}", json={"email": "sara@example.org"})
+        self.assertEqual(
+            self.app.get("/users?email=sara.ali@example.org").get_json(), []
+        )
+        self.assertEqual(
+            self.app.get("/users?email=sara@example.org").get_json()[0]["id"],
+            user["id"],
+        )
+
+        self.app.delete(f"/users/{user['id']}")
+        self.assertEqual(self.app.get("/users?email=sara@example.org").get_json(), [])
+
+    def test_create_user_with_unique_email(self):
+        user_data = {"name": "Omar Said", "email": "omar.said@example.net"}
+        first = self.app.post("/users?unique_email=true", json=user_data)
+        self.assertEqual(first.status_code, 201)
+
+        response = self.app.post("/users?unique_email=true", json=user_data)
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.get_json()["id"], first.get_json()["id"])
+
+        # Without the flag duplicates are still allowed
+        self.assertEqual(self.app.post("/users", json=user_data).status_code, 201)
+
+    def test_bulk_create_update_delete(self):
+        response = self.app.post(
+            "/users/bulk",
+            json=[
+                {"name": "Bulk One", "email": "bulk1@example.com"},
+                {"name": "Missing Email"},
+                {"name": "Bulk Two", "email": "bulk2@example.com"},
+                {"name": "Numeric Email", "email": 5},
+            ],
+        )
+        self.assertEqual(response.status_code, 200)
+        data = response.get_json()
+        self.assertEqual([r["status"] for r in data["results"]], [201, 400, 201, 400])
+        self.assertEqual((data["succeeded"], data["failed"]), (2, 2))
+        first, second = data["results"][0]["user"], data["results"][2]["user"]
+
+        response = self.app.patch(
+            "/users/bulk",
+            data=json.dumps({"id": first["id"], "name": "Bulk Renamed"})
+            + "\n"
+            + json.dumps({"id": "999999"})
+            + "\n"
+            + json.dumps({"id": first["id"], "email": {"a": 1}}),
+            content_type="application/x-ndjson",
+        )
+        self.assertEqual(response.mimetype, "application/x-ndjson")
+        results = [
+            json.loads(line) for line in response.get_data(as_text=True).splitlines()
+        ]
+        self.assertEqual(results[0]["user"]["name"], "Bulk Renamed")
+        self.assertEqual(results[1]["status"], 400)
+        self.assertEqual(results[2]["status"], 400)
+
+        response = self.app.delete(
+            "/users/bulk", json=[first["id"], {"id": second["id"]}, "999999"]
+        )
+        statuses = [r["status"] for r in response.get_json()["results"]]
+        self.assertEqual(statuses, [204, 204, 404])
+        self.assertEqual(self.app.get(f"/users/{first['id']}").status_code, 404)
+
+    def test_list_users_rejects_bad_parameters(self):
+        self.assertEqual(self.app.get("/users?cursor=abc").status_code, 400)
+        self.assertEqual(self.app.get("/users?limit=0").status_code, 400)
+        self.assertEqual(self.app.get("/users?limit=100000").status_code, 400)
+        self.assertEqual(self.app.get("/users?cursor=-1").status_code, 400)
+        self.assertEqual(self.app.get(f"/users?cursor={2**64}").status_code, 400)
+
+    def test_update_user_rejects_non_object_body(self):
+        user_id = self._create_users(1)[0]
+        response = self.app.put(f"/users/{user_id}", json=[1])
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.app.get(f"/users/{user_id}").get_json()["name"], "User 0")
+
+    def test_get_user_conditional(self):
+        user_id = self._create_users(1)[0]
+        response = self.app.get(f"/users/{user_id}")
+        etag = response.headers["ETag"]
+        self.assertEqual(response.headers["Cache-Control"], "no-cache")
+
+        cached = self.app.get(f"/users/{user_id}", headers={"If-None-Match": etag})
+        self.assertEqual(cached.status_code, 304)
+        self.assertEqual(cached.data, b"")
+        self.assertEqual(cached.headers["ETag"], etag)
+
+        self.app.put(f"/users/{user_id}", json={"name": "Renamed"})
+        changed = self.app.get(f"/users/{user_id}", headers={"If-None-Match": etag})
+        self.assertEqual(changed.status_code, 200)
+        self.assertEqual(changed.get_json()["name"], "Renamed")
+        self.assertNotEqual(changed.headers["ETag"], etag)
+
+    def test_etags_do_not_match_after_a_restart(self):
+        user_id = self._create_users(1)[0]
+        user_etag = self.app.get(f"/users/{user_id}").headers["ETag"]
+        list_etag = self.app.get("/users?limit=10").headers["ETag"]
+
+        # A restarted memory store hands out the same ID and versions again
+        restarted = create_app().test_client()
+        restarted.post("/users", json={"name": "Someone Else", "email": "else@x.com"})
+        response = restarted.get(
+            f"/users/{user_id}", headers={"If-None-Match": user_etag}
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.get_json()["name"], "Someone Else")
+        response = restarted.get(
+            "/users?limit=10", headers={"If-None-Match": list_etag}
+        )
+        self.assertEqual(response.status_code, 200)
+
+    def test_list_users_conditional(self):
+        self._create_users(1)
+        etag = self.app.get("/users?limit=10").headers["ETag"]
+        for url in ("/users", "/users?limit=10", "/users?format=ndjson"):
+            response = self.app.get(url, headers={"If-None-Match": etag})
+            self.assertEqual(response.status_code, 304, url)
+
+        self._create_users(1)
+        response = self.app.get("/users", headers={"If-None-Match": etag})
+        self.assertEqual(response.status_code, 200)
+
+    def test_metrics(self):
+        user_id = self._create_users(2)[0]
+        self.app.get(f"/users/{user_id}", buffered=True)
+        self.app.get("/users/missing", buffered=True)
+
+        text = self.app.get("/metrics").data.decode()
+        self.assertIn("service_a_users 2\n", text)
+        self.assertIn(
+            'http_requests_total{method="GET",route="/users/<user_id>",status="404"} 1',
+            text,
+        )
+
+    def test_stats(self):
+        stats = self.app.get("/stats").get_json()
+        self.assertEqual((stats["users"], stats["bytes_per_user"]), (0, None))
+
+        self._create_users(3)
+        stats = self.app.get("/stats").get_json()
+        self.assertEqual(stats["users"], 3)
+        self.assertEqual(stats["version"], 3)
+        self.assertGreater(stats["bytes"], 0)
+        self.assertAlmostEqual(stats["bytes_per_user"], stats["bytes"] / 3, places=0)
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,56 @@
+"""Tests for the streaming bulk body parsers."""
+
+import io
+import json
+import unittest
+from unittest.mock import patch
+
+import bulk
+
+
+class TestBulkParsers(unittest.TestCase):
+    def test_json_array_split_across_reads(self):
+        items = [{"name": "Zoë Ünal", "email": "zoe@example.com"}, 12345, "7", None]
+        body = json.dumps(items, ensure_ascii=False, indent=2).encode()
+        # Tiny reads split multi-byte characters, strings and numbers
+        with patch.object(bulk, "READ_SIZE", 3):
+            parsed = list(bulk.iter_json_array(io.BytesIO(body)))
+        self.assertEqual(parsed, [(i, item, None) for i, item in enumerate(items)])
+
+    def test_json_array_stops_at_malformed_body(self):
+        parsed = list(
+            bulk.iter_json_array(io.BytesIO(b'[{"id": 1}, {"id": 2} {"id": 3}]'))
+        )
+        self.assertEqual(parsed[:2], [(0, {"id": 1}, None), (1, {"id": 2}, None)])
+        self.assertEqual(len(parsed), 3)
+        self.assertIsNotNone(parsed[2][2])
+
+        index, item, error = list(bulk.iter_json_array(io.BytesIO(b'{"id": 1}')))[0]
+        self.assertEqual((index, item), (0, None))
+        self.assertIn("JSON array", error)
+
+    def test_ndjson_reports_bad_lines_individually(self):
+        parsed = list(bulk.iter_ndjson(io.BytesIO(b'{"id": 1}\n\nnot json\n{"id": 2}')))
+        self.assertEqual(parsed[0], (0, {"id": 1}, None))
+        self.assertEqual(parsed[1][:2], (1, None))
+        self.assertEqual(parsed[2], (2, {"id": 2}, None))
+
+    def test_apply_chunk_keeps_input_order(self):
+        chunk = [(0, {"v": 1}, None), (1, None, "Invalid JSON"), (2, {"v": 2}, None)]
+        results = bulk.apply_chunk(
+            chunk,
+            lambda item: item["v"],
+            lambda values: [{"status": 200, "value": v * 10} for v in values],
+        )
+        self.assertEqual(
+            results,
+            [
+                {"index": 0, "status": 200, "value": 10},
+                {"index": 1, "status": 400, "error": "Invalid JSON"},
+                {"index": 2, "status": 200, "value": 20},
+            ],
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,135 @@
+"""Tests for the user change log and GET /users/changes."""
+
+import json
+import os
+import tempfile
+import threading
+import unittest
+
+from app import create_app
+from changes import ChangeLog
+from storage import MemoryUserStore, SQLiteUserStore
+
+
+class TestChangeLog(unittest.TestCase):
+    def setUp(self):
+        self.store = MemoryUserStore()
+        self.log = ChangeLog(capacity=3)
+        self.store.subscribe(self.log)
+
+    def test_records_writes_in_version_order(self):
+        user = self.store.create("Ahmed Aly", "ahmed@gmail.com")
+        self.store.update(user["id"], {"name": "Ahmed M. Aly"})
+        self.store.delete(user["id"])
+
+        changes, reset = self.log.since(0)
+        self.assertFalse(reset)
+        self.assertEqual([c["version"] for c in changes], [1, 2, 3])
+        self.assertEqual([c["op"] for c in changes], ["create", "update", "delete"])
+        self.assertEqual(changes[1]["user"]["name"], "Ahmed M. Aly")
+        self.assertIsNone(changes[2]["user"])
+        self.assertEqual(self.log.since(2)[0], changes[2:])
+        self.assertEqual(self.log.version, self.store.version)
+
+    def test_reset_when_changes_were_dropped(self):
+        self.store.create_many(
+            [(f"User {i}", f"user{i}@example.com") for i in range(5)]
+        )
+        self.assertEqual(self.log.since(0), ([], True))
+        changes, reset = self.log.since(2)
+        self.assertFalse(reset)
+        self.assertEqual([c["version"] for c in changes], [3, 4, 5])
+
+    def test_reset_when_asked_for_changes_after_the_newest(self):
+        self.store.create("Ahmed Aly", "ahmed@gmail.com")
+        self.assertEqual(self.log.since(3), ([], True))
+        self.assertEqual(self.log.since(1), ([], False))
+
+    def test_wait_wakes_on_write(self):
+        timer = threading.Timer(
+            0.05, self.store.create, ("Ahmed Aly", "ahmed@gmail.com")
+        )
+        timer.start()
+        self.assertTrue(self.log.wait(0, timeout=5))
+        self.assertFalse(self.log.wait(self.log.version, timeout=0.01))
+
+
+class TestChangesEndpoint(unittest.TestCase):
+    def setUp(self):
+        app = create_app()
+        self.app = app.test_client()
+        self.store = app.extensions["users"]["store"]
+
+    def test_poll_changes(self):
+        since = self.store.version
+        user = self.app.post(
+            "/users", json={"name": "Ahmed Aly", "email": "ahmed@gmail.com"}
+        ).get_json()
+        self.app.delete(f"/users/{user['id']}")
+
+        data = self.app.get(f"/users/changes?since={since}").get_json()
+        self.assertFalse(data["reset"])
+        self.assertEqual(
+            [(c["op"], c["id"]) for c in data["changes"]],
+            [("create", user["id"]), ("delete", user["id"])],
+        )
+        self.assertEqual(data["version"], self.store.version)
+
+        data = self.app.get(f"/users/changes?since={data['version']}").get_json()
+        self.assertEqual(data["changes"], [])
+
+    def test_long_poll_returns_on_write(self):
+        since = self.store.version
+        timer = threading.Timer(0.05, self.store.create, ("Sara Ali", "sara@gmail.com"))
+        timer.start()
+        data = self.app.get(f"/users/changes?since={since}&timeout=5").get_json()
+        timer.join()
+        self.assertEqual(data["changes"][0]["user"]["name"], "Sara Ali")
+
+    def test_server_sent_events(self):
+        since = self.store.version
+        user = self.store.create("Omar Said", "omar@gmail.com")
+        response = self.app.get(
+            f"/users/changes?since={since}",
+            headers={"Accept": "text/event-stream"},
+            buffered=False,
+        )
+        self.assertEqual(response.mimetype, "text/event-stream")
+        event = next(iter(response.response))
+        response.close()
+        event = event.decode() if isinstance(event, bytes) else event
+        self.assertIn(f"id: {self.store.version}\nevent: create\n", event)
+        data = json.loads(event.split("data: ", 1)[1])
+        self.assertEqual(data["user"], user)
+
+    def test_consumer_ahead_of_a_restarted_store_is_reset(self):
+        self.store.create("Sara Ali", "sara@gmail.com")
+        data = self.app.get("/users/changes?since=3").get_json()
+        self.assertTrue(data["reset"])
+        self.assertEqual(data["version"], self.store.version)
+        self.assertEqual(data["epoch"], self.store.epoch)
+
+    def test_consumer_of_another_epoch_is_reset(self):
+        since = self.store.version
+        self.store.create_many([("Sara Ali", "sara@gmail.com")] * 3)
+        data = self.app.get(f"/users/changes?since={since}&epoch=0").get_json()
+        self.assertEqual((data["reset"], data["changes"]), (True, []))
+
+        url = f"/users/changes?since={since}&epoch={self.store.epoch}"
+        data = self.app.get(url).get_json()
+        self.assertFalse(data["reset"])
+        self.assertEqual(len(data["changes"]), 3)
+
+    def test_refused_for_a_store_shared_between_processes(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            store = SQLiteUserStore(os.path.join(tmpdir, "users.db"))
+            response = create_app(store).test_client().get("/users/changes")
+            store.close()
+        self.assertEqual(response.status_code, 501)
+
+    def test_rejects_bad_parameters(self):
+        self.assertEqual(self.app.get("/users/changes?since=abc").status_code, 400)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,261 @@
+"""Tests for the durable memory store's snapshots, log and crash recovery."""
+
+import errno
+import os
+import signal
+import subprocess
+import sys
+import tempfile
+import unittest
+from unittest.mock import patch
+
+from app import create_app
+from persistence import DurableUserStore, LogWriteError, RecoveryError, read_log
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+# Writes users from several threads and reports each write once it returns
+CRASH_WRITER = """
+import sys
+import threading
+
+from persistence import DurableUserStore
+
+store = DurableUserStore(sys.argv[1], snapshot_every=100)
+lock = threading.Lock()
+
+
+def report(op, user_id, doomed):
+    with lock:
+        sys.stdout.write(f"{op} {user_id} {doomed:d}\\n")
+        sys.stdout.flush()
+
+
+def writer(n):
+    for i in range(1_000_000):
+        # Doomed users are deleted after their update
+        doomed = i % 3 == 0
+        user_id = store.create(f"User {n}-{i}", f"user{n}-{i}@example.com")["id"]
+        report("create", user_id, doomed)
+        store.update(user_id, {"name": f"Updated {n}-{i}"})
+        report("update", user_id, doomed)
+        if doomed:
+            store.delete(user_id)
+            report("delete", user_id, doomed)
+
+
+for n in range(4):
+    threading.Thread(target=writer, args=(n,)).start()
+"""
+
+
+class TestDurableUserStore(unittest.TestCase):
+    def setUp(self):
+        tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmpdir.cleanup)
+        self.directory = tmpdir.name
+
+    def open(self, **kwargs):
+        store = DurableUserStore(self.directory, **kwargs)
+        self.addCleanup(store.close)
+        return store
+
+    def reopen(self, store, **kwargs):
+        store.close()
+        return self.open(**kwargs)
+
+    def users(self, store):
+        return store.list_after(0, 1_000_000)
+
+    def test_writes_survive_reopening(self):
+        store = self.open()
+        first = store.create("Ahmed Aly", "ahmed@gmail.com")
+        store.create_many([("Sara Ali", "Sara@gmail.com"), ("Zoë \ud800", "z@x.com")])
+        store.update(first["id"], {"email": "ahmed@example.com"})
+        store.delete("2")
+        users, version = self.users(store), store.version
+
+        store = self.reopen(store)
+        self.assertEqual(self.users(store), users)
+        self.assertEqual(store.version, version)
+        self.assertEqual(store.find_by_email("AHMED@example.com")[0]["id"], "1")
+        self.assertEqual(store.get_versioned("1")[1], 4)
+
+    def test_epoch_is_kept_until_the_versions_restart(self):
+        store = self.open()
+        store.create("Ahmed Aly", "ahmed@gmail.com")
+        epoch = store.epoch
+        store = self.reopen(store)
+        self.assertEqual(store.epoch, epoch)
+
+        # Without its users the directory counts versions from 0 again
+        store.close()
+        for name in os.listdir(self.directory):
+            if name.startswith(("snapshot-", "wal-")):
+                os.remove(os.path.join(self.directory, name))
+        store = self.open()
+        self.assertEqual(store.version, 0)
+        self.assertNotEqual(store.epoch, epoch)
+
+    def test_snapshots_replace_older_files(self):
+        store = self.open(snapshot_every=10)
+        for i in range(25):
+            store.create(f"User {i}", f"user{i}@example.com")
+        store.update("3", {"name": "Three"})
+        users = self.users(store)
+
+        store = self.reopen(store, snapshot_every=10)
+        self.assertEqual(self.users(store), users)
+        files = sorted(os.listdir(self.directory))
+        self.assertEqual(len([f for f in files if f.startswith("snapshot-")]), 1)
+        self.assertGreater(store.snapshot_version, 0)
+        # Only segments after the snapshot are kept
+        segments = [f for f in files if f.startswith("wal-")]
+        self.assertTrue(all(int(f[4:-4]) > store.snapshot_version for f in segments))
+
+    def test_torn_record_is_cut_off(self):
+        store = self.open()
+        store.create_many([("Ahmed Aly", "ahmed@gmail.com"), ("Sara Ali", "s@x.com")])
+        store.close()
+        segment = max(os.listdir(self.directory))
+        path = os.path.join(self.directory, segment)
+        intact = os.path.getsize(path)
+        with open(path, "ab") as f:
+            f.write(b"\x30\x00\x00\x00\x12\x34")
+
+        store = self.open()
+        self.assertEqual(store.count(), 2)
+        self.assertEqual(read_log(path)[1:], (intact, False))
+        self.assertEqual(store.create("New User", "new@gmail.com")["id"], "3")
+
+    def test_zeros_after_the_last_record_are_cut_off(self):
+        store = self.open()
+        store.create("Ahmed Aly", "ahmed@gmail.com")
+        store.close()
+        path = os.path.join(self.directory, max(os.listdir(self.directory)))
+        intact = os.path.getsize(path)
+        with open(path, "ab") as f:
+            f.write(bytes(100))
+        self.assertEqual(read_log(path)[1:], (intact, True))
+
+        store = self.open()
+        self.assertEqual(store.count(), 1)
+        self.assertEqual(os.path.getsize(path), intact)
+
+    def test_damaged_record_before_the_end_stops_recovery(self):
+        store = self.open()
+        for i in range(3):
+            store.create(f"User {i}", f"user{i}@example.com")
+        store.close()
+        path = os.path.join(self.directory, max(os.listdir(self.directory)))
+        with open(path, "r+b") as f:
+            f.seek(30)
+            byte = f.read(1)
+            f.seek(30)
+            f.write(bytes([byte[0] ^ 0xFF]))
+
+        with self.assertRaises(RecoveryError):
+            DurableUserStore(self.directory)
+
+    def test_failed_append_stops_writes(self):
+        store = self.open()
+        store.create("Ahmed Aly", "ahmed@gmail.com")
+        epoch = store.epoch
+        real_write = os.write
+
+        def write_part(fd, data):
+            real_write(fd, bytes(data[:10]))
+            raise OSError(errno.ENOSPC, "No space left on device")
+
+        with patch("persistence.os.write", write_part):
+            with self.assertRaises(LogWriteError):
+                store.create("Sara Ali", "sara@gmail.com")
+        # Nothing more is logged after the partial record
+        version = store.version
+        with self.assertRaises(LogWriteError):
+            store.create("Omar Said", "omar@gmail.com")
+        with self.assertRaises(LogWriteError):
+            store.delete("1")
+        self.assertEqual(store.version, version)
+
+        store = self.reopen(store)
+        self.assertEqual([u["name"] for u in self.users(store)], ["Ahmed Aly"])
+        # User 2 was seen before its change was lost, and is made again
+        self.assertNotEqual(store.epoch, epoch)
+        self.assertEqual(store.create("Omar Said", "omar@gmail.com")["id"], "2")
+
+    def test_failed_sync_is_not_retried(self):
+        store = self.open()
+        store.create("Ahmed Aly", "ahmed@gmail.com")
+        with patch("persistence.os.fsync", side_effect=OSError(errno.EIO, "I/O")):
+            with self.assertRaises(LogWriteError):
+                store.create("Sara Ali", "sara@gmail.com")
+        # A later sync can succeed without the pages the failed one lost
+        with self.assertRaises(LogWriteError):
+            store.update("1", {"name": "Ahmed"})
+        self.assertEqual(store.get("1")["name"], "Ahmed Aly")
+
+    def test_missing_changes_stop_recovery(self):
+        store = self.open()
+        store.create("Ahmed Aly", "ahmed@gmail.com")
+        store.snapshot()
+        store.create("Sara Ali", "sara@gmail.com")
+        store.close()
+        for name in os.listdir(self.directory):
+            if name.startswith("snapshot-"):
+                os.remove(os.path.join(self.directory, name))
+
+        with self.assertRaises(RecoveryError):
+            DurableUserStore(self.directory)
+
+    def test_group_commit(self):
+        store = self.open()
+        store.create_many([(f"User {i}", f"user{i}@example.com") for i in range(100)])
+        self.assertEqual(store.stats()["log_syncs"], 1)
+
+    def test_app_keeps_users_across_restarts(self):
+        client = create_app(self.open()).test_client()
+        response = client.post("/users", json={"name": "Ahmed", "email": "a@x.com"})
+        user_id = response.get_json()["id"]
+        self.assertEqual(client.get("/stats").get_json()["logged_changes"], 1)
+        etag = client.get(f"/users/{user_id}").headers["ETag"]
+
+        store = self.reopen(client.application.extensions["users"]["store"])
+        client = create_app(store).test_client()
+        self.assertEqual(client.get(f"/users/{user_id}").get_json()["name"], "Ahmed")
+        # The user did not change, so its ETag is still valid
+        response = client.get(f"/users/{user_id}", headers={"If-None-Match": etag})
+        self.assertEqual(response.status_code, 304)
+
+    def test_crash_loses_no_acknowledged_write(self):
+        writer = subprocess.Popen(
+            [sys.executable, "-c", CRASH_WRITER, self.directory],
+            cwd=HERE,
+            stdout=subprocess.PIPE,
+            text=True,
+        )
+        acknowledged = {}
+        for count, line in enumerate(writer.stdout):
+            op, user_id, doomed = line.split()
+            acknowledged[user_id] = (op, doomed == "1")
+            if count == 1000:
+                os.kill(writer.pid, signal.SIGKILL)
+        writer.wait()
+        writer.stdout.close()
+
+        # Each user holds its last acknowledged write, or one made after it
+        store = self.open()
+        for user_id, (op, doomed) in acknowledged.items():
+            user = store.get(user_id)
+            if op == "delete" or (user is None and doomed):
+                self.assertIsNone(user, user_id)
+            elif op == "update":
+                self.assertTrue(user["name"].startswith("Updated"), user_id)
+            else:
+                self.assertIsNotNone(user, user_id)
+        last = max(map(int, acknowledged))
+        self.assertGreater(int(store.create("New User", "new@gmail.com")["id"]), last)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,267 @@
+"""Tests for Service A storage backends."""
+
+import os
+import sqlite3
+import tempfile
+import threading
+import tracemalloc
+import unittest
+
+from storage import EmailTakenError, MemoryUserStore, SQLiteUserStore, create_store
+
+
+class UserStoreContract:
+    """Behaviour every storage backend must provide."""
+
+    def make_store(self):
+        raise NotImplementedError
+
+    def setUp(self):
+        self.store = self.make_store()
+
+    def tearDown(self):
+        self.store.close()
+
+    def test_create_and_get(self):
+        user = self.store.create("Mohamed Farag", "Mohamed@gmail.com")
+        self.assertEqual(self.store.get(user["id"]), user)
+        self.assertIsNone(self.store.get("999"))
+        self.assertIsNone(self.store.get("not-an-id"))
+
+    def test_ids_are_parsed_the_same_way(self):
+        user = self.store.create("Mohamed Farag", "Mohamed@gmail.com")
+        for user_id in (f" {user['id']}", f"0{user['id']}", f"+{user['id']}"):
+            self.assertIsNone(self.store.get(user_id), user_id)
+        for user_id in (str(2**63), "9" * 20, "1" * 5000):
+            self.assertIsNone(self.store.get(user_id), user_id)
+            self.assertIsNone(self.store.update(user_id, {"name": "Nobody"}))
+            self.assertFalse(self.store.delete(user_id))
+
+    def test_update(self):
+        user = self.store.create("Ahmed Aly", "ahmed@gmail.com")
+        updated = self.store.update(user["id"], {"email": "ahmed@example.com"})
+        self.assertEqual(updated["name"], "Ahmed Aly")
+        self.assertEqual(updated["email"], "ahmed@example.com")
+        self.assertEqual(self.store.get(user["id"]), updated)
+        self.assertIsNone(self.store.update("999", {"name": "Nobody"}))
+
+    def test_delete(self):
+        user = self.store.create("Ahmed Aly", "ahmed@gmail.com")
+        self.assertTrue(self.store.delete(user["id"]))
+        self.assertFalse(self.store.delete(user["id"]))
+        self.assertIsNone(self.store.get(user["id"]))
+        self.assertEqual(self.store.count(), 0)
+
+    def test_get_versioned_tracks_last_write(self):
+        user = self.store.create("Ahmed Aly", "ahmed@gmail.com")
+        _, created = self.store.get_versioned(user["id"])
+        self.assertEqual(created, self.store.version)
+        self.store.create("Mohamed Farag", "Mohamed@gmail.com")
+        self.assertEqual(self.store.get_versioned(user["id"])[1], created)
+
+        self.store.update(user["id"], {"name": "Ahmed"})
+        updated, version = self.store.get_versioned(user["id"])
+        self.assertEqual(updated["name"], "Ahmed")
+        self.assertGreater(version, created)
+
+        self.store.delete(user["id"])
+        self.assertIsNone(self.store.get_versioned(user["id"]))
+
+    def test_list_after_pages_in_id_order(self):
+        ids = [
+            self.store.create(f"User {i}", f"user{i}@example.com")["id"]
+            for i in range(5)
+        ]
+        self.store.delete(ids[1])
+
+        first = self.store.list_after(0, 2)
+        rest = self.store.list_after(int(first[-1]["id"]), 10)
+        self.assertEqual(
+            [u["id"] for u in first + rest], [ids[0], ids[2], ids[3], ids[4]]
+        )
+        self.assertEqual(self.store.count(), 4)
+
+    def test_find_by_email_follows_writes(self):
+        first = self.store.create("Ahmed Aly", "Ahmed@gmail.com")
+        second = self.store.create("Ahmed Aly", "ahmed@gmail.com")
+        self.assertEqual(self.store.find_by_email("AHMED@gmail.com"), [first, second])
+
+        updated = self.store.update(first["id"], {"email": "ahmed@example.com"})
+        self.assertEqual(self.store.find_by_email("ahmed@gmail.com"), [second])
+        self.assertEqual(self.store.find_by_email("ahmed@example.com"), [updated])
+
+        self.store.delete(second["id"])
+        self.assertEqual(self.store.find_by_email("ahmed@gmail.com"), [])
+
+    def test_email_case_folds_beyond_ascii(self):
+        user = self.store.create("Élise Amr", "ÉLISE@Example.com")
+        self.assertEqual(self.store.find_by_email("élise@example.com"), [user])
+        with self.assertRaises(EmailTakenError):
+            self.store.create("Élise Amr", "élise@example.com", unique_email=True)
+        self.assertEqual(self.store.count(), 1)
+
+        self.store.update(user["id"], {"email": "ÖZGE@example.com"})
+        self.assertEqual(self.store.find_by_email("élise@example.com"), [])
+        self.assertEqual(
+            self.store.find_by_email("özge@EXAMPLE.com")[0]["id"], user["id"]
+        )
+
+    def test_unique_email(self):
+        user = self.store.create("Ahmed Aly", "ahmed@gmail.com", unique_email=True)
+        with self.assertRaises(EmailTakenError) as ctx:
+            self.store.create("Someone Else", "AHMED@gmail.com", unique_email=True)
+        self.assertEqual(ctx.exception.owner_id, user["id"])
+        self.assertEqual(self.store.count(), 1)
+
+    def test_non_string_fields_change_nothing(self):
+        user = self.store.create("Ahmed Aly", "ahmed@gmail.com")
+        version = self.store.version
+        with self.assertRaises(TypeError):
+            self.store.create("Ahmed Aly", 5)
+        with self.assertRaises(TypeError):
+            self.store.create_many([("Sara Ali", "sara@gmail.com"), (None, "x@y.z")])
+        with self.assertRaises(TypeError):
+            self.store.update(user["id"], {"email": ["ahmed@gmail.com"]})
+        self.assertEqual(self.store.version, version)
+        self.assertEqual(self.store.list_after(0, 10), [user])
+        self.assertTrue(self.store.delete(user["id"]))
+
+    def test_deleted_ids_are_not_reused(self):
+        first = self.store.create("Ahmed Aly", "ahmed@gmail.com")
+        second = self.store.create("Mohamed Farag", "mohamed@gmail.com")
+        self.store.delete(first["id"])
+
+        third = self.store.create("Sara Ali", "sara@gmail.com")
+        self.assertNotIn(third["id"], (first["id"], second["id"]))
+        self.assertEqual(self.store.get(second["id"]), second)
+
+    def test_stats_count_users(self):
+        self.store.create_many([("Ahmed Aly", "ahmed@gmail.com")] * 3)
+        self.store.delete("2")
+        stats = self.store.stats()
+        self.assertEqual(stats["users"], 2)
+        self.assertGreater(stats["bytes"], 0)
+
+    def test_concurrent_creates_and_deletes_lose_nothing(self):
+        threads, per_thread = 8, 250
+        kept = [[] for _ in range(threads)]
+
+        def worker(n):
+            for i in range(per_thread):
+                user = self.store.create(f"User {n}-{i}", f"user{n}-{i}@example.com")
+                # Delete every other user straight away to interleave writes
+                if i % 2:
+                    self.assertTrue(self.store.delete(user["id"]))
+                else:
+                    kept[n].append(user)
+
+        workers = [threading.Thread(target=worker, args=(n,)) for n in range(threads)]
+        for thread in workers:
+            thread.start()
+        for thread in workers:
+            thread.join()
+
+        expected = [user for users in kept for user in users]
+        self.assertEqual(len({user["id"] for user in expected}), len(expected))
+        self.assertEqual(self.store.count(), len(expected))
+        for user in expected:
+            self.assertEqual(self.store.get(user["id"]), user)
+
+
+class TestMemoryUserStore(UserStoreContract, unittest.TestCase):
+    def make_store(self):
+        return MemoryUserStore()
+
+    def test_load_rebuilds_indexes(self):
+        self.store.load(
+            [
+                {"id": "7", "name": "Ahmed Aly", "email": "ahmed@gmail.com"},
+                {"id": "3", "name": "Sara Ali", "email": "sara@gmail.com"},
+            ]
+        )
+        self.assertEqual([u["id"] for u in self.store.list_after(0, 10)], ["3", "7"])
+        self.assertEqual(self.store.find_by_email("SARA@gmail.com")[0]["id"], "3")
+        self.assertEqual(self.store.create("New User", "new@gmail.com")["id"], "8")
+
+    def test_memory_usage_follows_writes(self):
+        empty = self.store.memory_usage()
+        users = self.store.create_many(
+            [(f"User {i}", f"User{i % 3}@Example.com") for i in range(30)]
+        )
+        self.store.update(users[0]["id"], {"name": "A much longer name than before"})
+        self.assertGreater(self.store.memory_usage(), empty)
+
+        # Only the emptied containers are left
+        self.store.delete_many([user["id"] for user in users])
+        self.assertEqual(self.store._data_bytes, 0)
+
+    def test_memory_usage_matches_allocations(self):
+        tracemalloc.start()
+        try:
+            before = tracemalloc.get_traced_memory()[0]
+            self.store.create_many(
+                [(f"User {i}", f"user{i}@example.com") for i in range(20000)]
+            )
+            allocated = tracemalloc.get_traced_memory()[0] - before
+        finally:
+            tracemalloc.stop()
+        self.assertAlmostEqual(self.store.memory_usage() / allocated, 1.0, delta=0.15)
+
+    def test_each_store_has_its_own_epoch(self):
+        self.assertNotEqual(MemoryUserStore().epoch, self.store.epoch)
+
+    def test_resumes_from_persisted_next_id(self):
+        store = MemoryUserStore(next_id=self.store.ids.next_id + 41)
+        self.assertEqual(store.create("Ahmed Aly", "ahmed@gmail.com")["id"], "42")
+
+
+class TestSQLiteUserStore(UserStoreContract, unittest.TestCase):
+    def make_store(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmpdir.cleanup)
+        return SQLiteUserStore(os.path.join(self.tmpdir.name, "users.db"))
+
+    def test_shared_between_store_instances(self):
+        other = SQLiteUserStore(self.store.path)
+        self.addCleanup(other.close)
+        user = self.store.create("Ahmed Aly", "ahmed@gmail.com")
+        self.assertEqual(other.get(user["id"]), user)
+        self.assertEqual(other.epoch, self.store.epoch)
+
+    def test_new_database_gets_a_new_epoch(self):
+        other = SQLiteUserStore(os.path.join(self.tmpdir.name, "other.db"))
+        self.addCleanup(other.close)
+        self.assertNotEqual(other.epoch, self.store.epoch)
+
+    def test_adds_missing_columns_to_old_databases(self):
+        self.store.close()
+        conn = sqlite3.connect(self.store.path)
+        conn.execute("DROP TABLE users")
+        conn.execute(
+            "CREATE TABLE users (id INTEGER PRIMARY KEY AUTOINCREMENT,"
+            " name TEXT NOT NULL, email TEXT NOT NULL)"
+        )
+        conn.execute("CREATE INDEX idx_users_email ON users (email COLLATE NOCASE)")
+        conn.execute("INSERT INTO users (name, email) VALUES ('Old', 'ÖLD@gmail.com')")
+        conn.commit()
+        conn.close()
+
+        store = SQLiteUserStore(self.store.path)
+        self.addCleanup(store.close)
+        self.assertEqual(store.get_versioned("1"), (store.get("1"), 0))
+        self.assertEqual(store.find_by_email("öld@GMAIL.com"), [store.get("1")])
+        # The case-insensitive index is replaced by the email_key one
+        indexes = {
+            row[1] for row in store._connection().execute("PRAGMA index_list(users)")
+        }
+        self.assertEqual(indexes, {"idx_users_email_key"})
+
+
+class TestCreateStore(unittest.TestCase):
+    def test_unknown_backend(self):
+        with self.assertRaises(ValueError):
+            create_store("redis")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,127 @@
+const PAGE_SIZE = 50;
+let nextCursor = null;
+
+// Function to append one page of users to the list
+async function loadUsers(cursor) {
+    try {
+        let url = `/users?limit=${PAGE_SIZE}`;
+        if (cursor) url += `&cursor=${encodeURIComponent(cursor)}`;
+        const response = await fetch(url);
+        const page = await response.json();
+        const userList = document.getElementById('userList');
+
+        page.users.forEach(user => {
+            const userDiv = document.createElement('div');
+            userDiv.className = 'user-item';
+            userDiv.innerHTML = `
+                <strong>ID:</strong> ${user.id}<br>
+                <strong>Name:</strong> ${user.name}<br>
+                <strong>Email:</strong> ${user.email}
+            `;
+            userList.appendChild(userDiv);
+        });
+
+        nextCursor = page.next_cursor;
+        document.getElementById('loadMore').style.display = nextCursor ? 'block' : 'none';
+    } catch (error) {
+        console.error('Error fetching users:', error);
+    }
+}
+
+// Function to refresh user list from the first page
+async function refreshUserList() {
+    document.getElementById('userList').innerHTML = '';
+    await loadUsers(null);
+}
+
+document.getElementById('loadMore').addEventListener('click', () => loadUsers(nextCursor));
+
+// Create user
+document.getElementById('createForm').addEventListener('submit', async (e) => {
+    e.preventDefault();
+    const formData = {
+        name: document.getElementById('name').value,
+        email: document.getElementById('email').value
+    };
+
+    try {
+        const response = await fetch('/users', {
+            method: 'POST',
+            headers: { 'Content-Type': 'application/json' },
+            body: JSON.stringify(formData)
+        });
+        const data = await response.json();
+        document.getElementById('createResult').innerHTML =
+            `<p class="success">User created successfully!</p>
+             <pre>${JSON.stringify(data, null, 2)}</pre>`;
+        document.getElementById('createForm').reset();
+        refreshUserList();
+    } catch (error) {
+        document.getElementById('createResult').innerHTML =
+            `<p class="error">Error: ${error.message}</p>`;
+    }
+});
+
+// Update user
+document.getElementById('updateForm').addEventListener('submit', async (e) => {
+    e.preventDefault();
+    const userId = document.getElementById('updateId').value;
+    const formData = {};
+
+    const name = document.getElementById('updateName').value;
+    const email = document.getElementById('updateEmail').value;
+
+    if (name) formData.name = name;
+    if (email) formData.email = email;
+
+    if (Object.keys(formData).length === 0) {
+        document.getElementById('updateResult').innerHTML =
+            `<p class="error">Please provide at least one field to update</p>`;
+        return;
+    }
+
+    try {
+        const response = await fetch(`/users/${userId}`, {
+            method: 'PUT',
+            headers: { 'Content-Type': 'application/json' },
+            body: JSON.stringify(formData)
+        });
+        const data = await response.json();
+        document.getElementById('updateResult').innerHTML =
+            `<p class="success">User updated successfully!</p>
+             <pre>${JSON.stringify(data, null, 2)}</pre>`;
+        document.getElementById('updateForm').reset();
+        refreshUserList();
+    } catch (error) {
+        document.getElementById('updateResult').innerHTML =
+            `<p class="error">Error: ${error.message}</p>`;
+    }
+});
+
+// Delete user
+document.getElementById('deleteForm').addEventListener('submit', async (e) => {
+    e.preventDefault();
+    const userId = document.getElementById('deleteId').value;
+
+    try {
+        const response = await fetch(`/users/${userId}`, {
+            method: 'DELETE'
+        });
+        if (response.ok) {
+            document.getElementById('deleteResult').innerHTML =
+                `<p class="success">User deleted successfully!</p>`;
+            document.getElementById('deleteForm').reset();
+            refreshUserList();
+        } else {
+            const data = await response.json();
+            document.getElementById('deleteResult').innerHTML =
+                `<p class="error">Error: ${data.error}</p>`;
+        }
+    } catch (error) {
+        document.getElementById('deleteResult').innerHTML =
+            `<p class="error">Error: ${error.message}</p>`;
+    }
+});
+
+// Initial load of user list
+refreshUserList();
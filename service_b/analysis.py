@@ -0,0 +1,154 @@
+"""Name and email analysis of Service A users."""
+
+import os
+from functools import lru_cache
+
+# Free-mail and disposable domains: one per line, "#" starts a comment
+FREE_MAIL_DOMAINS_FILE = os.getenv(
+    "FREE_MAIL_DOMAINS_FILE",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "free_mail_domains.txt"),
+)
+# Comma-separated domains added to the ones in the file
+FREE_MAIL_DOMAINS = os.getenv("FREE_MAIL_DOMAINS", "")
+# Distinct domains whose classification is remembered
+DOMAIN_CACHE_SIZE = int(os.getenv("DOMAIN_CACHE_SIZE", "65536"))
+
+# Labels that country domains are registered under, as in "co.uk" or "com.br"
+SECOND_LEVEL_LABELS = frozenset({"ac", "co", "com", "ne", "net", "or", "org"})
+
+
+def _is_public_suffix(labels):
+    """Whether ``labels`` look like a suffix such as ``com``, ``de`` or ``com.br``"""
+    if not 1 <= len(labels) <= 2:
+        return False
+    if len(labels) == 2 and labels[0] not in SECOND_LEVEL_LABELS:
+        return False
+    return labels[-1].isalpha() and 2 <= len(labels[-1]) <= 3
+
+
+def load_domains(path):
+    """Read a domain list file, skipping blank lines and comments"""
+    with open(path, encoding="utf-8") as f:
+        return [line.split("#", 1)[0].strip() for line in f]
+
+
+class DomainClassifier:
+    """Tells free-mail domains from corporate ones
+
+    A domain is free-mail if it, or any domain it is a subdomain of, is in
+    the list: ``mail.yahoo.co.uk`` matches ``yahoo.co.uk``, but
+    ``notgmail.co`` does not match ``gmail.com``. An entry ``<brand>.*``
+    matches the brand under any country or generic suffix, so ``hotmail.*``
+    covers ``hotmail.com.br`` and ``mail.hotmail.de`` but not
+    ``hotmail.acme.com``. Matching is case insensitive, and the last
+    ``cache_size`` distinct domains are memoized.
+    """
+
+    def __init__(self, domains, cache_size=DOMAIN_CACHE_SIZE):
+        domains = [self._normalize(domain) for domain in domains if domain.strip()]
+        self.domains = frozenset(d for d in domains if not d.endswith(".*"))
+        self.brands = frozenset(d[:-2] for d in domains if d.endswith(".*"))
+        self.is_free_mail = lru_cache(maxsize=cache_size)(self._is_free_mail)
+
+    @staticmethod
+    def _normalize(domain):
+        return domain.strip().rstrip(".").lower()
+
+    def _is_free_mail(self, domain):
+        domain = self._normalize(domain)
+        if domain in self.domains:
+            return True
+        labels = domain.split(".")
+        # A brand followed by a suffix, such as "yahoo" in "mail.yahoo.co.uk"
+        for index in range(max(0, len(labels) - 3), len(labels) - 1):
+            suffix = labels[index + 1 :]  # noqa: E203
+            if labels[index] in self.brands and _is_public_suffix(suffix):
+                return True
+        # Parent domains, dropping one label at a time
+        while "." in domain:
+            domain = domain.partition(".")[2]
+            if domain in self.domains:
+                return True
+        return False
+
+    def is_corporate(self, domain):
+        """Whether ``domain`` looks like a company's own mail domain"""
+        return bool(domain) and not self.is_free_mail(domain)
+
+    def cache_info(self):
+        return self.is_free_mail.cache_info()
+
+
+def load_classifier():
+    """Build the classifier from FREE_MAIL_DOMAINS_FILE and FREE_MAIL_DOMAINS"""
+    domains = load_domains(FREE_MAIL_DOMAINS_FILE) if FREE_MAIL_DOMAINS_FILE else []
+    return DomainClassifier(domains + FREE_MAIL_DOMAINS.split(","))
+
+
+classifier = load_classifier()
+
+
+def split_email(email):
+    """Split an email into username and domain at its last ``@``
+
+    An email without ``@`` is all username and has an empty domain.
+    """
+    username, at, domain = email.rpartition("@")
+    if not at:
+        return email, ""
+    return username, domain
+
+
+def split_name(name):
+    """Split name into parts"""
+    parts = name.split()
+    return {
+        "first_name": parts[0] if parts else "",
+        "middle_names": parts[1:-1] if len(parts) > 2 else [],
+        "last_name": parts[-1] if len(parts) > 1 else "",
+        "total_parts": len(parts),
+    }
+
+
+def analyze_email(email):
+    """Basic email analysis
+
+    Malformed emails are analyzed as far as possible; one without a domain
+    is never corporate.
+    """
+    username, domain = split_email(email)
+    return {
+        "username": username,
+        "domain": domain,
+        "is_corporate": classifier.is_corporate(domain),
+    }
+
+
+def check_user_record(user_data):
+    """Raise unless ``user_data`` is a user record that can be analyzed
+
+    KeyError is raised for a missing name or email and ValueError for a
+    record that is not a dict or whose name or email is not a string, so
+    callers can report either as invalid data from Service A.
+    """
+    if not isinstance(user_data, dict):
+        raise ValueError("User record is not an object")
+    for field in ("name", "email"):
+        if not isinstance(user_data[field], str):
+            raise ValueError(f"User {field} is not a string")
+
+
+def build_processed_data(user_data):
+    """Combine a Service A user record with its name and email analysis"""
+    check_user_record(user_data)
+    name_analysis = split_name(user_data["name"])
+    email_analysis = analyze_email(user_data["email"])
+
+    return {
+        "user_id": user_data["id"],
+        "name": user_data["name"],
+        "email": user_data["email"],
+        "email_domain": email_analysis["domain"],
+        "name_analysis": name_analysis,
+        "email_analysis": email_analysis,
+    }
@@ -2,190 +2,672 @@
 
 # service_b/app.py
 # Simple User Data Processing Service
+import math
 import os
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 import requests
-from flask import Flask, jsonify
+from flask import (
+    Blueprint,
+    Flask,
+    Response,
+    current_app,
+    jsonify,
+    request,
+    stream_with_context,
+)
+from service_common.assets import init_compression, init_ui
+from service_common.json_provider import OrjsonProvider, dumps
+from service_common.metrics import init_metrics
+from werkzeug.local import LocalProxy
 
-app = Flask(__name__)
+from analysis import build_processed_data
+from breaker import (
+    CLOSED,
+    HALF_OPEN,
+    OPEN,
+    CircuitBreaker,
+    InFlightLimit,
+    UpstreamGuard,
+    UpstreamRejected,
+)
+from cache import COUNTERS, LRUCache
+from changefeed import ChangeFeedFollower
+from client import ServiceAClient, user_path
+from jobs import FAILED, JobManager
+
+bp = Blueprint("processing", __name__)
 
 # Configuration
 SERVICE_A_URL = os.getenv("SERVICE_A_URL", "http://service_a:5000")
+# Keep-alive pool and timeouts for Service A requests
+SERVICE_A_POOL_SIZE = int(os.getenv("SERVICE_A_POOL_SIZE", "20"))
+SERVICE_A_POOL_BLOCK = os.getenv("SERVICE_A_POOL_BLOCK", "0") == "1"
+SERVICE_A_CONNECT_TIMEOUT = float(os.getenv("SERVICE_A_CONNECT_TIMEOUT", "2"))
+SERVICE_A_READ_TIMEOUT = float(os.getenv("SERVICE_A_READ_TIMEOUT", "5"))
+# Retries with exponential backoff, applied to idempotent GETs only
+SERVICE_A_RETRIES = int(os.getenv("SERVICE_A_RETRIES", "2"))
+SERVICE_A_RETRY_BACKOFF = float(os.getenv("SERVICE_A_RETRY_BACKOFF", "0.1"))
+# Circuit breaker around Service A requests. Once BREAKER_MIN_CALLS of the
+# last BREAKER_WINDOW are known, it opens if the share that failed reaches
+# BREAKER_FAILURE_RATE or the share slower than BREAKER_SLOW_CALL_SECONDS
+# reaches BREAKER_SLOW_CALL_RATE. Requests are then refused for
+# BREAKER_OPEN_SECONDS, after which BREAKER_HALF_OPEN_CALLS probes decide.
+BREAKER_WINDOW = int(os.getenv("BREAKER_WINDOW", "20"))
+BREAKER_MIN_CALLS = int(os.getenv("BREAKER_MIN_CALLS", "10"))
+BREAKER_FAILURE_RATE = float(os.getenv("BREAKER_FAILURE_RATE", "0.5"))
+BREAKER_SLOW_CALL_SECONDS = float(os.getenv("BREAKER_SLOW_CALL_SECONDS", "2"))
+BREAKER_SLOW_CALL_RATE = float(os.getenv("BREAKER_SLOW_CALL_RATE", "0.8"))
+BREAKER_OPEN_SECONDS = float(os.getenv("BREAKER_OPEN_SECONDS", "10"))
+BREAKER_HALF_OPEN_CALLS = int(os.getenv("BREAKER_HALF_OPEN_CALLS", "3"))
+# Service A requests in flight at once before more are refused; 0 is no limit
+SERVICE_A_MAX_IN_FLIGHT = int(os.getenv("SERVICE_A_MAX_IN_FLIGHT", "64"))
+# Concurrent Service A requests per batch and the largest accepted ID list
+BATCH_CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", "8"))
+MAX_BATCH_SIZE = int(os.getenv("MAX_BATCH_SIZE", "10000"))
+# Page size used when walking all users in Service A
+SERVICE_A_PAGE_SIZE = 1000
+# Read-through cache of Service A users; 404s are cached for the negative TTL
+USER_CACHE_MAX_ENTRIES = int(os.getenv("USER_CACHE_MAX_ENTRIES", "10000"))
+USER_CACHE_MAX_BYTES = int(os.getenv("USER_CACHE_MAX_BYTES", str(16 * 1024 * 1024)))
+USER_CACHE_TTL = float(os.getenv("USER_CACHE_TTL", "30"))
+USER_CACHE_NEGATIVE_TTL = float(os.getenv("USER_CACHE_NEGATIVE_TTL", "5"))
+# Encoded /process/user responses, reused while a user's name and email are unchanged
+OUTPUT_CACHE_MAX_ENTRIES = int(os.getenv("OUTPUT_CACHE_MAX_ENTRIES", "100000"))
+OUTPUT_CACHE_MAX_BYTES = int(os.getenv("OUTPUT_CACHE_MAX_BYTES", str(32 * 1024 * 1024)))
+# Background jobs keep their results and checkpoints in JOBS_DIR. Each job
+# writes a checkpoint every JOB_CHUNK_SIZE users; JOB_WORKERS run at once.
+JOBS_DIR = os.getenv("JOBS_DIR", "jobs")
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "2"))
+JOB_CHUNK_SIZE = int(os.getenv("JOB_CHUNK_SIZE", "100"))
+MAX_JOB_SIZE = int(os.getenv("MAX_JOB_SIZE", "1000000"))
+# Follow Service A's change feed to invalidate cached users as they change
+CHANGE_FEED_ENABLED = os.getenv("CHANGE_FEED_ENABLED", "0") == "1"
+CHANGE_FEED_POLL_TIMEOUT = float(os.getenv("CHANGE_FEED_POLL_TIMEOUT", "25"))
+# The development server's debugger and reloader are off unless asked for
+DEBUG = os.getenv("FLASK_DEBUG", "0") == "1"
+# Gzip JSON responses of at least this many bytes for clients that accept
+# it; streamed ones are always compressed. -1 turns compression off.
+COMPRESS_MIN_SIZE = int(os.getenv("COMPRESS_MIN_SIZE", "1024"))
+COMPRESS_LEVEL = int(os.getenv("COMPRESS_LEVEL", "6"))
+# Serve request, upstream, cache and pool metrics at /metrics
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "1") == "1"
 
+# Home page files, compressed once when the app is created
+UI_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "ui")
 
-def split_name(name):
-    """Split name into parts"""
-    parts = name.split()
-    return {
-        "first_name": parts[0] if parts else "",
-        "middle_names": parts[1:-1] if len(parts) > 2 else [],
-        "last_name": parts[-1] if len(parts) > 1 else "",
-        "total_parts": len(parts),
-    }
 
+def make_upstream_guard():
+    breaker = CircuitBreaker(
+        window=BREAKER_WINDOW,
+        min_calls=BREAKER_MIN_CALLS,
+        failure_rate=BREAKER_FAILURE_RATE,
+        slow_call_seconds=BREAKER_SLOW_CALL_SECONDS,
+        slow_call_rate=BREAKER_SLOW_CALL_RATE,
+        open_seconds=BREAKER_OPEN_SECONDS,
+        half_open_calls=BREAKER_HALF_OPEN_CALLS,
+    )
+    return UpstreamGuard(breaker, InFlightLimit(SERVICE_A_MAX_IN_FLIGHT))
+
+
+def make_service_a_client():
+    return ServiceAClient(
+        SERVICE_A_URL,
+        pool_size=SERVICE_A_POOL_SIZE,
+        pool_block=SERVICE_A_POOL_BLOCK,
+        connect_timeout=SERVICE_A_CONNECT_TIMEOUT,
+        read_timeout=SERVICE_A_READ_TIMEOUT,
+        retries=SERVICE_A_RETRIES,
+        retry_backoff=SERVICE_A_RETRY_BACKOFF,
+        guard=make_upstream_guard(),
+    )
+
+
+def make_user_cache():
+    return LRUCache(
+        max_entries=USER_CACHE_MAX_ENTRIES,
+        max_bytes=USER_CACHE_MAX_BYTES,
+        ttl=USER_CACHE_TTL,
+        negative_ttl=USER_CACHE_NEGATIVE_TTL,
+    )
 
-def analyze_email(email):
-    """Basic email analysis"""
-    username, domain = email.split("@")
-    return {
-        "username": username,
-        "domain": domain,
-        "is_corporate": not any(
-            x in domain for x in ["gmail", "yahoo", "hotmail", "outlook"]
-        ),
-    }
 
+def make_output_cache():
+    # Entries are keyed by the content they were built from, so never stale
+    return LRUCache(
+        max_entries=OUTPUT_CACHE_MAX_ENTRIES,
+        max_bytes=OUTPUT_CACHE_MAX_BYTES,
+        ttl=math.inf,
+        negative_ttl=0,
+    )
 
-@app.route("/")
-def home():
-    """Simple home page with UI"""
-    return """
-    <html>
-    <head>
-        <title>Data Processing Service</title>
-        <style>
-            body { font-family: Arial, sans-serif; max-width: 800px; margin: 0 auto; padding: 20px; }
-            .form-section { padding: 20px; border: 1px solid #ccc; border-radius: 5px; margin-bottom: 20px; }
-            .form-group { margin-bottom: 15px; }
-            label { display: block; margin-bottom: 5px; }
-            input { width: 100%; padding: 8px; margin-bottom: 10px; }
-            button {
-                background-color: #4CAF50;
-                color: white;
-                padding: 10px 15px;
-                border: none;
-                border-radius: 4px;
-                cursor: pointer;
-            }
-            button:hover { background-color: #45a049; }
-            #result { margin-top: 20px; padding: 10px; border: 1px solid #ddd; border-radius: 4px; }
-            .name-part { color: #2196F3; }
-            .email-part { color: #4CAF50; }
-        </style>
-    </head>
-    <body>
-        <h1>Data Processing Service</h1>
-        <div class="form-section">
-            <h2>Process User Data</h2>
-            <form id="processForm">
-                <div class="form-group">
-                    <label for="userId">User ID:</label>
-                    <input type="text" id="userId" name="userId" required>
-                </div>
-                <button type="submit">Process User Data</button>
-            </form>
-            <div id="result"></div>
-        </div>
-
-        <script>
-            document.getElementById('processForm').addEventListener('submit', async (e) => {
-                e.preventDefault();
-                const userId = document.getElementById('userId').value;
-
-                try {
-                    const response = await fetch(`/process/user/${userId}`, {
-                        method: 'POST'
-                    });
-                    const data = await response.json();
-
-                    if (data.error) {
-                        document.getElementById('result').innerHTML =
-                            `<pre class="error">Error: ${data.error}</pre>`;
-                        return;
-                    }
-
-                    let resultHtml = '<div class="analysis-result">';
-
-                    // Basic Info
-                    resultHtml += '<h3>Basic Information</h3>';
-                    resultHtml += `<p><strong>User ID:</strong> ${data.user_id}</p>`;
-                    resultHtml += `<p><strong>Full Name:</strong> ${data.name}</p>`;
-                    resultHtml += `<p><strong>Email:</strong> ${data.email}</p>`;
-
-                    // Name Analysis
-                    resultHtml += '<h3>Name Analysis</h3>';
-                    resultHtml += `
-                        <p><strong>First Name:</strong>
-                            <span class="name-part">${data.name_analysis.first_name}</span>
-                        </p>
-                    `;
-                    if (data.name_analysis.middle_names.length > 0) {
-                        resultHtml += `
-                            <p><strong>Middle Names:</strong>
-                                <span class="name-part">${data.name_analysis.middle_names.join(' ')}</span>
-                            </p>
-                        `;
-                    }
-                    resultHtml += `
-                        <p><strong>Last Name:</strong>
-                            <span class="name-part">${data.name_analysis.last_name}</span>
-                        </p>
-                    `;
-                    resultHtml += `<p><strong>Total Name Parts:</strong> ${data.name_analysis.total_parts}</p>`;
-
-                    // Email Analysis
-                    resultHtml += '<h3>Email Analysis</h3>';
-                    resultHtml += `
-                        <p><strong>Username:</strong>
-                            <span class="email-part">${data.email_analysis.username}</span>
-                        </p>
-                    `;
-                    resultHtml += `
-                        <p><strong>Domain:</strong>
-                            <span class="email-part">${data.email_analysis.domain}</span>
-                        </p>
-                    `;
-                    resultHtml += `
-                        <p><strong>Corporate Email:</strong>
-                            ${data.email_analysis.is_corporate ? 'Yes' : 'No'}
-                        </p>
-                    `;
-
-                    resultHtml += '</div>';
-                    document.getElementById('result').innerHTML = resultHtml;
-                } catch (error) {
-                    document.getElementById('result').innerHTML =
-                        `<pre class="error">Error: ${error.message}</pre>`;
-                }
-            });
-        </script>
-    </body>
-    </html>
+
+def output_key(user_data):
+    """Output cache key for a user: everything its processed data is built from
+
+    None if the record is not one whose processing can be cached.
     """
+    if not isinstance(user_data, dict):
+        return None
+    key = (user_data.get("id"), user_data.get("name"), user_data.get("email"))
+    if not isinstance(key[0], (str, int)) or not all(
+        isinstance(field, str) for field in key[1:]
+    ):
+        return None
+    return key
 
 
-@app.route("/process/user/<user_id>", methods=["POST"])
-def process_user_data(user_id):
-    """Process data for a specific user"""
-    try:
-        # Fetch user data from Service A (add timeout to avoid hangs)
-        response = requests.get(f"{SERVICE_A_URL}/users/{user_id}", timeout=5)
+def init_service_metrics(registry, client, caches):
+    """Report Service A requests and the ``caches`` by name on ``registry``
+
+    Request latency and outcomes are recorded as they happen; the breaker,
+    pool and cache figures are read at every scrape.
+    """
+    duration = registry.histogram(
+        "service_b_upstream_request_duration_seconds",
+        "Time taken by Service A requests, including retries",
+    )
+    outcomes = registry.counter(
+        "service_b_upstream_requests_total",
+        "Service A requests made, by outcome",
+        ("outcome",),
+    )
+    succeeded, failed = outcomes.labels("success"), outcomes.labels("error")
+
+    def on_call(seconds, error):
+        duration.observe(seconds)
+        (failed if error else succeeded).inc()
 
+    guard = client.guard
+    guard.on_call = on_call
+    registry.callback(
+        "service_b_upstream_in_flight",
+        "gauge",
+        "Service A requests in flight",
+        lambda: guard.limit.stats()["in_flight"],
+    )
+    registry.callback(
+        "service_b_upstream_shed_total",
+        "counter",
+        "Service A requests refused for too many in flight",
+        lambda: guard.limit.stats()["shed"],
+    )
+    registry.callback(
+        "service_b_breaker_state",
+        "gauge",
+        "1 for the current state of the Service A circuit breaker",
+        lambda: {
+            (state,): int(guard.breaker.stats()["state"] == state)
+            for state in (CLOSED, OPEN, HALF_OPEN)
+        },
+        ("state",),
+    )
+    for field, help in (
+        ("opened", "Times the Service A circuit breaker opened"),
+        ("rejected", "Service A requests refused by the open circuit breaker"),
+    ):
+        registry.callback(
+            f"service_b_breaker_{field}_total",
+            "counter",
+            help,
+            lambda field=field: guard.breaker.stats()[field],
+        )
+    registry.callback(
+        "service_b_pool_events_total",
+        "counter",
+        "Service A connection pool checkouts, reuses, new connections and waits",
+        lambda: {(event,): count for event, count in client.pool_stats().items()},
+        ("event",),
+    )
+
+    def cache_events():
+        events = {}
+        for name, cache in caches.items():
+            stats = cache.stats()
+            events.update(((name, event), stats[event]) for event in COUNTERS)
+        return events
+
+    registry.callback(
+        "service_b_cache_events_total",
+        "counter",
+        "Cache lookups and removals, by cache and event",
+        cache_events,
+        ("cache", "event"),
+    )
+    for field, help in (
+        ("entries", "Entries in the cache"),
+        ("bytes", "Size of the cached values"),
+    ):
+        registry.callback(
+            f"service_b_cache_{field}",
+            "gauge",
+            help,
+            lambda field=field: {
+                (name,): cache.stats()[field] for name, cache in caches.items()
+            },
+            ("cache",),
+        )
+
+
+# Service A client and caches of the app handling the request, see create_app
+service_a = LocalProxy(lambda: current_app.extensions["processing"]["service_a"])
+user_cache = LocalProxy(lambda: current_app.extensions["processing"]["user_cache"])
+output_cache = LocalProxy(lambda: current_app.extensions["processing"]["output_cache"])
+jobs = LocalProxy(lambda: current_app.extensions["processing"]["jobs"])
+
+
+class UpstreamError(Exception):
+    """Service A answered with an unexpected status code"""
+
+
+def fetch_user(user_id):
+    """Fetch a user from Service A, or None if it does not exist
+
+    Lookups go through the user cache, so repeated and concurrent requests
+    for the same ID share one upstream call. Cached users are kept with
+    their ETag, and once expired are revalidated with If-None-Match so an
+    unchanged user costs Service A a bodyless 304.
+    """
+    path = user_path(user_id)
+    if path is None:
+        return None
+
+    def load(stale):
+        headers = {}
+        if stale is not None and stale[1]:
+            headers["If-None-Match"] = stale[1]
+        # Fetch user data from Service A over the shared keep-alive pool
+        response = service_a.get(path, headers=headers)
+        if response.status_code == 304 and stale is not None:
+            return stale, 0
         if response.status_code == 404:
-            return jsonify({"error": "User not found"}), 404
+            return None, 0
+        if response.status_code != 200:
+            raise UpstreamError(f"Service A returned {response.status_code}")
+        return (response.json(), response.headers.get("ETag")), len(response.content)
+
+    cached = user_cache.get_or_load(user_id, load)
+    return cached[0] if cached is not None else None
+
+
+def process_user(user_id, build=build_processed_data):
+    """Fetch and process one user, returning the response body and status code
+
+    The body of a processed user is ``build(user_data)``; error bodies are
+    always dicts. UpstreamRejected is raised if the user has to be fetched
+    but Service A is not being called, so callers can answer fast.
+    """
+    try:
+        user_data = fetch_user(user_id)
+
+        if user_data is None:
+            return {"error": "User not found"}, 404
+
+        return build(user_data), 200
+
+    except requests.RequestException as e:
+        return {"error": f"Service A connection error: {str(e)}"}, 503
+    except UpstreamError as e:
+        return {"error": str(e)}, 502
+    except (KeyError, ValueError) as e:
+        return {"error": f"Invalid user data from Service A: {str(e)}"}, 502
+
+
+def render_processed_data(user_data):
+    """The encoded JSON response body for a processed user
+
+    Bodies are kept in the output cache, so a user whose name and email are
+    unchanged is neither analyzed nor encoded again.
+    """
+
+    def load(stale):
+        data = current_app.json.response(build_processed_data(user_data)).get_data()
+        return data, len(data)
+
+    key = output_key(user_data)
+    if key is None:
+        return load(None)[0]
+    return output_cache.get_or_load(key, load)
+
+
+def process_batch_user(user_id):
+    """``process_user`` for a batch, where a refused fetch only fails that user"""
+    try:
+        return process_user(user_id)
+    except UpstreamRejected as e:
+        return {"error": str(e)}, e.status
+
+
+def record_id(user_data):
+    """The ID a user record from Service A reports, or None if it is not a record"""
+    return user_data.get("id") if isinstance(user_data, dict) else None
+
+
+def process_user_record(user_data):
+    """Process a user record already fetched from Service A"""
+    try:
+        return build_processed_data(user_data), 200
+    except (KeyError, ValueError) as e:
+        return {"error": f"Invalid user data from Service A: {str(e)}"}, 502
+
+
+def process_user_records(users):
+    """``process_user_record`` for each record of a page"""
+    return [process_user_record(user_data) for user_data in users]
+
+
+def iter_user_pages(cursor=None):
+    """Yield every page of users in Service A after ``cursor``, one request at a time"""
+    while True:
+        params = {"limit": SERVICE_A_PAGE_SIZE}
+        if cursor:
+            params["cursor"] = cursor
+        response = service_a.get("/users", params=params)
+        response.raise_for_status()
+        page = response.json()
+        if page["users"]:
+            yield page["users"]
+        cursor = page["next_cursor"]
+        if not cursor:
+            return
+
+
+def bounded_map(func, items, concurrency):
+    """Yield ``func(item)`` for each item in order, running up to ``concurrency`` calls at once"""
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        pending = deque()
+        for item in items:
+            pending.append(pool.submit(func, item))
+            # Keep a second round queued so workers never wait on the consumer
+            if len(pending) >= 2 * concurrency:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+
+def batch_line(user_id, body, status):
+    """Format one batch result as an NDJSON line"""
+    line = {"user_id": user_id, "status": status}
+    if status == 200:
+        line["result"] = body
+    else:
+        line["error"] = body["error"]
+    return dumps(line).decode("utf-8") + "\n"
 
-        user_data = response.json()
 
-        # Process the data
-        name_analysis = split_name(user_data["name"])
-        email_analysis = analyze_email(user_data["email"])
+def in_app_context(func):
+    """Wrap ``func`` to run in the current app's context from another thread"""
+    app = current_app._get_current_object()
 
-        # Prepare final response
-        processed_data = {
-            "user_id": user_data["id"],
-            "name": user_data["name"],
-            "email": user_data["email"],
-            "email_domain": email_analysis["domain"],
-            "name_analysis": name_analysis,
-            "email_analysis": email_analysis,
-        }
+    def run(*args):
+        with app.app_context():
+            return func(*args)
 
-        return jsonify(processed_data), 200
+    return run
 
+
+def count_results(results):
+    """Count the ``(succeeded, failed)`` results of ``(body, status)`` pairs"""
+    succeeded = sum(1 for _, status in results if status == 200)
+    return succeeded, len(results) - succeeded
+
+
+def run_job(user_ids, position):
+    """Process a job's users from ``position`` on, for JobManager
+
+    ``user_ids`` is a list of IDs, where ``position`` is the number already
+    processed, or "all", where it is the ID of the last processed user.
+    Unlike a batch request, a Service A failure while listing users, or a
+    refused Service A request, fails the job, which can then be resumed.
+    """
+    if user_ids == "all":
+        for users in iter_user_pages(position):
+            results = process_user_records(users)
+            lines = [
+                batch_line(record_id(user_data), body, status)
+                for user_data, (body, status) in zip(users, results)
+            ]
+            yield (lines, *count_results(results), users[-1]["id"])
+        return
+
+    process = in_app_context(process_user)
+    start = position or 0
+    while start < len(user_ids):
+        ids = user_ids[start : start + JOB_CHUNK_SIZE]  # noqa: E203
+        results = list(bounded_map(process, ids, BATCH_CONCURRENCY))
+        lines = [batch_line(user_id, *result) for user_id, result in zip(ids, results)]
+        start += len(ids)
+        yield (lines, *count_results(results), start)
+
+
+def make_job_manager(app):
+    def handler(spec, position):
+        with app.app_context():
+            yield from run_job(spec, position)
+
+    return JobManager(JOBS_DIR, handler, workers=JOB_WORKERS)
+
+
+def process_all_users():
+    """Yield NDJSON lines for every user in Service A"""
+    try:
+        for users in iter_user_pages():
+            for user_data, (body, status) in zip(users, process_user_records(users)):
+                yield batch_line(record_id(user_data), body, status)
     except requests.RequestException as e:
-        return jsonify({"error": f"Service A connection error: {str(e)}"}), 503
+        # One line without a user ID reports that the listing was cut short
+        yield batch_line(None, {"error": f"Service A connection error: {str(e)}"}, 503)
+    except UpstreamRejected as e:
+        yield batch_line(None, {"error": str(e)}, e.status)
     except (KeyError, ValueError) as e:
-        return jsonify({"error": f"Invalid user data from Service A: {str(e)}"}), 502
+        yield batch_line(
+            None, {"error": f"Invalid user list from Service A: {str(e)}"}, 502
+        )
+
+
+@bp.route("/process/user/<user_id>", methods=["POST"])
+def process_user_data(user_id):
+    """Process data for a specific user"""
+    body, status = process_user(user_id, build=render_processed_data)
+    if status != 200:
+        return jsonify(body), status
+    return Response(body, mimetype="application/json")
+
+
+@bp.route("/process/users", methods=["POST"])
+def process_users_batch():
+    """Process a batch of users and stream one NDJSON result line per user
+
+    The body is ``{"user_ids": [...]}`` or ``{"user_ids": "all"}``. Users are
+    fetched with at most BATCH_CONCURRENCY requests in flight, and a failure
+    only affects the line of the user it belongs to.
+    """
+    data = request.get_json(silent=True) or {}
+    user_ids = data.get("user_ids")
+
+    if user_ids == "all":
+        lines = process_all_users()
+    elif isinstance(user_ids, list) and user_ids:
+        if len(user_ids) > MAX_BATCH_SIZE:
+            return (
+                jsonify({"error": f"At most {MAX_BATCH_SIZE} user IDs per batch"}),
+                400,
+            )
+        ids = [str(user_id) for user_id in user_ids]
+        # Pool threads have no app context of their own
+        results = bounded_map(
+            in_app_context(process_batch_user), ids, BATCH_CONCURRENCY
+        )
+        lines = (batch_line(user_id, *result) for user_id, result in zip(ids, results))
+    else:
+        return jsonify({"error": 'user_ids must be a list of IDs or "all"'}), 400
+
+    return Response(stream_with_context(lines), mimetype="application/x-ndjson")
+
+
+@bp.route("/jobs", methods=["POST"])
+def submit_job():
+    """Start processing users in the background
+
+    Takes the same body as POST /process/users, with up to MAX_JOB_SIZE
+    IDs, and answers 202 with the job. Poll GET /jobs/<job_id> for progress.
+    """
+    data = request.get_json(silent=True) or {}
+    user_ids = data.get("user_ids")
+
+    if user_ids == "all":
+        job = jobs.submit("all")
+    elif isinstance(user_ids, list) and user_ids:
+        if len(user_ids) > MAX_JOB_SIZE:
+            return jsonify({"error": f"At most {MAX_JOB_SIZE} user IDs per job"}), 400
+        job = jobs.submit([str(user_id) for user_id in user_ids], len(user_ids))
+    else:
+        return jsonify({"error": 'user_ids must be a list of IDs or "all"'}), 400
+
+    return jsonify(job_summary(job)), 202, {"Location": f"/jobs/{job['id']}"}
+
+
+def job_summary(job):
+    """The public fields of a job's state"""
+    summary = {
+        key: job[key]
+        for key in (
+            "id",
+            "status",
+            "total",
+            "processed",
+            "succeeded",
+            "failed",
+            "error",
+            "created_at",
+            "updated_at",
+        )
+    }
+    summary["results_url"] = f"/jobs/{job['id']}/results"
+    return summary
+
+
+@bp.route("/jobs", methods=["GET"])
+def list_jobs():
+    """Every job, oldest first"""
+    return jsonify({"jobs": [job_summary(job) for job in jobs.list()]})
+
+
+@bp.route("/jobs/<job_id>", methods=["GET"])
+def get_job(job_id):
+    """Progress of a job"""
+    job = jobs.get(job_id)
+    if job is None:
+        return jsonify({"error": "Job not found"}), 404
+    return jsonify(job_summary(job))
+
+
+@bp.route("/jobs/<job_id>/results", methods=["GET"])
+def get_job_results(job_id):
+    """Stream the NDJSON result lines a job has written so far"""
+    if jobs.get(job_id) is None:
+        return jsonify({"error": "Job not found"}), 404
+    return Response(jobs.iter_results(job_id), mimetype="application/x-ndjson")
+
+
+@bp.route("/jobs/<job_id>/resume", methods=["POST"])
+def resume_job(job_id):
+    """Run a failed job again from its last checkpoint"""
+    job = jobs.get(job_id)
+    if job is None:
+        return jsonify({"error": "Job not found"}), 404
+    if job["status"] != FAILED:
+        return jsonify({"error": f"Job is {job['status']}"}), 409
+    return jsonify(job_summary(jobs.resume(job_id))), 202
+
+
+@bp.route("/admin/pool", methods=["GET"])
+def pool_stats():
+    """Connection pool statistics for Service A requests"""
+    return jsonify(service_a.pool_stats())
+
+
+@bp.route("/admin/upstream", methods=["GET"])
+def upstream_stats():
+    """Circuit breaker state and refused request counts for Service A"""
+    return jsonify(service_a.guard.stats())
+
+
+@bp.errorhandler(UpstreamRejected)
+def upstream_rejected(e):
+    """Answer at once when Service A is not being called"""
+    response = jsonify({"error": str(e)})
+    response.headers["Retry-After"] = str(e.retry_after)
+    return response, e.status
+
+
+@bp.route("/admin/cache", methods=["GET"])
+def cache_stats():
+    """User cache hit, miss and eviction counters"""
+    return jsonify(user_cache.stats())
+
+
+@bp.route("/admin/output-cache", methods=["GET"])
+def output_cache_stats():
+    """Hit rate and size of the processed response cache"""
+    return jsonify(output_cache.stats())
+
+
+@bp.route("/admin/cache", methods=["DELETE"])
+def flush_cache():
+    """Drop every cached user"""
+    user_cache.clear()
+    return "", 204
+
+
+@bp.route("/admin/cache/<user_id>", methods=["DELETE"])
+def invalidate_cached_user(user_id):
+    """Drop one cached user so the next request fetches it again"""
+    if not user_cache.invalidate(user_id):
+        return jsonify({"error": "User not cached"}), 404
+    return "", 204
+
+
+def create_app():
+    """Create the Service B app with its own Service A client and caches
+
+    Nothing here opens connections or starts threads, so a server can
+    create the app once and fork workers from it. Each process then calls
+    ``start_background_tasks``.
+    """
+    app = Flask(__name__)
+    app.json = OrjsonProvider(app)
+    client = make_service_a_client()
+    cache = make_user_cache()
+    outputs = make_output_cache()
+    app.extensions["processing"] = {
+        "service_a": client,
+        "user_cache": cache,
+        "output_cache": outputs,
+        "jobs": make_job_manager(app),
+        "change_feed": ChangeFeedFollower(
+            client, cache, poll_timeout=CHANGE_FEED_POLL_TIMEOUT
+        ),
+    }
+    app.register_blueprint(bp)
+    if METRICS_ENABLED:
+        init_service_metrics(
+            init_metrics(app), client, {"user": cache, "output": outputs}
+        )
+    init_ui(app, UI_DIR)
+    init_compression(app, COMPRESS_MIN_SIZE, COMPRESS_LEVEL)
+    return app
+
+
+def start_background_tasks(app):
+    """Start the threads ``app`` runs in this process"""
+    if CHANGE_FEED_ENABLED:
+        app.extensions["processing"]["change_feed"].start()
+    # Pick up jobs a previous process left unfinished
+    app.extensions["processing"]["jobs"].resume_pending()
 
 
 if __name__ == "__main__":
-    app.run(host="0.0.0.0", port=5001, debug=True)
+    app = create_app()
+    start_background_tasks(app)
+    app.run(host="0.0.0.0", port=5001, debug=DEBUG)
@@ -0,0 +1,465 @@
+"""Service B served with asyncio (ASGI), for upstream-bound fan-out workloads.
+
+It serves the same endpoints and JSON bodies as app.py, except for the
+background ``/jobs`` routes, but a request waiting on Service A only parks
+a coroutine instead of holding a worker thread. Run it with ``python async_app.py`` or ``uvicorn async_app:app``.
+
+As in app.py, each app built by ``create_app`` has its own Service A
+client and caches, kept in ``app.state`` and passed to the helpers below
+as ``state``.
+"""
+
+import asyncio
+import contextlib
+import functools
+import os
+import re
+from collections import deque
+
+import uvicorn
+from service_common.assets import ASSET_PREFIX, AssetBundle
+from service_common.json_provider import dumps, loads
+from service_common.metrics import CONTENT_TYPE, UNMATCHED, HttpMetrics, Registry
+from starlette.applications import Starlette
+from starlette.middleware import Middleware
+from starlette.middleware.gzip import GZipMiddleware
+from starlette.responses import JSONResponse as StarletteJSONResponse
+from starlette.responses import Response, StreamingResponse
+from starlette.routing import Route
+
+from app import (
+    BATCH_CONCURRENCY,
+    CHANGE_FEED_ENABLED,
+    CHANGE_FEED_POLL_TIMEOUT,
+    COMPRESS_LEVEL,
+    COMPRESS_MIN_SIZE,
+    MAX_BATCH_SIZE,
+    METRICS_ENABLED,
+    SERVICE_A_CONNECT_TIMEOUT,
+    SERVICE_A_PAGE_SIZE,
+    SERVICE_A_POOL_SIZE,
+    SERVICE_A_READ_TIMEOUT,
+    SERVICE_A_RETRIES,
+    SERVICE_A_RETRY_BACKOFF,
+    SERVICE_A_URL,
+    UI_DIR,
+    UpstreamError,
+    batch_line,
+    build_processed_data,
+    init_service_metrics,
+    make_output_cache,
+    make_service_a_client,
+    make_upstream_guard,
+    make_user_cache,
+    output_key,
+    process_user_records,
+    record_id,
+)
+from breaker import UpstreamRejected
+from async_client import UPSTREAM_ERRORS, AsyncServiceAClient
+from changefeed import ChangeFeedFollower
+from client import user_path
+
+# Requests handled at once before new ones are answered with 503
+ASYNC_LIMIT_CONCURRENCY = int(os.getenv("ASYNC_LIMIT_CONCURRENCY", "1000"))
+# Connections waiting to be accepted by the server
+ASYNC_BACKLOG = int(os.getenv("ASYNC_BACKLOG", "2048"))
+
+
+def make_async_service_a_client():
+    return AsyncServiceAClient(
+        SERVICE_A_URL,
+        pool_size=SERVICE_A_POOL_SIZE,
+        connect_timeout=SERVICE_A_CONNECT_TIMEOUT,
+        read_timeout=SERVICE_A_READ_TIMEOUT,
+        retries=SERVICE_A_RETRIES,
+        retry_backoff=SERVICE_A_RETRY_BACKOFF,
+        guard=make_upstream_guard(),
+    )
+
+
+def render_json(content):
+    return dumps(content, ensure_ascii=False)
+
+
+class JSONResponse(StarletteJSONResponse):
+    """Starlette's JSON response, encoded with orjson when it is installed"""
+
+    def render(self, content):
+        return render_json(content)
+
+
+async def fetch_user(state, user_id):
+    """Fetch a user from Service A through the user cache, or None if it does not exist"""
+    path = user_path(user_id)
+    if path is None:
+        return None
+
+    async def load(stale):
+        headers = {}
+        if stale is not None and stale[1]:
+            headers["If-None-Match"] = stale[1]
+        response = await state.service_a.get(path, headers=headers)
+        if response.status == 304 and stale is not None:
+            return stale, 0
+        if response.status == 404:
+            return None, 0
+        if response.status != 200:
+            raise UpstreamError(f"Service A returned {response.status}")
+        body = await response.read()
+        return (loads(body), response.headers.get("ETag")), len(body)
+
+    cached = await state.user_cache.get_or_load_async(user_id, load)
+    return cached[0] if cached is not None else None
+
+
+async def process_user(state, user_id, build=build_processed_data):
+    """Fetch and process one user, returning the response body and status code
+
+    The body of a processed user is ``build(user_data)``, which may be a
+    coroutine function; error bodies are always dicts. UpstreamRejected is
+    raised as by the sync app.
+    """
+    try:
+        user_data = await fetch_user(state, user_id)
+
+        if user_data is None:
+            return {"error": "User not found"}, 404
+
+        body = build(user_data)
+        if asyncio.iscoroutine(body):
+            body = await body
+        return body, 200
+
+    except UPSTREAM_ERRORS as e:
+        return {"error": f"Service A connection error: {str(e)}"}, 503
+    except UpstreamError as e:
+        return {"error": str(e)}, 502
+    except (KeyError, ValueError) as e:
+        return {"error": f"Invalid user data from Service A: {str(e)}"}, 502
+
+
+async def render_processed_data(state, user_data):
+    """The encoded JSON response body for a processed user, via the output cache"""
+
+    async def load(stale):
+        data = render_json(build_processed_data(user_data))
+        return data, len(data)
+
+    key = output_key(user_data)
+    if key is None:
+        return (await load(None))[0]
+    return await state.output_cache.get_or_load_async(key, load)
+
+
+async def iter_user_pages(state):
+    """Yield every page of users in Service A, one request at a time"""
+    cursor = None
+    while True:
+        params = {"limit": SERVICE_A_PAGE_SIZE}
+        if cursor:
+            params["cursor"] = cursor
+        response = await state.service_a.get("/users", params=params)
+        response.raise_for_status()
+        page = loads(await response.read())
+        yield page["users"]
+        cursor = page["next_cursor"]
+        if not cursor:
+            return
+
+
+async def bounded_map(func, items, concurrency):
+    """Yield ``await func(item)`` for each item in order, running up to ``concurrency`` calls at once"""
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def run(item):
+        async with semaphore:
+            return await func(item)
+
+    pending = deque()
+    try:
+        for item in items:
+            pending.append(asyncio.ensure_future(run(item)))
+            # Keep a second round queued so calls never wait on the consumer
+            if len(pending) >= 2 * concurrency:
+                yield await pending.popleft()
+        while pending:
+            yield await pending.popleft()
+    finally:
+        # The client went away: stop the calls nobody will read
+        for task in pending:
+            task.cancel()
+
+
+async def process_all_users(state):
+    """Yield NDJSON lines for every user in Service A"""
+    try:
+        async for users in iter_user_pages(state):
+            for user_data, (body, status) in zip(users, process_user_records(users)):
+                yield batch_line(record_id(user_data), body, status)
+    except UPSTREAM_ERRORS as e:
+        # One line without a user ID reports that the listing was cut short
+        yield batch_line(None, {"error": f"Service A connection error: {str(e)}"}, 503)
+    except UpstreamRejected as e:
+        yield batch_line(None, {"error": str(e)}, e.status)
+    except (KeyError, ValueError) as e:
+        yield batch_line(
+            None, {"error": f"Invalid user list from Service A: {str(e)}"}, 502
+        )
+
+
+async def process_batch_user(state, user_id):
+    try:
+        return await process_user(state, user_id)
+    except UpstreamRejected as e:
+        return {"error": str(e)}, e.status
+
+
+async def process_batch(state, ids):
+    results = bounded_map(
+        functools.partial(process_batch_user, state), ids, BATCH_CONCURRENCY
+    )
+    index = 0
+    async for body, status in results:
+        yield batch_line(ids[index], body, status)
+        index += 1
+
+
+def serve_asset(request, path):
+    found = request.app.state.ui.respond(
+        path,
+        request.headers.get("Accept-Encoding", ""),
+        request.headers.get("If-None-Match", ""),
+    )
+    if found is None:
+        return JSONResponse({"error": "Not found"}, status_code=404)
+    status, headers, body = found
+    return Response(body, status_code=status, headers=headers)
+
+
+async def home(request):
+    """Simple home page with UI"""
+    return serve_asset(request, "/")
+
+
+async def asset(request):
+    """Stylesheets and scripts referenced by the home page"""
+    return serve_asset(request, f"{ASSET_PREFIX}{request.path_params['name']}")
+
+
+async def process_user_data(request):
+    """Process data for a specific user"""
+    state = request.app.state
+    body, status = await process_user(
+        state,
+        request.path_params["user_id"],
+        build=functools.partial(render_processed_data, state),
+    )
+    if status != 200:
+        return JSONResponse(body, status_code=status)
+    return Response(body, media_type="application/json")
+
+
+async def process_users_batch(request):
+    """Process a batch of users and stream one NDJSON result line per user
+
+    Accepts the same bodies as the sync app, with at most BATCH_CONCURRENCY
+    Service A requests in flight per batch.
+    """
+    try:
+        data = loads(await request.body())
+    except ValueError:
+        data = None
+    user_ids = data.get("user_ids") if isinstance(data, dict) else None
+
+    if user_ids == "all":
+        lines = process_all_users(request.app.state)
+    elif isinstance(user_ids, list) and user_ids:
+        if len(user_ids) > MAX_BATCH_SIZE:
+            return JSONResponse(
+                {"error": f"At most {MAX_BATCH_SIZE} user IDs per batch"},
+                status_code=400,
+            )
+        lines = process_batch(request.app.state, [str(user_id) for user_id in user_ids])
+    else:
+        return JSONResponse(
+            {"error": 'user_ids must be a list of IDs or "all"'}, status_code=400
+        )
+
+    return StreamingResponse(lines, media_type="application/x-ndjson")
+
+
+async def pool_stats(request):
+    """Connection pool statistics for Service A requests"""
+    return JSONResponse(request.app.state.service_a.pool_stats())
+
+
+async def upstream_stats(request):
+    """Circuit breaker state and refused request counts for Service A"""
+    return JSONResponse(request.app.state.service_a.guard.stats())
+
+
+async def upstream_rejected(request, exc):
+    """Answer at once when Service A is not being called"""
+    return JSONResponse(
+        {"error": str(exc)},
+        status_code=exc.status,
+        headers={"Retry-After": str(exc.retry_after)},
+    )
+
+
+async def serve_metrics(request):
+    """Request, upstream, cache and pool metrics in the Prometheus text format"""
+    return Response(
+        request.app.state.metrics.render(), headers={"Content-Type": CONTENT_TYPE}
+    )
+
+
+def route_labels(routes):
+    """Route label of each endpoint, with parameters written as in Flask"""
+    return {
+        route.endpoint: re.sub(r"\{(\w+)\}", r"<\1>", route.path) for route in routes
+    }
+
+
+class MetricsMiddleware:
+    """Record each request in ``http_metrics``, labeled like the sync app
+
+    ``routes`` maps endpoints to their route label, see ``route_labels``.
+    """
+
+    def __init__(self, app, http_metrics, routes):
+        self.app = app
+        self.http_metrics = http_metrics
+        self.routes = routes
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        start = self.http_metrics.start()
+        status = 500
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            # The router records the matched endpoint in the scope
+            route = self.routes.get(scope.get("endpoint"), UNMATCHED)
+            self.http_metrics.finish(start, scope["method"], route, status)
+
+
+async def cache_stats(request):
+    """User cache hit, miss and eviction counters"""
+    return JSONResponse(request.app.state.user_cache.stats())
+
+
+async def output_cache_stats(request):
+    """Hit rate and size of the processed response cache"""
+    return JSONResponse(request.app.state.output_cache.stats())
+
+
+async def flush_cache(request):
+    """Drop every cached user"""
+    request.app.state.user_cache.clear()
+    return Response(status_code=204)
+
+
+async def invalidate_cached_user(request):
+    """Drop one cached user so the next request fetches it again"""
+    if not request.app.state.user_cache.invalidate(request.path_params["user_id"]):
+        return JSONResponse({"error": "User not cached"}, status_code=404)
+    return Response(status_code=204)
+
+
+@contextlib.asynccontextmanager
+async def lifespan(app):
+    # The change feed runs on its own thread with the blocking client
+    change_feed = None
+    if CHANGE_FEED_ENABLED:
+        change_feed = ChangeFeedFollower(
+            make_service_a_client(),
+            app.state.user_cache,
+            poll_timeout=CHANGE_FEED_POLL_TIMEOUT,
+        )
+        change_feed.start()
+    yield
+    if change_feed is not None:
+        change_feed.stop()
+    await app.state.service_a.close()
+
+
+def create_app():
+    """Create the async Service B app with its own Service A client and caches
+
+    The client opens its connections on the first request, and the change
+    feed starts with the app's lifespan.
+    """
+    client = make_async_service_a_client()
+    user_cache = make_user_cache()
+    output_cache = make_output_cache()
+    routes = [
+        Route("/", home),
+        Route(ASSET_PREFIX + "{name}", asset),
+        Route("/process/user/{user_id}", process_user_data, methods=["POST"]),
+        Route("/process/users", process_users_batch, methods=["POST"]),
+        Route("/admin/pool", pool_stats),
+        Route("/admin/upstream", upstream_stats),
+        Route("/admin/cache", cache_stats, methods=["GET"]),
+        Route("/admin/cache", flush_cache, methods=["DELETE"]),
+        Route("/admin/output-cache", output_cache_stats),
+        Route("/admin/cache/{user_id}", invalidate_cached_user, methods=["DELETE"]),
+    ]
+    middleware = []
+    metrics = None
+    if METRICS_ENABLED:
+        metrics = Registry()
+        init_service_metrics(
+            metrics, client, {"user": user_cache, "output": output_cache}
+        )
+        routes.append(Route("/metrics", serve_metrics))
+        middleware.append(
+            Middleware(
+                MetricsMiddleware,
+                http_metrics=HttpMetrics(metrics),
+                routes=route_labels(routes),
+            )
+        )
+    if COMPRESS_MIN_SIZE >= 0:
+        middleware.append(
+            Middleware(
+                GZipMiddleware,
+                minimum_size=COMPRESS_MIN_SIZE,
+                compresslevel=COMPRESS_LEVEL,
+            )
+        )
+    app = Starlette(
+        routes=routes,
+        exception_handlers={UpstreamRejected: upstream_rejected},
+        lifespan=lifespan,
+        middleware=middleware,
+    )
+    app.state.service_a = client
+    app.state.user_cache = user_cache
+    app.state.output_cache = output_cache
+    app.state.ui = AssetBundle(UI_DIR)
+    app.state.metrics = metrics
+    return app
+
+
+app = create_app()
+
+
+if __name__ == "__main__":
+    uvicorn.run(
+        app,
+        host="0.0.0.0",
+        port=5001,
+        limit_concurrency=ASYNC_LIMIT_CONCURRENCY,
+        backlog=ASYNC_BACKLOG,
+    )
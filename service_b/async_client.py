@@ -0,0 +1,114 @@
+"""Pooled keep-alive asyncio HTTP client for calls from Service B to Service A."""
+
+import asyncio
+
+import aiohttp
+
+from client import PoolStats
+
+# Statuses that make a GET worth repeating, matching ServiceAClient
+RETRY_STATUSES = frozenset({502, 503, 504})
+
+# Exceptions meaning Service A could not be reached or answered badly
+UPSTREAM_ERRORS = (aiohttp.ClientError, asyncio.TimeoutError)
+
+
+class AsyncServiceAClient:
+    """Shared aiohttp session for Service A with pooling, timeouts and retries
+
+    At most ``pool_size`` requests are in flight; further requests wait for
+    a free connection for up to the read timeout. GETs are retried with
+    exponential backoff on connection errors and 502/503/504 responses.
+    A ``guard`` works as for ServiceAClient.
+    """
+
+    def __init__(
+        self,
+        base_url,
+        pool_size=20,
+        connect_timeout=2.0,
+        read_timeout=5.0,
+        retries=2,
+        retry_backoff=0.1,
+        guard=None,
+    ):
+        self.base_url = base_url.rstrip("/")
+        self.pool_size = pool_size
+        self.retries = retries
+        self.retry_backoff = retry_backoff
+        self.stats = PoolStats()
+        self.guard = guard
+        self._timeout = aiohttp.ClientTimeout(
+            connect=read_timeout, sock_connect=connect_timeout, sock_read=read_timeout
+        )
+        self._session = None
+
+    def _trace_config(self):
+        trace = aiohttp.TraceConfig()
+
+        def counter(field):
+            async def record(*args):
+                self.stats.record(field)
+
+            return record
+
+        trace.on_request_start.append(counter("requests"))
+        trace.on_connection_create_end.append(counter("new_connections"))
+        trace.on_connection_queued_start.append(counter("waits"))
+        return trace
+
+    @property
+    def session(self):
+        # Created lazily so it binds to the event loop of the server
+        if self._session is None:
+            self._session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=self.pool_size),
+                timeout=self._timeout,
+                trace_configs=[self._trace_config()],
+            )
+        return self._session
+
+    async def get(self, path, **kwargs):
+        """GET ``path`` on Service A through the shared pool
+
+        The body is read before returning, so the connection is already
+        back in the pool and ``await response.read()`` does not block.
+        """
+        if self.guard is None:
+            return await self._get(path, **kwargs)
+        start = self.guard.enter()
+        failed = True
+        try:
+            response = await self._get(path, **kwargs)
+            failed = response.status >= 500
+            return response
+        finally:
+            self.guard.exit(start, failed)
+
+    async def _get(self, path, **kwargs):
+        url = f"{self.base_url}{path}"
+        for attempt in range(self.retries + 1):
+            last = attempt == self.retries
+            try:
+                response = await self.session.get(url, **kwargs)
+                try:
+                    # Reading to the end releases the connection but keeps the body
+                    await response.read()
+                except BaseException:
+                    response.close()
+                    raise
+            except UPSTREAM_ERRORS:
+                if last:
+                    raise
+            else:
+                if last or response.status not in RETRY_STATUSES:
+                    return response
+            await asyncio.sleep(self.retry_backoff * 2**attempt)
+
+    def pool_stats(self):
+        return self.stats.snapshot()
+
+    async def close(self):
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
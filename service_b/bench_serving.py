@@ -0,0 +1,144 @@
+"""Compare requests/sec of Service B's sync and async serving modes.
+
+Service A is replaced by a local stub that answers user lookups after a
+fixed delay, and the user cache is disabled so every request goes upstream.
+
+Usage: python bench_serving.py [--requests N] [--concurrency N] [--latency MS]
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import socket
+import subprocess
+import sys
+import threading
+import time
+import urllib.request
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import aiohttp
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+# Command starting each serving mode on the port given as argv[1]
+MODES = {
+    "sync": "from app import create_app; import sys; "
+    "create_app().run(port=int(sys.argv[1]), threaded=True)",
+    "async": "import uvicorn, sys; "
+    "uvicorn.run('async_app:app', port=int(sys.argv[1]), log_level='warning')",
+}
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_stub(latency):
+    """Serve GET /users/<id> like Service A, ``latency`` seconds late"""
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+        # Headers and body are separate writes; do not let Nagle delay the body
+        disable_nagle_algorithm = True
+
+        def do_GET(self):
+            time.sleep(latency)
+            user_id = self.path.rsplit("/", 1)[1]
+            body = json.dumps(
+                {"id": user_id, "name": "Ahmed Aly", "email": "ahmed@acme.com"}
+            ).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    server.daemon_threads = True
+    server.request_queue_size = 1024
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def start_mode(mode, stub_url, concurrency):
+    port = free_port()
+    env = dict(
+        os.environ,
+        SERVICE_A_URL=stub_url,
+        SERVICE_A_POOL_SIZE=str(concurrency),
+        USER_CACHE_TTL="0",
+        USER_CACHE_NEGATIVE_TTL="0",
+    )
+    process = subprocess.Popen(
+        [sys.executable, "-c", MODES[mode], str(port)],
+        cwd=HERE,
+        env=env,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    url = f"http://127.0.0.1:{port}"
+    deadline = time.monotonic() + 15
+    while time.monotonic() < deadline:
+        try:
+            urllib.request.urlopen(f"{url}/admin/pool").close()
+            return process, url
+        except OSError:
+            time.sleep(0.1)
+    process.kill()
+    raise RuntimeError(f"{mode} server did not start")
+
+
+async def load(url, requests, concurrency):
+    """Send ``requests`` POSTs from ``concurrency`` clients, returning (req/s, latencies)"""
+    latencies = []
+    connector = aiohttp.TCPConnector(limit=concurrency)
+    async with aiohttp.ClientSession(url, connector=connector) as client:
+
+        async def worker(offset):
+            for n in range(offset, requests, concurrency):
+                start = time.perf_counter()
+                async with client.post(f"/process/user/{n % 1000 + 1}") as response:
+                    response.raise_for_status()
+                    await response.read()
+                latencies.append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        await asyncio.gather(*(worker(offset) for offset in range(concurrency)))
+        elapsed = time.perf_counter() - start
+    return requests / elapsed, sorted(latencies)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--latency", type=float, default=20, help="stub delay in ms")
+    args = parser.parse_args()
+
+    stub = start_stub(args.latency / 1000)
+    stub_url = f"http://127.0.0.1:{stub.server_address[1]}"
+
+    print(f"{'mode':<6} {'req/sec':>10} {'p50 ms':>8} {'p99 ms':>8}")
+    for mode in MODES:
+        process, url = start_mode(mode, stub_url, args.concurrency)
+        try:
+            asyncio.run(load(url, args.concurrency, args.concurrency))  # warm-up
+            rate, latencies = asyncio.run(load(url, args.requests, args.concurrency))
+        finally:
+            process.terminate()
+            process.wait()
+        p50 = latencies[len(latencies) // 2] * 1000
+        p99 = latencies[int(len(latencies) * 0.99)] * 1000
+        print(f"{mode:<6} {rate:>10,.0f} {p50:>8.1f} {p99:>8.1f}")
+    stub.shutdown()
+
+
+if __name__ == "__main__":
+    main()
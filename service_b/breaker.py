@@ -0,0 +1,202 @@
+"""Circuit breaker and in-flight limit for calls from Service B to Service A."""
+
+import math
+import threading
+import time
+from collections import deque
+
+# Breaker states
+CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+
+class UpstreamRejected(Exception):
+    """A Service A call was refused before it was made
+
+    ``status`` is the HTTP status to answer with and ``retry_after`` the
+    number of seconds after which a retry may succeed.
+    """
+
+    status = 503
+
+    def __init__(self, message, retry_after):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class CircuitOpenError(UpstreamRejected):
+    """Service A has been failing, so calls are not being made for now"""
+
+    status = 503
+
+
+class OverloadedError(UpstreamRejected):
+    """Too many Service A calls are already in flight"""
+
+    status = 429
+
+
+class CircuitBreaker:
+    """Stop calling Service A while it fails or is slow
+
+    The outcomes of the last ``window`` calls are kept. Once at least
+    ``min_calls`` are known, the breaker opens if the share of failures
+    reaches ``failure_rate`` or the share of calls taking at least
+    ``slow_call_seconds`` reaches ``slow_call_rate``. While open, calls are refused for
+    ``open_seconds``. After that it is half open: ``half_open_calls`` probe
+    calls are let through. The breaker closes if they all succeed, and
+    opens again as soon as one fails.
+    """
+
+    def __init__(
+        self,
+        window=20,
+        min_calls=10,
+        failure_rate=0.5,
+        slow_call_seconds=2.0,
+        slow_call_rate=0.8,
+        open_seconds=10.0,
+        half_open_calls=3,
+    ):
+        self.window = window
+        self.min_calls = min_calls
+        self.failure_rate = failure_rate
+        self.slow_call_seconds = slow_call_seconds
+        self.slow_call_rate = slow_call_rate
+        self.open_seconds = open_seconds
+        self.half_open_calls = half_open_calls
+        self._lock = threading.Lock()
+        self._state = CLOSED
+        # (failed, slow) of recent calls while closed
+        self._outcomes = deque(maxlen=window)
+        self._opened_at = 0.0
+        self._probes = 0
+        self._probe_successes = 0
+        self._counts = {"opened": 0, "rejected": 0}
+
+    def _open(self, now):
+        self._state = OPEN
+        self._opened_at = now
+        self._outcomes.clear()
+        self._counts["opened"] += 1
+
+    def before_call(self):
+        """Claim a call, raising CircuitOpenError if it may not be made
+
+        Every claimed call must be reported with ``record``.
+        """
+        with self._lock:
+            now = time.monotonic()
+            if self._state == OPEN and now - self._opened_at >= self.open_seconds:
+                self._state = HALF_OPEN
+                self._probes = self._probe_successes = 0
+            if self._state == CLOSED:
+                return
+            if self._state == HALF_OPEN and self._probes < self.half_open_calls:
+                self._probes += 1
+                return
+            self._counts["rejected"] += 1
+            remaining = self._opened_at + self.open_seconds - now
+        raise CircuitOpenError(
+            "Service A circuit breaker is open", max(1, math.ceil(remaining))
+        )
+
+    def record(self, failed, duration):
+        """Report the outcome of a call claimed with ``before_call``"""
+        with self._lock:
+            now = time.monotonic()
+            if self._state == HALF_OPEN:
+                if failed:
+                    self._open(now)
+                else:
+                    self._probe_successes += 1
+                    if self._probe_successes >= self.half_open_calls:
+                        self._state = CLOSED
+                return
+            if self._state == OPEN:
+                return  # Made before the breaker opened
+            self._outcomes.append((failed, duration >= self.slow_call_seconds))
+            calls = len(self._outcomes)
+            if calls < self.min_calls:
+                return
+            failures = sum(1 for failed, _ in self._outcomes if failed)
+            slow = sum(1 for _, slow in self._outcomes if slow)
+            if (
+                failures >= self.failure_rate * calls
+                or slow >= self.slow_call_rate * calls
+            ):
+                self._open(now)
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._counts)
+            calls = len(self._outcomes)
+            stats.update(
+                state=self._state,
+                recent_calls=calls,
+                recent_failures=sum(1 for failed, _ in self._outcomes if failed),
+                recent_slow_calls=sum(1 for _, slow in self._outcomes if slow),
+            )
+        return stats
+
+
+class InFlightLimit:
+    """Refuse calls beyond ``limit`` at once instead of queueing them; 0 is unlimited"""
+
+    def __init__(self, limit):
+        self.limit = limit
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        self._shed = 0
+
+    def acquire(self):
+        """Claim a slot, raising OverloadedError if none is free"""
+        with self._lock:
+            if self.limit and self._in_flight >= self.limit:
+                self._shed += 1
+                raise OverloadedError("Too many Service A requests in flight", 1)
+            self._in_flight += 1
+
+    def release(self):
+        with self._lock:
+            self._in_flight -= 1
+
+    def stats(self):
+        with self._lock:
+            return {
+                "in_flight": self._in_flight,
+                "limit": self.limit,
+                "shed": self._shed,
+            }
+
+
+class UpstreamGuard:
+    """A circuit breaker and an in-flight limit in front of one upstream"""
+
+    def __init__(self, breaker, limit):
+        self.breaker = breaker
+        self.limit = limit
+        # Called with the duration and outcome of every call that was made
+        self.on_call = None
+
+    def enter(self):
+        """Admit a call, raising UpstreamRejected if it should not be made
+
+        Returns the start time to pass to ``exit``.
+        """
+        self.limit.acquire()
+        try:
+            self.breaker.before_call()
+        except BaseException:
+            self.limit.release()
+            raise
+        return time.monotonic()
+
+    def exit(self, start, failed):
+        duration = time.monotonic() - start
+        self.limit.release()
+        self.breaker.record(failed, duration)
+        if self.on_call is not None:
+            self.on_call(duration, failed)
+
+    def stats(self):
+        return {"breaker": self.breaker.stats(), "admission": self.limit.stats()}
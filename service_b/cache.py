@@ -0,0 +1,176 @@
+"""Bounded in-process read-through cache for Service A lookups."""
+
+import asyncio
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+
+# Counters reported by LRUCache.stats()
+COUNTERS = ("hits", "misses", "coalesced", "evictions", "expirations", "revalidations")
+
+
+class LRUCache:
+    """Thread-safe TTL cache with LRU eviction by entry count and size
+
+    ``get_or_load`` is read-through: on a miss the loader runs once, and any
+    concurrent misses for the same key wait for that call instead of
+    starting their own. A ``None`` value records a negative result (such as
+    a 404) and is kept for ``negative_ttl`` instead of ``ttl``. Loader
+    exceptions are passed to every waiter and never cached.
+
+    Expired entries stay in place until reloaded, and the loader is given
+    the expired value so it can revalidate it upstream. Returning that same
+    object renews it without a new copy being stored.
+    """
+
+    def __init__(
+        self, max_entries=10000, max_bytes=16 * 1024 * 1024, ttl=30.0, negative_ttl=5.0
+    ):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self._lock = threading.Lock()
+        # key -> (value, expires_at, size), least recently used first
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._inflight = {}
+        self._counts = dict.fromkeys(COUNTERS, 0)
+
+    def get_or_load(self, key, loader):
+        """Return the cached value for ``key``, calling ``loader(stale)`` on a miss
+
+        ``stale`` is the expired value for ``key``, or None if nothing was
+        cached. ``loader`` returns ``(value, size_in_bytes)``; the size is
+        ignored when it returns ``stale`` itself.
+        """
+        found, future, stale, stale_size = self._begin(key, Future)
+        if future is None:
+            return found
+        if not found:
+            return future.result()
+
+        try:
+            value, size = loader(stale)
+        except BaseException as e:
+            self._abandon(key, future)
+            future.set_exception(e)
+            raise
+
+        self._finish(key, future, value, size, stale, stale_size)
+        future.set_result(value)
+        return value
+
+    async def get_or_load_async(self, key, loader):
+        """``get_or_load`` for asyncio code, where ``loader(stale)`` is a coroutine
+
+        Waiting never blocks the event loop, and a cancelled waiter does
+        not cancel the shared load.
+        """
+        found, future, stale, stale_size = self._begin(
+            key, asyncio.get_running_loop().create_future
+        )
+        if future is None:
+            return found
+        if not found:
+            return await asyncio.shield(future)
+
+        try:
+            value, size = await loader(stale)
+        except BaseException as e:
+            self._abandon(key, future)
+            future.set_exception(e)
+            # Mark the exception retrieved in case nobody else was waiting
+            future.exception()
+            raise
+
+        self._finish(key, future, value, size, stale, stale_size)
+        future.set_result(value)
+        return value
+
+    def _begin(self, key, new_future):
+        """Look ``key`` up, returning ``(value, None, ...)`` on a hit
+
+        Otherwise returns ``(is_leader, future, stale, stale_size)``, where
+        the leader is the caller that must run the loader.
+        """
+        stale, stale_size = None, 0
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if entry[1] > time.monotonic():
+                    self._entries.move_to_end(key)
+                    self._counts["hits"] += 1
+                    return entry[0], None, None, 0
+                stale, _, stale_size = entry
+                self._counts["expirations"] += 1
+
+            future = self._inflight.get(key)
+            if future is not None:
+                self._counts["coalesced"] += 1
+                return False, future, stale, stale_size
+            future = self._inflight[key] = new_future()
+            self._counts["misses"] += 1
+            return True, future, stale, stale_size
+
+    def _abandon(self, key, future):
+        with self._lock:
+            if self._inflight.get(key) is future:
+                del self._inflight[key]
+
+    def _finish(self, key, future, value, size, stale, stale_size):
+        with self._lock:
+            if stale is not None and value is stale:
+                size = stale_size
+                self._counts["revalidations"] += 1
+            # An invalidation during the load drops the in-flight slot, so
+            # the possibly stale value is returned but not stored
+            if self._inflight.get(key) is future:
+                del self._inflight[key]
+                self._store(key, value, size)
+
+    def _store(self, key, value, size):
+        ttl = self.negative_ttl if value is None else self.ttl
+        if ttl <= 0 or size > self.max_bytes or self.max_entries <= 0:
+            return
+        if key in self._entries:
+            self._remove(key)
+        self._entries[key] = (value, time.monotonic() + ttl, size)
+        self._bytes += size
+        while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+            self._remove(next(iter(self._entries)))
+            self._counts["evictions"] += 1
+
+    def _remove(self, key):
+        _, _, size = self._entries.pop(key)
+        self._bytes -= size
+
+    def invalidate(self, key):
+        """Drop one key, returning True if it was cached"""
+        with self._lock:
+            self._inflight.pop(key, None)
+            if key not in self._entries:
+                return False
+            self._remove(key)
+            return True
+
+    def clear(self):
+        """Drop every entry"""
+        with self._lock:
+            self._inflight.clear()
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._counts)
+            lookups = stats["hits"] + stats["misses"] + stats["coalesced"]
+            stats.update(
+                hit_rate=round(stats["hits"] / lookups, 4) if lookups else 0.0,
+                entries=len(self._entries),
+                bytes=self._bytes,
+                max_entries=self.max_entries,
+                max_bytes=self.max_bytes,
+            )
+        return stats
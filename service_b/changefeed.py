@@ -0,0 +1,65 @@
+"""Follow Service A's change feed to keep the user cache exactly fresh."""
+
+import threading
+
+import requests
+
+
+class ChangeFeedFollower(threading.Thread):
+    """Background thread that long-polls ``/users/changes`` on Service A
+
+    Every changed user is invalidated in ``cache``. If Service A reports a
+    reset, for instance because it restarted, or answers with another
+    epoch, changes may have been missed and the whole cache is flushed
+    instead. So is it on the first answer, since nothing was followed before.
+
+    A Service A whose store is shared between processes has no feed, and
+    answers 501. The follower then stops and cached users only expire.
+    """
+
+    def __init__(self, client, cache, poll_timeout=25.0, retry_delay=1.0):
+        super().__init__(name="change-feed", daemon=True)
+        self.client = client
+        self.cache = cache
+        self.poll_timeout = poll_timeout
+        self.retry_delay = retry_delay
+        self.version = 0
+        self.epoch = None
+        self._stopped = threading.Event()
+
+    def poll_once(self):
+        """Apply one batch of changes from Service A"""
+        params = {"since": self.version, "timeout": self.poll_timeout}
+        if self.epoch is not None:
+            params["epoch"] = self.epoch
+        response = self.client.get(
+            "/users/changes",
+            params=params,
+            timeout=(self.client.timeout[0], self.poll_timeout + 5),
+            # A long poll is slow by design and must not trip the breaker
+            guarded=False,
+        )
+        if response.status_code == 501:
+            self.stop()
+            return
+        response.raise_for_status()
+        data = response.json()
+
+        if data["reset"] or data["epoch"] != self.epoch:
+            self.cache.clear()
+        else:
+            for change in data["changes"]:
+                self.cache.invalidate(change["id"])
+        self.version, self.epoch = data["version"], data["epoch"]
+
+    def run(self):
+        while not self._stopped.is_set():
+            try:
+                self.poll_once()
+            except (requests.RequestException, KeyError, ValueError):
+                # Changes may be lost while Service A is unreachable
+                self.cache.clear()
+                self._stopped.wait(self.retry_delay)
+
+    def stop(self):
+        self._stopped.set()
@@ -0,0 +1,152 @@
+"""Pooled keep-alive HTTP client for calls from Service B to Service A."""
+
+import threading
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+from urllib3.util.retry import Retry
+
+
+def user_path(user_id):
+    """The Service A path of user ``user_id``, or None if it cannot be a user
+
+    Service A IDs are decimal numbers. IDs come from request bodies and URLs,
+    and anything else pasted into the path could reach another route, such
+    as "../stats", or add a query string, so it is not requested at all.
+    """
+    if user_id.isascii() and user_id.isdigit():
+        return f"/users/{user_id}"
+    return None
+
+
+class PoolStats:
+    """Thread-safe counters describing how the connection pool is used"""
+
+    FIELDS = ("requests", "hits", "new_connections", "waits")
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counts = dict.fromkeys(self.FIELDS, 0)
+
+    def record(self, field, amount=1):
+        with self._lock:
+            self._counts[field] += amount
+
+    def snapshot(self):
+        with self._lock:
+            counts = dict(self._counts)
+        # Every checkout that did not open a new connection reused one
+        counts["hits"] = counts["requests"] - counts["new_connections"]
+        return counts
+
+
+class _CountingPoolMixin:
+    """Connection pool that reports checkouts and new connections to ``stats``"""
+
+    stats: PoolStats
+
+    def _get_conn(self, timeout=None):
+        self.stats.record("requests")
+        # All connections are checked out: block, or open a temporary extra one
+        if self.pool is not None and self.pool.empty():
+            self.stats.record("waits")
+        return super()._get_conn(timeout=timeout)
+
+    def _new_conn(self):
+        self.stats.record("new_connections")
+        return super()._new_conn()
+
+
+class PooledAdapter(HTTPAdapter):
+    """HTTPAdapter whose connection pools count their usage in ``stats``"""
+
+    def __init__(self, stats, **kwargs):
+        attrs = {"stats": stats}
+        self._pool_classes = {
+            "http": type(
+                "CountingHTTPConnectionPool",
+                (_CountingPoolMixin, HTTPConnectionPool),
+                attrs,
+            ),
+            "https": type(
+                "CountingHTTPSConnectionPool",
+                (_CountingPoolMixin, HTTPSConnectionPool),
+                attrs,
+            ),
+        }
+        super().__init__(**kwargs)
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = self._pool_classes
+
+
+class ServiceAClient:
+    """Shared Session for Service A with keep-alive pooling, timeouts and retries
+
+    Only GET requests are retried, with exponential backoff, on connection
+    errors and 502/503/504 responses, since they are safe to repeat. With a
+    ``guard`` (see breaker.py), requests are refused while Service A is
+    failing or too many are already in flight.
+    """
+
+    def __init__(
+        self,
+        base_url,
+        pool_size=20,
+        pool_block=False,
+        connect_timeout=2.0,
+        read_timeout=5.0,
+        retries=2,
+        retry_backoff=0.1,
+        guard=None,
+    ):
+        self.base_url = base_url.rstrip("/")
+        self.timeout = (connect_timeout, read_timeout)
+        self.stats = PoolStats()
+        self.guard = guard
+
+        retry = Retry(
+            total=retries,
+            backoff_factor=retry_backoff,
+            status_forcelist=(502, 503, 504),
+            allowed_methods=frozenset({"GET"}),
+            raise_on_status=False,
+        )
+        adapter = PooledAdapter(
+            self.stats,
+            pool_connections=1,
+            pool_maxsize=pool_size,
+            pool_block=pool_block,
+            max_retries=retry,
+        )
+        self.session = requests.Session()
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def get(self, path, guarded=True, **kwargs):
+        """GET ``path`` on Service A through the shared pool
+
+        Unless ``guarded`` is false, the request goes through the guard and
+        may raise UpstreamRejected without being sent. Errors and 5xx
+        responses, after retries, count as failures for the breaker.
+        """
+        kwargs.setdefault("timeout", self.timeout)
+        url = f"{self.base_url}{path}"
+        if self.guard is None or not guarded:
+            return self.session.get(url, **kwargs)
+        start = self.guard.enter()
+        failed = True
+        try:
+            response = self.session.get(url, **kwargs)
+            failed = response.status_code >= 500
+            return response
+        finally:
+            self.guard.exit(start, failed)
+
+    def pool_stats(self):
+        return self.stats.snapshot()
+
+    def close(self):
+        self.session.close()
@@ -0,0 +1,31 @@
+"""Gunicorn settings for Service B, tunable through environment variables.
+
+Run with ``gunicorn -c gunicorn.conf.py``.
+"""
+
+import os
+
+wsgi_app = "app:create_app()"
+bind = os.getenv("GUNICORN_BIND", "0.0.0.0:5001")
+
+# Build the app once in the master so forked workers share its memory
+preload_app = True
+
+# Requests mostly wait on Service A, so threads are cheap concurrency here
+workers = int(os.getenv("GUNICORN_WORKERS", "2"))
+worker_class = "gthread"
+threads = int(os.getenv("GUNICORN_THREADS", "16"))
+
+keepalive = int(os.getenv("GUNICORN_KEEPALIVE", "5"))
+backlog = int(os.getenv("GUNICORN_BACKLOG", "2048"))
+timeout = int(os.getenv("GUNICORN_TIMEOUT", "60"))
+graceful_timeout = int(os.getenv("GUNICORN_GRACEFUL_TIMEOUT", "30"))
+
+accesslog = "-"
+
+
+def post_worker_init(worker):
+    # Threads do not survive fork, so each worker starts its own
+    from app import start_background_tasks
+
+    start_background_tasks(worker.wsgi)
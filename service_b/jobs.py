@@ -0,0 +1,184 @@
+"""Background jobs over many users, with NDJSON results and checkpoints on disk."""
+
+import fcntl
+import json
+import os
+import queue
+import threading
+import time
+import uuid
+
+# Job states; queued and running jobs are picked up again after a restart
+QUEUED, RUNNING, SUCCEEDED, FAILED = "queued", "running", "succeeded", "failed"
+PENDING = (QUEUED, RUNNING)
+
+# Bytes read at a time when streaming a results file
+READ_SIZE = 64 * 1024
+
+
+def _write_json(path, data):
+    # Written aside and renamed, so readers never see half a file
+    tmp = f"{path}.tmp"
+    with open(tmp, "w") as f:
+        json.dump(data, f)
+    os.replace(tmp, path)
+
+
+def _read_json(path):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+class JobManager:
+    """Run jobs on a bounded pool of threads, keeping their state in ``directory``
+
+    A job runs ``handler(spec, position)``, which yields ``(lines, succeeded,
+    failed, position)`` chunks. ``position`` is whatever the handler needs to
+    continue after that chunk; it starts as None. Each chunk's NDJSON lines
+    are appended to ``<id>.ndjson`` and synced to disk, then the job's state,
+    with the size of the results file and the position, replaces
+    ``<id>.json``. A job that stops before it finishes is resumed from its
+    last checkpoint, and lines written after that checkpoint are dropped.
+
+    State is only kept on disk, so every process using ``directory`` sees
+    every job. A lock on ``<id>.lock`` makes sure only one of them runs it.
+    """
+
+    def __init__(self, directory, handler, workers=2):
+        self.directory = directory
+        self.handler = handler
+        self.workers = workers
+        self._queue = queue.Queue()
+        self._threads = []
+        self._lock = threading.Lock()
+
+    def _path(self, job_id, suffix):
+        return os.path.join(self.directory, f"{job_id}{suffix}")
+
+    def _start_workers(self):
+        # Started on first use so a server can fork workers after create_app.
+        # Daemon threads: an interrupted job resumes from its checkpoint.
+        with self._lock:
+            while len(self._threads) < self.workers:
+                thread = threading.Thread(target=self._work, daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+    def _enqueue(self, job_id):
+        self._start_workers()
+        self._queue.put(job_id)
+
+    def _work(self):
+        while True:
+            self._run(self._queue.get())
+
+    def submit(self, spec, total=None):
+        """Queue a new job for ``spec`` with ``total`` items, returning its state"""
+        os.makedirs(self.directory, exist_ok=True)
+        job_id = uuid.uuid4().hex
+        _write_json(self._path(job_id, ".spec.json"), spec)
+        now = time.time()
+        state = {
+            "id": job_id,
+            "status": QUEUED,
+            "total": total,
+            "processed": 0,
+            "succeeded": 0,
+            "failed": 0,
+            "error": None,
+            "created_at": now,
+            "updated_at": now,
+            "position": None,
+            "offset": 0,
+        }
+        self._save(state)
+        self._enqueue(job_id)
+        return state
+
+    def get(self, job_id):
+        """The state of job ``job_id``, or None if there is no such job"""
+        if not job_id.isalnum():
+            return None
+        return _read_json(self._path(job_id, ".json"))
+
+    def list(self):
+        """The state of every job, oldest first"""
+        if not os.path.isdir(self.directory):
+            return []
+        jobs = []
+        for name in os.listdir(self.directory):
+            job_id, ext = os.path.splitext(name)
+            if ext == ".json" and job_id.isalnum():
+                state = self.get(job_id)
+                if state is not None:
+                    jobs.append(state)
+        return sorted(jobs, key=lambda state: state["created_at"])
+
+    def resume(self, job_id):
+        """Queue a failed job again from its last checkpoint, returning its state"""
+        state = self.get(job_id)
+        state.update(status=QUEUED, error=None)
+        self._save(state)
+        self._enqueue(job_id)
+        return state
+
+    def resume_pending(self):
+        """Queue every job left queued or running, as after a restart"""
+        for state in self.list():
+            if state["status"] in PENDING:
+                self._enqueue(state["id"])
+
+    def iter_results(self, job_id):
+        """Yield the checkpointed part of a job's results file"""
+        state = self.get(job_id)
+        remaining = state["offset"] if state else 0
+        if not remaining:
+            return
+        with open(self._path(job_id, ".ndjson"), "rb") as f:
+            while remaining > 0:
+                chunk = f.read(min(READ_SIZE, remaining))
+                if not chunk:
+                    return
+                remaining -= len(chunk)
+                yield chunk
+
+    def _save(self, state):
+        state["updated_at"] = time.time()
+        _write_json(self._path(state["id"], ".json"), state)
+
+    def _run(self, job_id):
+        with open(self._path(job_id, ".lock"), "w") as lock:
+            try:
+                fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                return  # Another thread or process is running it
+            state = self.get(job_id)
+            if state is None or state["status"] not in PENDING:
+                return
+            state["status"] = RUNNING
+            self._save(state)
+            try:
+                spec = _read_json(self._path(job_id, ".spec.json"))
+                with open(self._path(job_id, ".ndjson"), "ab") as results:
+                    results.truncate(state["offset"])
+                    chunks = self.handler(spec, state["position"])
+                    for lines, succeeded, failed, position in chunks:
+                        results.write("".join(lines).encode("utf-8"))
+                        results.flush()
+                        os.fsync(results.fileno())
+                        state["processed"] += len(lines)
+                        state["succeeded"] += succeeded
+                        state["failed"] += failed
+                        state["position"] = position
+                        state["offset"] = results.tell()
+                        self._save(state)
+            except Exception as e:
+                state.update(status=FAILED, error=str(e))
+            else:
+                state["status"] = SUCCEEDED
+                if state["total"] is None:
+                    state["total"] = state["processed"]
+            self._save(state)
@@ -0,0 +1,100 @@
+"""Tests for name and email analysis."""
+
+import unittest
+
+from analysis import DomainClassifier, analyze_email
+from app import process_user_record, process_user_records
+
+NAMES = ["Ahmed Aly", "Mona", "", "  Omar  Abdel  Aziz Farouk ", "Zoë Martin"]
+EMAILS = [
+    "ahmed@gmail.com",
+    "mona@acme.com",
+    "omar@mail.yahoo.co.uk",
+    "zoe@OUTLOOK.com",
+    "x@",
+    "@hotmail.fr",
+    "sara@gmailer.io",
+    "no-at-sign",
+    "a@b@acme.com",
+]
+
+
+def make_users():
+    return [
+        {"id": str(i), "name": name, "email": email}
+        for i, (name, email) in enumerate(
+            (name, email) for name in NAMES for email in EMAILS
+        )
+    ]
+
+
+class TestAnalysis(unittest.TestCase):
+    def test_malformed_emails_are_analyzed(self):
+        self.assertEqual(
+            analyze_email("no-at-sign"),
+            {"username": "no-at-sign", "domain": "", "is_corporate": False},
+        )
+        self.assertEqual(analyze_email("a@b@acme.com")["domain"], "acme.com")
+        self.assertFalse(analyze_email("x@")["is_corporate"])
+
+    def test_page_matches_single_records(self):
+        users = make_users() + [
+            {"id": "97", "name": "No Email"},
+            {"id": "98", "name": None, "email": "sara@acme.com"},
+            {"id": "99", "name": "Int Email", "email": 5},
+            ["not", "a", "record"],
+        ]
+        results = process_user_records(users)
+        self.assertEqual(results, [process_user_record(u) for u in users])
+        self.assertEqual([status for _, status in results[-4:]], [502] * 4)
+        self.assertTrue(all(status == 200 for _, status in results[:-4]))
+
+
+class TestDomainClassifier(unittest.TestCase):
+    def setUp(self):
+        self.classifier = DomainClassifier(["gmail.com", "Yahoo.co.uk.", " "])
+
+    def test_domains_and_subdomains_match(self):
+        for domain in ("gmail.com", "GMail.Com", "mail.yahoo.co.uk"):
+            self.assertTrue(self.classifier.is_free_mail(domain), domain)
+        for domain in ("notgmail.co", "gmail.com.evil.io", "co.uk", "acme.com"):
+            self.assertFalse(self.classifier.is_free_mail(domain), domain)
+
+    def test_brands_match_under_any_suffix(self):
+        classifier = DomainClassifier(["hotmail.*", "outlook.*"])
+        for domain in ("hotmail.com.br", "Outlook.com.au", "mail.hotmail.de"):
+            self.assertTrue(classifier.is_free_mail(domain), domain)
+        for domain in (
+            "hotmail.acme.com",
+            "nothotmail.com",
+            "hotmail.com.evil.io",
+            "outlook.example.co.uk",
+            "hotmail",
+        ):
+            self.assertFalse(classifier.is_free_mail(domain), domain)
+
+    def test_empty_domain_is_not_corporate(self):
+        self.assertFalse(self.classifier.is_corporate(""))
+        self.assertTrue(self.classifier.is_corporate("acme.com"))
+
+    def test_results_are_memoized(self):
+        for _ in range(3):
+            self.classifier.is_free_mail("acme.com")
+        info = self.classifier.cache_info()
+        self.assertEqual((info.hits, info.misses), (2, 1))
+
+    def test_bundled_list_classifies_known_providers(self):
+        for email in (
+            "a@gmail.com",
+            "b@outlook.com",
+            "c@mailinator.com",
+            "d@hotmail.com.br",
+            "e@outlook.com.au",
+            "f@yahoo.co.nz",
+        ):
+            self.assertFalse(analyze_email(email)["is_corporate"], email)
+        self.assertTrue(analyze_email("d@notgmail.co")["is_corporate"])
+
+
+if __name__ == "__main__":
+    unittest.main()
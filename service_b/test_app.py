@@ -1,18 +1,62 @@
 """Tests for Service B data processing endpoints."""
 
+import json
 import unittest
-from unittest.mock import patch
-from app import app
+from unittest.mock import MagicMock, patch
+import requests
+from analysis import build_processed_data
+from app import USER_CACHE_TTL, create_app
+from breaker import CircuitBreaker, InFlightLimit, UpstreamGuard
+
+
+def fake_service_a(users, fail_ids=()):
+    """Build a Session.get replacement serving ``users`` like Service A"""
+
+    def get(url, params=None, headers=None, **kwargs):
+        response = MagicMock()
+        if url.endswith("/users"):
+            after = int((params or {}).get("cursor", 0))
+            limit = (params or {}).get("limit", 100)
+            page = [u for u in users.values() if int(u["id"]) > after][:limit]
+            response.status_code = 200
+            response.json.return_value = {
+                "users": page,
+                "next_cursor": page[-1]["id"] if len(page) == limit else None,
+            }
+            return response
+        user_id = url.rsplit("/", 1)[1]
+        if user_id in fail_ids:
+            raise requests.ConnectionError("connection refused")
+        if user_id not in users:
+            response.status_code = 404
+            return response
+        etag = f'"{hash(json.dumps(users[user_id], sort_keys=True))}"'
+        response.headers = {"ETag": etag}
+        if (headers or {}).get("If-None-Match") == etag:
+            response.status_code = 304
+            return response
+        response.status_code = 200
+        response.json.return_value = users[user_id]
+        response.content = json.dumps(users[user_id]).encode()
+        return response
+
+    return get
 
 
 class TestDataProcessingService(unittest.TestCase):
     """Unit tests for the data processing service endpoints."""
 
     def setUp(self):
-        self.app = app.test_client()
+        self.app = create_app().test_client()
         self.app.testing = True
 
-    @patch("requests.get")
+    def test_home_page(self):
+        response = self.app.get("/")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.mimetype, "text/html")
+        self.assertIn(b"/assets/home.", response.data)
+
+    @patch("requests.Session.get")
     def test_process_user_data(self, mock_get):
         """Process user data returns combined analysis from Service A."""
         # Mock response from Service A
@@ -30,7 +74,7 @@ class TestDataProcessingService(unittest.TestCase):
         self.assertEqual(data["email"], mock_user_data["email"])
         self.assertEqual(data["email_domain"], "gmail.com")
 
-    @patch("requests.get")
+    @patch("requests.Session.get")
     def test_process_nonexistent_user(self, mock_get):
         """Returns 404 when the upstream service reports user not found."""
         # Mock 404 response from Service A
@@ -41,6 +85,233 @@ class TestDataProcessingService(unittest.TestCase):
         data = response.get_json()
         self.assertEqual(data["error"], "User not found")
 
+    @patch("requests.Session.get")
+    def test_process_users_batch(self, mock_get):
+        """Batch processing reports each user separately and keeps input order."""
+        users = {
+            "1": {"id": "1", "name": "Ahmed Aly", "email": "Ahmed@gmail.com"},
+            "2": {"id": "2", "name": "Sara Mohamed Ali", "email": "sara@acme.com"},
+        }
+        mock_get.side_effect = fake_service_a(users, fail_ids={"3"})
+
+        response = self.app.post(
+            "/process/users", json={"user_ids": ["1", "999", "3", 2]}
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.mimetype, "application/x-ndjson")
+        lines = [
+            json.loads(line) for line in response.get_data(as_text=True).splitlines()
+        ]
+
+        self.assertEqual([line["user_id"] for line in lines], ["1", "999", "3", "2"])
+        self.assertEqual([line["status"] for line in lines], [200, 404, 503, 200])
+        self.assertEqual(lines[0]["result"]["email_domain"], "gmail.com")
+        self.assertEqual(lines[1]["error"], "User not found")
+        self.assertEqual(
+            lines[3]["result"]["name_analysis"]["middle_names"], ["Mohamed"]
+        )
+
+    @patch("requests.Session.get")
+    def test_batch_ids_cannot_reach_other_routes(self, mock_get):
+        """IDs that are not numbers are not found without asking Service A."""
+        users = {"1": {"id": "1", "name": "Ahmed Aly", "email": "Ahmed@gmail.com"}}
+        mock_get.side_effect = fake_service_a(users)
+
+        ids = ["../stats", "1?timeout=30", "1/../../users/changes", "%31", "1"]
+        response = self.app.post("/process/users", json={"user_ids": ids})
+        lines = [
+            json.loads(line) for line in response.get_data(as_text=True).splitlines()
+        ]
+        self.assertEqual([line["status"] for line in lines], [404] * 4 + [200])
+        self.assertEqual(mock_get.call_count, 1)
+        self.assertTrue(mock_get.call_args.args[0].endswith("/users/1"))
+        self.assertEqual(self.app.get("/admin/cache").get_json()["entries"], 1)
+
+    @patch("app.SERVICE_A_PAGE_SIZE", 2)
+    @patch("requests.Session.get")
+    def test_process_all_users(self, mock_get):
+        """Processing "all" walks every page of Service A's user list."""
+        users = {
+            str(i): {"id": str(i), "name": f"User {i}", "email": f"user{i}@acme.com"}
+            for i in range(1, 6)
+        }
+        mock_get.side_effect = fake_service_a(users)
+
+        response = self.app.post("/process/users", json={"user_ids": "all"})
+        lines = [
+            json.loads(line) for line in response.get_data(as_text=True).splitlines()
+        ]
+        self.assertEqual([line["user_id"] for line in lines], list(users))
+        self.assertTrue(all(line["status"] == 200 for line in lines))
+
+    @patch("app.SERVICE_A_PAGE_SIZE", 2)
+    @patch("requests.Session.get")
+    def test_malformed_records_only_fail_their_user(self, mock_get):
+        """A name or email that is not a string is reported for that user."""
+        users = {
+            "1": {"id": "1", "name": "Ahmed Aly", "email": "Ahmed@gmail.com"},
+            "2": {"id": "2", "name": None, "email": "sara@acme.com"},
+            "3": {"id": "3", "name": "Omar Said", "email": 42},
+        }
+        mock_get.side_effect = fake_service_a(users)
+
+        response = self.app.post("/process/user/2")
+        self.assertEqual(response.status_code, 502)
+        self.assertIn("Invalid user data", response.get_json()["error"])
+
+        for user_ids in (["1", "2", "3"], "all"):
+            response = self.app.post("/process/users", json={"user_ids": user_ids})
+            lines = [
+                json.loads(line)
+                for line in response.get_data(as_text=True).splitlines()
+            ]
+            self.assertEqual(
+                [(line["user_id"], line["status"]) for line in lines],
+                [("1", 200), ("2", 502), ("3", 502)],
+            )
+            self.assertEqual(lines[0]["result"]["email_domain"], "gmail.com")
+
+    def test_process_users_batch_rejects_bad_body(self):
+        """Batch requests need a list of IDs or "all"."""
+        self.assertEqual(self.app.post("/process/users", json={}).status_code, 400)
+        self.assertEqual(
+            self.app.post("/process/users", json={"user_ids": "some"}).status_code, 400
+        )
+
+    @patch("requests.Session.get")
+    def test_repeat_lookups_are_cached(self, mock_get):
+        """Repeated processing of a user fetches it from Service A once."""
+        users = {"1": {"id": "1", "name": "Ahmed Aly", "email": "Ahmed@gmail.com"}}
+        mock_get.side_effect = fake_service_a(users)
+        before = self.app.get("/admin/cache").get_json()
+
+        for _ in range(3):
+            self.assertEqual(self.app.post("/process/user/1").status_code, 200)
+            self.assertEqual(self.app.post("/process/user/2").status_code, 404)
+        self.assertEqual(mock_get.call_count, 2)
+
+        stats = self.app.get("/admin/cache").get_json()
+        self.assertEqual(stats["hits"] - before["hits"], 4)
+        self.assertEqual(stats["misses"] - before["misses"], 2)
+
+        self.assertEqual(self.app.delete("/admin/cache/1").status_code, 204)
+        self.assertEqual(self.app.delete("/admin/cache/1").status_code, 404)
+        self.app.post("/process/user/1")
+        self.assertEqual(mock_get.call_count, 3)
+
+        self.assertEqual(self.app.delete("/admin/cache").status_code, 204)
+        self.assertEqual(self.app.get("/admin/cache").get_json()["entries"], 0)
+
+    @patch("requests.Session.get")
+    def test_expired_users_are_revalidated(self, mock_get):
+        """An expired cached user is reused when Service A answers 304."""
+        users = {"1": {"id": "1", "name": "Ahmed Aly", "email": "Ahmed@gmail.com"}}
+        mock_get.side_effect = fake_service_a(users)
+        before = self.app.get("/admin/cache").get_json()
+
+        with patch("cache.time.monotonic", return_value=100.0):
+            self.app.post("/process/user/1")
+        with patch("cache.time.monotonic", return_value=100.0 + USER_CACHE_TTL):
+            response = self.app.post("/process/user/1")
+        self.assertEqual(response.get_json()["user_id"], "1")
+        self.assertIn("If-None-Match", mock_get.call_args.kwargs["headers"])
+        stats = self.app.get("/admin/cache").get_json()
+        self.assertEqual(stats["revalidations"] - before["revalidations"], 1)
+
+        users["1"] = dict(users["1"], name="Ahmed")
+        with patch("cache.time.monotonic", return_value=100.0 + 2 * USER_CACHE_TTL):
+            response = self.app.post("/process/user/1")
+        self.assertEqual(response.get_json()["name"], "Ahmed")
+
+    @patch("requests.Session.get")
+    @patch("app.build_processed_data", wraps=build_processed_data)
+    def test_processed_responses_are_reused(self, mock_build, mock_get):
+        """An unchanged user is served from the output cache, byte for byte."""
+        users = {"1": {"id": "1", "name": "Ahmed Aly", "email": "Ahmed@gmail.com"}}
+        mock_get.side_effect = fake_service_a(users)
+
+        first = self.app.post("/process/user/1")
+        self.app.delete("/admin/cache")
+        second = self.app.post("/process/user/1")
+        self.assertEqual(second.data, first.data)
+        self.assertEqual(mock_build.call_count, 1)
+
+        users["1"] = dict(users["1"], email="ahmed@acme.com")
+        self.app.delete("/admin/cache")
+        third = self.app.post("/process/user/1")
+        self.assertEqual(third.get_json()["email_domain"], "acme.com")
+        self.assertEqual(mock_build.call_count, 2)
+
+        stats = self.app.get("/admin/output-cache").get_json()
+        self.assertEqual((stats["hits"], stats["misses"]), (1, 2))
+        self.assertEqual(stats["hit_rate"], round(1 / 3, 4))
+        self.assertEqual(stats["bytes"], len(first.data) + len(third.data))
+
+    @patch("requests.Session.get")
+    def test_metrics(self, mock_get):
+        users = {"1": {"id": "1", "name": "Ahmed Aly", "email": "Ahmed@gmail.com"}}
+        mock_get.side_effect = fake_service_a(users, fail_ids={"2"})
+        self.assertEqual(self.app.post("/process/user/2").status_code, 503)
+        self.app.post("/process/user/1")
+
+        text = self.app.get("/metrics").data.decode()
+        self.assertIn('service_b_upstream_requests_total{outcome="error"} 1', text)
+        self.assertIn('service_b_upstream_requests_total{outcome="success"} 1', text)
+        self.assertIn("service_b_upstream_request_duration_seconds_count 2", text)
+        self.assertIn('service_b_breaker_state{state="open"} 0', text)
+        self.assertIn(
+            'service_b_cache_events_total{cache="user",event="misses"} 2', text
+        )
+
+
+class TestUpstreamProtection(unittest.TestCase):
+    """Requests are refused at once while Service A is failing or overloaded."""
+
+    users = {"1": {"id": "1", "name": "Ahmed Aly", "email": "Ahmed@gmail.com"}}
+
+    def setUp(self):
+        app = create_app()
+        self.guard = UpstreamGuard(
+            CircuitBreaker(window=2, min_calls=2, open_seconds=30), InFlightLimit(4)
+        )
+        app.extensions["processing"]["service_a"].guard = self.guard
+        self.app = app.test_client()
+        patcher = patch("requests.Session.get")
+        self.mock_get = patcher.start()
+        self.mock_get.side_effect = fake_service_a(self.users, fail_ids={"2", "3"})
+        self.addCleanup(patcher.stop)
+
+    def test_open_breaker_refuses_requests(self):
+        self.assertEqual(self.app.post("/process/user/2").status_code, 503)
+        self.assertEqual(self.app.post("/process/user/3").status_code, 503)
+        calls = self.mock_get.call_count
+
+        response = self.app.post("/process/user/1")
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response.headers["Retry-After"], "30")
+        self.assertEqual(
+            response.get_json()["error"], "Service A circuit breaker is open"
+        )
+        self.assertEqual(self.mock_get.call_count, calls)
+
+        batch = self.app.post("/process/users", json={"user_ids": ["1"]})
+        line = json.loads(batch.data)
+        self.assertEqual((line["user_id"], line["status"]), ("1", 503))
+
+        stats = self.app.get("/admin/upstream").get_json()
+        self.assertEqual(stats["breaker"]["state"], "open")
+        self.assertEqual(stats["breaker"]["rejected"], 2)
+
+    def test_requests_beyond_the_in_flight_limit_are_shed(self):
+        for _ in range(4):
+            self.guard.limit.acquire()
+        response = self.app.post("/process/user/1")
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response.headers["Retry-After"], "1")
+        self.assertEqual(self.mock_get.call_count, 0)
+        stats = self.app.get("/admin/upstream").get_json()
+        self.assertEqual(stats["admission"], {"in_flight": 4, "limit": 4, "shed": 1})
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,231 @@
+"""Tests for Service B's asyncio serving mode, against the same contract as test_app.py."""
+
+import json
+import threading
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest.mock import patch
+from urllib.parse import parse_qs, urlsplit
+
+from starlette.testclient import TestClient
+
+from async_app import create_app
+from breaker import CircuitBreaker, InFlightLimit, UpstreamGuard
+
+
+class FakeServiceA(BaseHTTPRequestHandler):
+    """Serve ``users`` like Service A, dropping the connection for ``fail_ids``"""
+
+    protocol_version = "HTTP/1.1"
+    users = {}
+    fail_ids = ()
+    calls = 0
+
+    def do_GET(self):
+        type(self).calls += 1
+        url = urlsplit(self.path)
+        if url.path == "/users":
+            query = {k: v[0] for k, v in parse_qs(url.query).items()}
+            after = int(query.get("cursor", 0))
+            limit = int(query.get("limit", 100))
+            page = [u for u in self.users.values() if int(u["id"]) > after][:limit]
+            next_cursor = page[-1]["id"] if len(page) == limit else None
+            return self.send_json(200, {"users": page, "next_cursor": next_cursor})
+        user_id = url.path.rsplit("/", 1)[1]
+        if user_id in self.fail_ids:
+            self.close_connection = True
+            return
+        if user_id not in self.users:
+            return self.send_json(404, {"error": "User not found"})
+        self.send_json(200, self.users[user_id])
+
+    def send_json(self, status, body):
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, *args):
+        pass
+
+
+class TestAsyncDataProcessingService(unittest.TestCase):
+    """The async app answers like the sync app for every endpoint."""
+
+    users = {
+        "1": {"id": "1", "name": "Ahmed Aly", "email": "Ahmed@gmail.com"},
+        "2": {"id": "2", "name": "Sara Mohamed Ali", "email": "sara@acme.com"},
+    }
+
+    def serve(self, users, fail_ids=(), guard=None):
+        FakeServiceA.users = users
+        FakeServiceA.fail_ids = fail_ids
+        FakeServiceA.calls = 0
+        server = ThreadingHTTPServer(("127.0.0.1", 0), FakeServiceA)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+
+        service_a = self.app.state.service_a
+        service_a.base_url = f"http://127.0.0.1:{server.server_port}"
+        service_a.retry_backoff = 0
+        service_a.guard = guard or UpstreamGuard(CircuitBreaker(), InFlightLimit(0))
+        client = TestClient(self.app)
+        client.__enter__()
+        self.addCleanup(client.__exit__, None, None, None)
+        return client
+
+    def setUp(self):
+        self.app = create_app()
+
+    def test_process_user_data(self):
+        client = self.serve(self.users)
+        response = client.post("/process/user/1")
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual(data["user_id"], "1")
+        self.assertEqual(data["name"], "Ahmed Aly")
+        self.assertEqual(data["email_domain"], "gmail.com")
+
+    def test_processed_responses_are_reused(self):
+        client = self.serve(self.users)
+        before = client.get("/admin/output-cache").json()
+        first = client.post("/process/user/2")
+        self.app.state.user_cache.clear()
+        second = client.post("/process/user/2")
+        self.assertEqual(second.content, first.content)
+        self.assertEqual(second.json()["name_analysis"]["middle_names"], ["Mohamed"])
+        stats = client.get("/admin/output-cache").json()
+        self.assertEqual(stats["hits"] - before["hits"], 1)
+
+    def test_process_user_errors(self):
+        client = self.serve(self.users, fail_ids={"3"})
+        missing = client.post("/process/user/999")
+        self.assertEqual(missing.status_code, 404)
+        self.assertEqual(missing.json()["error"], "User not found")
+        self.assertEqual(client.post("/process/user/3").status_code, 503)
+
+    def test_open_breaker_refuses_requests(self):
+        guard = UpstreamGuard(
+            CircuitBreaker(window=1, min_calls=1, open_seconds=30), InFlightLimit(0)
+        )
+        client = self.serve(self.users, fail_ids={"3"}, guard=guard)
+        self.assertEqual(client.post("/process/user/3").status_code, 503)
+        calls = FakeServiceA.calls
+
+        response = client.post("/process/user/1")
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response.headers["Retry-After"], "30")
+        self.assertEqual(FakeServiceA.calls, calls)
+        batch = client.post("/process/users", json={"user_ids": ["1"]})
+        self.assertEqual(json.loads(batch.content)["status"], 503)
+        stats = client.get("/admin/upstream").json()
+        self.assertEqual(stats["breaker"]["state"], "open")
+
+    def test_process_users_batch(self):
+        client = self.serve(self.users, fail_ids={"3"})
+        response = client.post(
+            "/process/users", json={"user_ids": ["1", "999", "3", 2]}
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            response.headers["content-type"].split(";")[0], "application/x-ndjson"
+        )
+        lines = [json.loads(line) for line in response.text.splitlines()]
+        self.assertEqual([line["user_id"] for line in lines], ["1", "999", "3", "2"])
+        self.assertEqual([line["status"] for line in lines], [200, 404, 503, 200])
+        self.assertEqual(
+            lines[3]["result"]["name_analysis"]["middle_names"], ["Mohamed"]
+        )
+
+    def test_batch_ids_cannot_reach_other_routes(self):
+        client = self.serve(self.users)
+        ids = ["../stats", "1?timeout=30", "%31", "1"]
+        response = client.post("/process/users", json={"user_ids": ids})
+        lines = [json.loads(line) for line in response.text.splitlines()]
+        self.assertEqual([line["status"] for line in lines], [404, 404, 404, 200])
+        self.assertEqual(FakeServiceA.calls, 1)
+
+    @patch("async_app.SERVICE_A_PAGE_SIZE", 2)
+    def test_process_all_users(self):
+        users = {
+            str(i): {"id": str(i), "name": f"User {i}", "email": f"user{i}@acme.com"}
+            for i in range(1, 6)
+        }
+        client = self.serve(users)
+        response = client.post("/process/users", json={"user_ids": "all"})
+        lines = [json.loads(line) for line in response.text.splitlines()]
+        self.assertEqual([line["user_id"] for line in lines], list(users))
+        self.assertTrue(all(line["status"] == 200 for line in lines))
+
+    @patch("async_app.SERVICE_A_PAGE_SIZE", 2)
+    def test_malformed_records_only_fail_their_user(self):
+        users = {
+            "1": {"id": "1", "name": "Ahmed Aly", "email": "Ahmed@gmail.com"},
+            "2": {"id": "2", "name": None, "email": "sara@acme.com"},
+            "3": {"id": "3", "name": "Omar Said", "email": 42},
+        }
+        client = self.serve(users)
+        response = client.post("/process/user/2")
+        self.assertEqual(response.status_code, 502)
+        self.assertIn("Invalid user data", response.json()["error"])
+
+        for user_ids in (["1", "2", "3"], "all"):
+            response = client.post("/process/users", json={"user_ids": user_ids})
+            lines = [json.loads(line) for line in response.text.splitlines()]
+            self.assertEqual(
+                [(line["user_id"], line["status"]) for line in lines],
+                [("1", 200), ("2", 502), ("3", 502)],
+            )
+
+    def test_process_users_rejects_bad_body(self):
+        client = self.serve(self.users)
+        self.assertEqual(client.post("/process/users", json={}).status_code, 400)
+        self.assertEqual(
+            client.post("/process/users", content=b"not json").status_code, 400
+        )
+
+    def test_repeat_lookups_are_cached(self):
+        client = self.serve(self.users)
+        before = client.get("/admin/pool").json()["requests"]
+        for _ in range(3):
+            self.assertEqual(client.post("/process/user/1").status_code, 200)
+        self.assertEqual(FakeServiceA.calls, 1)
+        self.assertEqual(client.get("/admin/pool").json()["requests"] - before, 1)
+
+        self.assertEqual(client.delete("/admin/cache/1").status_code, 204)
+        self.assertEqual(client.delete("/admin/cache/1").status_code, 404)
+        client.post("/process/user/1")
+        self.assertEqual(FakeServiceA.calls, 2)
+        self.assertEqual(client.delete("/admin/cache").status_code, 204)
+        self.assertEqual(client.get("/admin/cache").json()["entries"], 0)
+
+    def test_jobs_are_not_served(self):
+        client = self.serve(self.users)
+        response = client.post("/jobs", json={"user_ids": ["1"]})
+        self.assertEqual(response.status_code, 404)
+
+    def test_apps_do_not_share_state(self):
+        client = self.serve(self.users)
+        client.post("/process/user/1")
+        other = create_app()
+        self.assertIsNot(other.state.service_a, self.app.state.service_a)
+        self.assertEqual(other.state.user_cache.stats()["entries"], 0)
+        self.assertEqual(self.app.state.user_cache.stats()["entries"], 1)
+
+    def test_metrics(self):
+        client = self.serve(self.users)
+        client.post("/process/user/1")
+        text = client.get("/metrics").text
+        self.assertIn(
+            'http_requests_total{method="POST",route="/process/user/<user_id>",'
+            'status="200"}',
+            text,
+        )
+        self.assertIn('service_b_cache_entries{cache="output"}', text)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,114 @@
+"""Tests for the Service A circuit breaker and in-flight limit."""
+
+import unittest
+from unittest.mock import patch
+
+from breaker import (
+    CLOSED,
+    HALF_OPEN,
+    OPEN,
+    CircuitBreaker,
+    CircuitOpenError,
+    InFlightLimit,
+    OverloadedError,
+    UpstreamGuard,
+)
+
+
+class TestCircuitBreaker(unittest.TestCase):
+    def setUp(self):
+        self.now = 1000.0
+        patcher = patch("breaker.time.monotonic", lambda: self.now)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.breaker = CircuitBreaker(
+            window=4,
+            min_calls=4,
+            failure_rate=0.5,
+            slow_call_seconds=1.0,
+            slow_call_rate=0.75,
+            open_seconds=10,
+            half_open_calls=2,
+        )
+
+    def calls(self, *outcomes):
+        for failed, duration in outcomes:
+            self.breaker.before_call()
+            self.breaker.record(failed, duration)
+
+    def test_opens_on_failure_rate(self):
+        self.calls((True, 0.1), (False, 0.1), (True, 0.1))
+        self.assertEqual(self.breaker.stats()["state"], CLOSED)
+        self.calls((False, 0.1))
+        self.assertEqual(self.breaker.stats()["state"], OPEN)
+
+        self.now += 4
+        with self.assertRaises(CircuitOpenError) as raised:
+            self.breaker.before_call()
+        self.assertEqual(raised.exception.retry_after, 6)
+        self.assertEqual(raised.exception.status, 503)
+        stats = self.breaker.stats()
+        self.assertEqual((stats["opened"], stats["rejected"]), (1, 1))
+
+    def test_opens_on_slow_calls(self):
+        self.calls((False, 0.1), (False, 2.0), (False, 2.0), (False, 2.0))
+        self.assertEqual(self.breaker.stats()["state"], OPEN)
+
+    def test_only_the_window_counts(self):
+        self.calls(*[(False, 0.1)] * 10)
+        self.calls((True, 0.1))
+        self.assertEqual(self.breaker.stats()["state"], CLOSED)
+        # Two failures in the last four calls, out of twelve
+        self.calls((True, 0.1))
+        self.assertEqual(self.breaker.stats()["state"], OPEN)
+
+    def test_half_open_probes_close_the_breaker(self):
+        self.calls(*[(True, 0.1)] * 4)
+        self.now += 10
+        self.breaker.before_call()
+        self.breaker.before_call()
+        self.assertEqual(self.breaker.stats()["state"], HALF_OPEN)
+        # Only the probes are let through
+        with self.assertRaises(CircuitOpenError):
+            self.breaker.before_call()
+        self.breaker.record(False, 0.1)
+        self.breaker.record(False, 0.1)
+        self.assertEqual(self.breaker.stats()["state"], CLOSED)
+        self.breaker.before_call()
+
+    def test_failed_probe_opens_the_breaker_again(self):
+        self.calls(*[(True, 0.1)] * 4)
+        self.now += 10
+        self.calls((False, 0.1), (True, 0.1))
+        stats = self.breaker.stats()
+        self.assertEqual((stats["state"], stats["opened"]), (OPEN, 2))
+        with self.assertRaises(CircuitOpenError) as raised:
+            self.breaker.before_call()
+        self.assertEqual(raised.exception.retry_after, 10)
+
+
+class TestUpstreamGuard(unittest.TestCase):
+    def test_calls_beyond_the_limit_are_shed(self):
+        limit = InFlightLimit(2)
+        limit.acquire()
+        limit.acquire()
+        with self.assertRaises(OverloadedError) as raised:
+            limit.acquire()
+        self.assertEqual(raised.exception.status, 429)
+        limit.release()
+        limit.acquire()
+        self.assertEqual(limit.stats(), {"in_flight": 2, "limit": 2, "shed": 1})
+
+    def test_refused_call_releases_its_slot(self):
+        breaker = CircuitBreaker(window=1, min_calls=1)
+        guard = UpstreamGuard(breaker, InFlightLimit(1))
+        guard.exit(guard.enter(), failed=True)
+        with self.assertRaises(CircuitOpenError):
+            guard.enter()
+        stats = guard.stats()
+        self.assertEqual(stats["admission"]["in_flight"], 0)
+        self.assertEqual(stats["breaker"]["state"], OPEN)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,134 @@
+"""Tests for the Service A user cache."""
+
+import asyncio
+import threading
+import unittest
+from unittest.mock import patch
+
+from cache import LRUCache
+
+
+class TestLRUCache(unittest.TestCase):
+    def test_hit_after_miss(self):
+        cache = LRUCache()
+        self.assertEqual(cache.get_or_load("1", lambda stale: ("user", 10)), "user")
+        self.assertEqual(
+            cache.get_or_load("1", lambda stale: self.fail("loaded twice")), "user"
+        )
+        stats = cache.stats()
+        self.assertEqual((stats["hits"], stats["misses"], stats["bytes"]), (1, 1, 10))
+
+    def test_entries_expire(self):
+        cache = LRUCache(ttl=10, negative_ttl=1)
+        with patch("cache.time.monotonic", return_value=100.0):
+            cache.get_or_load("1", lambda stale: ("user", 10))
+            cache.get_or_load("404", lambda stale: (None, 0))
+        with patch("cache.time.monotonic", return_value=105.0):
+            self.assertEqual(
+                cache.get_or_load("1", lambda stale: ("fresh", 10)), "user"
+            )
+            self.assertEqual(
+                cache.get_or_load("404", lambda stale: ("created", 10)), "created"
+            )
+        self.assertEqual(cache.stats()["expirations"], 1)
+
+    def test_lru_eviction_by_entries_and_bytes(self):
+        cache = LRUCache(max_entries=2, max_bytes=100)
+        cache.get_or_load("a", lambda stale: ("A", 10))
+        cache.get_or_load("b", lambda stale: ("B", 10))
+        cache.get_or_load(
+            "a", lambda stale: ("A", 10)
+        )  # "b" is now least recently used
+        cache.get_or_load("c", lambda stale: ("C", 10))
+        self.assertEqual(cache.get_or_load("b", lambda stale: ("B2", 10)), "B2")
+
+        cache.get_or_load("big", lambda stale: ("BIG", 95))
+        stats = cache.stats()
+        self.assertEqual(stats["entries"], 1)
+        self.assertEqual(stats["bytes"], 95)
+
+    def test_concurrent_misses_share_one_load(self):
+        cache = LRUCache()
+        release = threading.Event()
+        calls = []
+
+        def loader(stale):
+            calls.append(1)
+            release.wait(5)
+            return "user", 10
+
+        results = []
+        threads = [
+            threading.Thread(
+                target=lambda: results.append(cache.get_or_load("1", loader))
+            )
+            for _ in range(10)
+        ]
+        for thread in threads:
+            thread.start()
+        while cache.stats()["coalesced"] < 9:
+            pass
+        release.set()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(results, ["user"] * 10)
+
+    def test_async_concurrent_misses_share_one_load(self):
+        cache = LRUCache()
+        calls = []
+
+        async def loader(stale):
+            calls.append(1)
+            await asyncio.sleep(0.01)
+            return "user", 10
+
+        async def main():
+            return await asyncio.gather(
+                *(cache.get_or_load_async("1", loader) for _ in range(10))
+            )
+
+        self.assertEqual(asyncio.run(main()), ["user"] * 10)
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(cache.stats()["coalesced"], 9)
+
+    def test_errors_are_not_cached(self):
+        cache = LRUCache()
+
+        def failing(stale):
+            raise ConnectionError("down")
+
+        with self.assertRaises(ConnectionError):
+            cache.get_or_load("1", failing)
+        self.assertEqual(cache.get_or_load("1", lambda stale: ("user", 10)), "user")
+
+    def test_expired_entry_is_revalidated(self):
+        cache = LRUCache(ttl=10)
+        with patch("cache.time.monotonic", return_value=100.0):
+            cache.get_or_load("1", lambda stale: (["user"], 10))
+        seen = []
+
+        def revalidate(stale):
+            seen.append(stale)
+            return stale, 0
+
+        with patch("cache.time.monotonic", return_value=120.0):
+            self.assertEqual(cache.get_or_load("1", revalidate), ["user"])
+        self.assertEqual(seen, [["user"]])
+        stats = cache.stats()
+        self.assertEqual(stats["revalidations"], 1)
+        self.assertEqual(stats["bytes"], 10)
+
+    def test_invalidate_and_clear(self):
+        cache = LRUCache()
+        cache.get_or_load("1", lambda stale: ("user", 10))
+        cache.get_or_load("2", lambda stale: ("user", 10))
+        self.assertTrue(cache.invalidate("1"))
+        self.assertFalse(cache.invalidate("1"))
+        cache.clear()
+        self.assertEqual(cache.stats()["entries"], 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,155 @@
+"""Tests for following Service A's change feed."""
+
+import os
+import subprocess
+import sys
+import unittest
+from unittest.mock import MagicMock
+
+import requests
+
+from cache import LRUCache
+from changefeed import ChangeFeedFollower
+from client import ServiceAClient
+
+SERVICE_A_DIR = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), os.pardir, "service_a"
+)
+
+# Serves a fresh Service A on a free port and prints the port
+SERVICE_A = """
+from werkzeug.serving import make_server
+
+from app import create_app
+
+server = make_server("127.0.0.1", 0, create_app(), threaded=True)
+print(server.server_port, flush=True)
+server.serve_forever()
+"""
+
+
+def feed_response(version, changes=(), reset=False, epoch="e1", status=200):
+    response = MagicMock()
+    response.status_code = status
+    response.json.return_value = {
+        "epoch": epoch,
+        "version": version,
+        "changes": list(changes),
+        "reset": reset,
+    }
+    return response
+
+
+class TestChangeFeedFollower(unittest.TestCase):
+    def setUp(self):
+        self.client = MagicMock()
+        self.client.timeout = (2, 5)
+        self.cache = LRUCache()
+        for user_id in ("1", "2", "3"):
+            self.cache.get_or_load(user_id, lambda stale: ({"id": user_id}, 10))
+        self.follower = ChangeFeedFollower(self.client, self.cache, poll_timeout=1)
+        self.follower.epoch = "e1"
+
+    def test_invalidates_changed_users(self):
+        self.client.get.return_value = feed_response(
+            7,
+            [
+                {"version": 6, "op": "update", "id": "1"},
+                {"version": 7, "op": "delete", "id": "3"},
+            ],
+        )
+        self.follower.poll_once()
+        self.assertEqual(self.follower.version, 7)
+        self.assertEqual(self.cache.stats()["entries"], 1)
+        params = self.client.get.call_args.kwargs["params"]
+        self.assertEqual((params["since"], params["epoch"]), (0, "e1"))
+
+    def test_reset_flushes_cache(self):
+        self.client.get.return_value = feed_response(50, reset=True)
+        self.follower.poll_once()
+        self.assertEqual(self.follower.version, 50)
+        self.assertEqual(self.cache.stats()["entries"], 0)
+
+    def test_first_answer_flushes_cache(self):
+        self.follower.epoch = None
+        self.client.get.return_value = feed_response(0)
+        self.follower.poll_once()
+        self.assertNotIn("epoch", self.client.get.call_args.kwargs["params"])
+        self.assertEqual(self.follower.epoch, "e1")
+        self.assertEqual(self.cache.stats()["entries"], 0)
+
+    def test_stops_when_service_a_has_no_feed(self):
+        self.client.get.return_value = feed_response(0, status=501)
+        self.follower.poll_once()
+        self.assertTrue(self.follower._stopped.is_set())
+        self.assertEqual(self.cache.stats()["entries"], 3)
+
+    def test_errors_propagate_from_poll(self):
+        self.client.get.side_effect = requests.ConnectionError("down")
+        with self.assertRaises(requests.ConnectionError):
+            self.follower.poll_once()
+
+
+@unittest.skipUnless(os.path.isdir(SERVICE_A_DIR), "needs service_a next to service_b")
+class TestFollowingServiceA(unittest.TestCase):
+    """The follower against a real Service A, restarted under it"""
+
+    def start_service_a(self):
+        server = subprocess.Popen(
+            [sys.executable, "-c", SERVICE_A],
+            cwd=SERVICE_A_DIR,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+            text=True,
+        )
+        self.addCleanup(server.wait)
+        self.addCleanup(server.kill)
+        self.addCleanup(server.stdout.close)
+        self.client.base_url = f"http://127.0.0.1:{server.stdout.readline().strip()}"
+        return server
+
+    def create_users(self, count):
+        for i in range(count):
+            user = {"name": f"User {i}", "email": f"user{i}@example.com"}
+            response = self.client.session.post(
+                f"{self.client.base_url}/users", json=user
+            )
+            response.raise_for_status()
+
+    def cache_users(self, *user_ids):
+        for user_id in user_ids:
+            self.cache.get_or_load(user_id, lambda stale: ({"id": user_id}, 10))
+
+    def setUp(self):
+        self.client = ServiceAClient("http://127.0.0.1")
+        self.addCleanup(self.client.close)
+        self.cache = LRUCache()
+        self.follower = ChangeFeedFollower(self.client, self.cache, poll_timeout=0)
+
+    def test_restart_flushes_cache(self):
+        service_a = self.start_service_a()
+        self.create_users(3)
+        self.follower.poll_once()
+        self.assertEqual(self.follower.version, 3)
+
+        self.cache_users("1", "2")
+        response = self.client.session.put(
+            f"{self.client.base_url}/users/1", json={"name": "Renamed"}
+        )
+        response.raise_for_status()
+        self.follower.poll_once()
+        self.assertEqual(self.cache.stats()["entries"], 1)
+
+        # Service A restarts behind the follower, and then ahead of it
+        for count in (1, 6):
+            self.cache_users("1", "2")
+            service_a.kill()
+            service_a = self.start_service_a()
+            self.create_users(count)
+            self.follower.poll_once()
+            self.assertEqual(self.cache.stats()["entries"], 0)
+            self.assertEqual(self.follower.version, count)
+
+
+if __name__ == "__main__":
+    unittest.main()
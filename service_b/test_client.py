@@ -0,0 +1,78 @@
+"""Tests for the pooled Service A client."""
+
+import json
+import threading
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from breaker import CircuitBreaker, CircuitOpenError, InFlightLimit, UpstreamGuard
+from client import ServiceAClient
+
+
+class FakeServiceA(BaseHTTPRequestHandler):
+    """Keep-alive HTTP/1.1 server that fails the first ``failures`` requests"""
+
+    protocol_version = "HTTP/1.1"
+    failures = 0
+    calls = 0
+
+    def do_GET(self):
+        type(self).calls += 1
+        status = 503 if type(self).calls <= self.failures else 200
+        body = json.dumps(
+            {"id": "1", "name": "Ahmed Aly", "email": "ahmed@gmail.com"}
+        ).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class TestServiceAClient(unittest.TestCase):
+    def setUp(self):
+        FakeServiceA.failures = 0
+        FakeServiceA.calls = 0
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), FakeServiceA)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+        self.client = ServiceAClient(
+            f"http://127.0.0.1:{self.server.server_port}", pool_size=2, retry_backoff=0
+        )
+        self.addCleanup(self.client.close)
+
+    def test_connections_are_reused(self):
+        for _ in range(5):
+            self.assertEqual(self.client.get("/users/1").status_code, 200)
+
+        stats = self.client.pool_stats()
+        self.assertEqual(stats["requests"], 5)
+        self.assertEqual(stats["new_connections"], 1)
+        self.assertEqual(stats["hits"], 4)
+
+    def test_get_is_retried_on_unavailable(self):
+        FakeServiceA.failures = 2
+        response = self.client.get("/users/1")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(FakeServiceA.calls, 3)
+
+    def test_failing_service_opens_the_breaker(self):
+        FakeServiceA.failures = 3
+        self.client.guard = UpstreamGuard(
+            CircuitBreaker(window=1, min_calls=1), InFlightLimit(0)
+        )
+        # Still 503 after its retries, so the one call counts as failed
+        self.assertEqual(self.client.get("/users/1").status_code, 503)
+        with self.assertRaises(CircuitOpenError):
+            self.client.get("/users/1")
+        self.assertEqual(FakeServiceA.calls, 3)
+        # Unguarded requests still go through
+        self.assertEqual(self.client.get("/users/1", guarded=False).status_code, 200)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,160 @@
+"""Tests for background processing jobs."""
+
+import json
+import os
+import tempfile
+import time
+import unittest
+from unittest.mock import patch
+
+from app import create_app
+from jobs import FAILED, RUNNING, SUCCEEDED, JobManager
+from test_app import fake_service_a
+
+
+def wait_for(manager, job_id, statuses=(SUCCEEDED, FAILED)):
+    deadline = time.monotonic() + 5
+    while time.monotonic() < deadline:
+        state = manager.get(job_id)
+        if state["status"] in statuses:
+            return state
+        time.sleep(0.01)
+    raise AssertionError(f"job {job_id} is still {state['status']}")
+
+
+def count_handler(spec, position, fail_at=None):
+    """Yield one line per number up to ``spec``, two per chunk"""
+    start = position or 0
+    while start < spec:
+        if start == fail_at:
+            raise RuntimeError("upstream went away")
+        numbers = range(start, min(start + 2, spec))
+        start = numbers[-1] + 1
+        yield [f"{n}\n" for n in numbers], len(numbers), 0, start
+
+
+class TestJobManager(unittest.TestCase):
+    def setUp(self):
+        tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmpdir.cleanup)
+        self.directory = tmpdir.name
+
+    def results(self, manager, job_id):
+        return b"".join(manager.iter_results(job_id)).decode().split()
+
+    def test_job_runs_to_completion(self):
+        manager = JobManager(self.directory, count_handler)
+        job = manager.submit(5, total=5)
+        state = wait_for(manager, job["id"])
+        self.assertEqual(state["status"], SUCCEEDED)
+        self.assertEqual((state["processed"], state["succeeded"]), (5, 5))
+        self.assertEqual(self.results(manager, job["id"]), ["0", "1", "2", "3", "4"])
+        self.assertEqual([job["id"] for job in manager.list()], [job["id"]])
+
+    def test_failed_job_resumes_from_checkpoint(self):
+        attempts = []
+
+        def handler(spec, position):
+            attempts.append(position)
+            return count_handler(spec, position, fail_at=None if attempts[1:] else 4)
+
+        manager = JobManager(self.directory, handler)
+        job = manager.submit(6)
+        state = wait_for(manager, job["id"])
+        self.assertEqual((state["status"], state["processed"]), (FAILED, 4))
+        self.assertEqual(state["error"], "upstream went away")
+
+        manager.resume(job["id"])
+        state = wait_for(manager, job["id"])
+        self.assertEqual((state["status"], state["total"]), (SUCCEEDED, 6))
+        self.assertEqual(attempts, [None, 4])
+        self.assertEqual(self.results(manager, job["id"]), [str(n) for n in range(6)])
+
+    def test_interrupted_job_drops_lines_after_checkpoint(self):
+        manager = JobManager(self.directory, count_handler)
+        job = manager.submit(4)
+        wait_for(manager, job["id"])
+        # As if the process died while writing the chunk after line 1
+        state = manager.get(job["id"])
+        state.update(status=RUNNING, position=2, offset=4, processed=2, succeeded=2)
+        with open(os.path.join(self.directory, f"{job['id']}.json"), "w") as f:
+            json.dump(state, f)
+        with open(os.path.join(self.directory, f"{job['id']}.ndjson"), "ab") as f:
+            f.write(b"partial")
+
+        restarted = JobManager(self.directory, count_handler)
+        restarted.resume_pending()
+        state = wait_for(restarted, job["id"])
+        self.assertEqual((state["status"], state["processed"]), (SUCCEEDED, 4))
+        self.assertEqual(self.results(restarted, job["id"]), ["0", "1", "2", "3"])
+
+    def test_unknown_job(self):
+        manager = JobManager(self.directory, count_handler)
+        self.assertIsNone(manager.get("missing"))
+        self.assertIsNone(manager.get("../etc"))
+        self.assertEqual(list(manager.iter_results("missing")), [])
+
+
+class TestJobEndpoints(unittest.TestCase):
+    users = {
+        str(i): {"id": str(i), "name": f"User {i}", "email": f"u{i}@acme.com"}
+        for i in range(1, 6)
+    }
+
+    def setUp(self):
+        tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmpdir.cleanup)
+        app = create_app()
+        self.jobs = app.extensions["processing"]["jobs"]
+        self.jobs.directory = tmpdir.name
+        self.client = app.test_client()
+        patcher = patch("requests.Session.get")
+        patcher.start().side_effect = fake_service_a(self.users, fail_ids={"4"})
+        self.addCleanup(patcher.stop)
+
+    def run_job(self, user_ids):
+        response = self.client.post("/jobs", json={"user_ids": user_ids})
+        self.assertEqual(response.status_code, 202)
+        job_id = response.get_json()["id"]
+        self.assertEqual(response.headers["Location"], f"/jobs/{job_id}")
+        wait_for(self.jobs, job_id)
+        job = self.client.get(f"/jobs/{job_id}").get_json()
+        results = self.client.get(job["results_url"])
+        lines = [json.loads(line) for line in results.data.splitlines()]
+        return job, lines
+
+    def test_job_for_user_ids(self):
+        job, lines = self.run_job(["1", "4", "9", 2])
+        self.assertEqual(job["status"], SUCCEEDED)
+        self.assertEqual((job["total"], job["succeeded"], job["failed"]), (4, 2, 2))
+        self.assertEqual(
+            [(line["user_id"], line["status"]) for line in lines],
+            [("1", 200), ("4", 503), ("9", 404), ("2", 200)],
+        )
+
+    def test_job_for_all_users(self):
+        job, lines = self.run_job("all")
+        self.assertEqual((job["status"], job["total"]), (SUCCEEDED, 5))
+        self.assertEqual([line["user_id"] for line in lines], list(self.users))
+        self.assertEqual(lines[0]["result"]["email_domain"], "acme.com")
+
+    def test_malformed_records_only_fail_their_user(self):
+        self.addCleanup(self.users.__setitem__, "3", self.users["3"])
+        self.users["3"] = {"id": "3", "name": None, "email": 42}
+        for user_ids in (["1", "3"], "all"):
+            job, lines = self.run_job(user_ids)
+            self.assertEqual(job["status"], SUCCEEDED)
+            statuses = {line["user_id"]: line["status"] for line in lines}
+            self.assertEqual((statuses["1"], statuses["3"]), (200, 502))
+
+    def test_bad_requests(self):
+        self.assertEqual(self.client.post("/jobs", json={}).status_code, 400)
+        self.assertEqual(self.client.get("/jobs/missing").status_code, 404)
+        self.assertEqual(self.client.get("/jobs/missing/results").status_code, 404)
+        job, _ = self.run_job(["1"])
+        resumed = self.client.post(f"/jobs/{job['id']}/resume")
+        self.assertEqual(resumed.status_code, 409)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,70 @@
+document.getElementById('processForm').addEventListener('submit', async (e) => {
+    e.preventDefault();
+    const userId = document.getElementById('userId').value;
+
+    try {
+        const response = await fetch(`/process/user/${userId}`, {
+            method: 'POST'
+        });
+        const data = await response.json();
+
+        if (data.error) {
+            document.getElementById('result').innerHTML =
+                `<pre class="error">Error: ${data.error}</pre>`;
+            return;
+        }
+
+        let resultHtml = '<div class="analysis-result">';
+
+        // Basic Info
+        resultHtml += '<h3>Basic Information</h3>';
+        resultHtml += `<p><strong>User ID:</strong> ${data.user_id}</p>`;
+        resultHtml += `<p><strong>Full Name:</strong> ${data.name}</p>`;
+        resultHtml += `<p><strong>Email:</strong> ${data.email}</p>`;
+
+        // Name Analysis
+        resultHtml += '<h3>Name Analysis</h3>';
+        resultHtml += `
+            <p><strong>First Name:</strong>
+                <span class="name-part">${data.name_analysis.first_name}</span>
+            </p>
+        `;
+        if (data.name_analysis.middle_names.length > 0) {
+            resultHtml += `
+                <p><strong>Middle Names:</strong>
+                    <span class="name-part">${data.name_analysis.middle_names.join(' ')}</span>
+                </p>
+            `;
+        }
+        resultHtml += `
+            <p><strong>Last Name:</strong>
+                <span class="name-part">${data.name_analysis.last_name}</span>
+            </p>
+        `;
+        resultHtml += `<p><strong>Total Name Parts:</strong> ${data.name_analysis.total_parts}</p>`;
+
+        // Email Analysis
+        resultHtml += '<h3>Email Analysis</h3>';
+        resultHtml += `
+            <p><strong>Username:</strong>
+                <span class="email-part">${data.email_analysis.username}</span>
+            </p>
+        `;
+        resultHtml += `
+            <p><strong>Domain:</strong>
+                <span class="email-part">${data.email_analysis.domain}</span>
+            </p>
+        `;
+        resultHtml += `
+            <p><strong>Corporate Email:</strong>
+                ${data.email_analysis.is_corporate ? 'Yes' : 'No'}
+            </p>
+        `;
+
+        resultHtml += '</div>';
+        document.getElementById('result').innerHTML = resultHtml;
+    } catch (error) {
+        document.getElementById('result').innerHTML =
+            `<pre class="error">Error: ${error.message}</pre>`;
+    }
+});